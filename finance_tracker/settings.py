@@ -11,7 +11,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os 
+import sys
 from datetime import timedelta
+
+import dj_database_url
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracker.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'csp.middleware.CSPMiddleware',
@@ -56,8 +60,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request timing: Server-Timing headers and histograms at /api/metrics.
+# The middleware removes itself unless this is enabled.
+REQUEST_METRICS = os.environ.get("DJANGO_REQUEST_METRICS", "False").lower() == "true"
+
 ROOT_URLCONF = 'finance_tracker.urls'
 
+# Threads (each with its own database connection) that run the sections of
+# the async dashboard concurrently
+DASHBOARD_WORKERS = int(os.environ.get("DJANGO_DASHBOARD_WORKERS", "3"))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -79,12 +91,54 @@ WSGI_APPLICATION = 'finance_tracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DATABASE_URL defaults to the local SQLite file. Connections are kept open
+# for DJANGO_CONN_MAX_AGE seconds and health-checked before reuse.
+# DATABASE_REPLICA_URL adds a read replica that tracker.routers sends the
+# read-only API views to; under test it mirrors the default database.
+
+CONN_MAX_AGE = int(os.environ.get("DJANGO_CONN_MAX_AGE", "600"))
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': dj_database_url.config(
+        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+        conn_max_age=CONN_MAX_AGE,
+        conn_health_checks=True,
+    ),
 }
+if os.environ.get("DATABASE_REPLICA_URL"):
+    DATABASES['replica'] = dj_database_url.parse(
+        os.environ["DATABASE_REPLICA_URL"],
+        conn_max_age=CONN_MAX_AGE,
+        conn_health_checks=True,
+        test_options={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['tracker.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Dashboard versions and read-your-writes pins must be seen by every worker
+# process, so the default is a file-based cache shared by the processes of
+# a host (DJANGO_CACHE_DIR, by default .cache/ in the project). Tests use
+# local memory.
+
+TESTING = 'test' in sys.argv[1:2] or 'pytest' in sys.modules
+
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'finance-tracker',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get("DJANGO_CACHE_DIR", str(BASE_DIR / '.cache')),
+        }
+    }
 
 
 # Password validation
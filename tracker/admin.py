@@ -2,14 +2,18 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from django.http import HttpResponse 
+from django.db.models import F
 from django.urls import path
 from django.template.response import TemplateResponse
-from django.db.models import Sum
-import csv
-from .models import Account, Category, Transaction, Budget, Goal
+from django.utils.timezone import now
+from .admin_dashboard import get_admin_dashboard
+from .bulk import delete_transactions
+from .exports import ADMIN_COLUMNS, stream_transactions
+from .forms import AdminDashboardForm
+from .routers import replica_reads
+from .search import search_transactions
+from .models import Account, Category, Transaction, Budget, Goal, Job, RecurringTransaction
 from django.shortcuts import redirect
-from django.db.models.functions import TruncMonth
 
 
 #Inline for Transactions in Account
@@ -24,8 +28,25 @@ class AccountAdmin(admin.ModelAdmin):
     search_fields = ('name', 'user__email', 'user__username')
     list_filter = ('account_type','currency','created_at',)
     ordering = ('-created_at',)
+    readonly_fields = ('opening_balance',)
     inlines = [TransactionInline] #Show Transaction inside Account
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.opening_balance = obj.balance
+            return super().save_model(request, obj, form, change)
+        # As AccountSerializer.update: save only the edited columns, so the form's copy of the
+        # balance never overwrites transactions applied meanwhile, and a balance edit adjusts
+        # the opening balance.
+        fields = [name for name in form.changed_data if name != 'balance']
+        if fields:
+            obj.save(update_fields=[*fields, 'updated_at'])
+        if 'balance' in form.changed_data:
+            Account.objects.filter(pk=obj.pk).update(
+                opening_balance=F('opening_balance') + obj.balance - F('balance'), balance=obj.balance,
+                updated_at=now())
+            obj.refresh_from_db(fields=['balance', 'opening_balance'])
+
 #Inline for Transaction in Category
 class TransactionCategoryInline(admin.TabularInline):
     model = Transaction
@@ -43,32 +64,37 @@ class CategoryAdmin(admin.ModelAdmin):
 # Transaction Admin with CSV Export
 
 def export_transactions_to_csv(modeladmin, request, queryset):
-    response = HttpResponse(content_type="text/csv")
-    response['Content-Disposition'] = 'attachment; filename=transactions.csv'
-    writer = csv.writer(response)
-    writer.writerow(['User', 'Account', 'Category', 'Type', 'Amount', 'Currency', 'Date'])
-
-    for t in queryset:
-        writer.writerow([
-            t.user.email if hasattr(t.user, 'email') else t.user.username,
-            t.account.name,
-            t.category.name,
-            t.transaction_type,
-            t.amount,
-            t.currency,
-            t.date,
-        ])
-
-    return response
+    return stream_transactions(queryset.order_by('date', 'id'), 'csv', columns=ADMIN_COLUMNS)
 
 export_transactions_to_csv.short_description = "Export selected transactions to CSV"
 
+def export_transactions_to_ndjson(modeladmin, request, queryset):
+    return stream_transactions(queryset.order_by('date', 'id'), 'ndjson', columns=ADMIN_COLUMNS)
+
+export_transactions_to_ndjson.short_description = "Export selected transactions to NDJSON"
+
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ('transaction_type', 'amount', 'account', 'category', 'date')
     list_filter = ('transaction_type', 'date', 'category')
     search_fields = ('description',)
     ordering = ('-date',)
-    actions = [export_transactions_to_csv]  #custom action
+    actions = [export_transactions_to_csv, export_transactions_to_ndjson]  #custom actions
+
+    def get_search_results(self, request, queryset, search_term):
+        #Use the full-text index rather than LIKE '%term%' over every description
+        if not search_term:
+            return queryset, False
+        return search_transactions(queryset, search_term), False
+
+    def delete_queryset(self, request, queryset):
+        #"Delete selected" reverses the rows' effect on balances and rollups, like Transaction.delete()
+        delete_transactions(queryset)
+
+class RecurringTransactionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'transaction_type', 'amount', 'category', 'frequency', 'interval', 'next_date', 'active')
+    list_filter = ('frequency', 'active', 'transaction_type')
+    list_select_related = ('user', 'category')
+    readonly_fields = ('created_at',)
 
 class BudgetAdmin(admin.ModelAdmin):
     list_display = ('user', 'category', 'month', 'amount')
@@ -79,6 +105,13 @@ class GoalAdmin(admin.ModelAdmin):
     list_filter = ('deadline',)
     search_fields = ("name",)
 
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'progress', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    list_select_related = ('user',)
+    readonly_fields = ('status', 'progress', 'result', 'result_file', 'error', 'attempts', 'worker',
+                       'created_at', 'started_at', 'heartbeat_at', 'finished_at')
+
 class CustomAdminSite(admin.AdminSite):
     site_header = 'Finance Tracker Admin'
     site_title = 'Finance Tracker'
@@ -94,61 +127,27 @@ class CustomAdminSite(admin.AdminSite):
         return custom_urls + urls
 
     def dashboard_view(self, request):
-        # Total balance per account
-        accounts = Account.objects.all()
-        balances = {acc.name: acc.balance for acc in accounts}
-
-        #Income vs Expenses Total
-        income_total = Transaction.objects.filter(transaction_type='INCOME').aggregate(
-            total=Sum('amount'))['total'] or 0
-        expense_total = Transaction.objects.filter(transaction_type='EXPENSE').aggregate(
-            total=Sum('amount'))['total'] or 0
-
-        context = dict(
-            self.each_context(request),
-            accounts = balances,
-            income = income_total,
-            expenses = expense_total,
-        )
-
-        # Expenses by Category
-        expenses_by_category = (
-            Transaction.objects.filter(transaction_type="EXPENSE")
-            .values("category__name")
-            .annotate(total=Sum("amount"))
-        )
-        categories = [e["category__name"] for e in expenses_by_category]
-        category_totals = [e["total"] for e in expenses_by_category]
-
-        # Monthly Income vs Expenses
-        monthly_data = (
-            Transaction.objects.annotate(month=TruncMonth("date"))
-            .values("month", "transaction_type")
-            .annotate(total=Sum("amount"))
-            .order_by("month")
-        )
-
-        months = []
-        income_series, expense_series = [], []
-        for entry in monthly_data:
-            month_str = entry["month"].strftime("%Y-%m")
-            if month_str not in months:
-                months.append(month_str)
-            if entry["transaction_type"] == "INCOME":
-                income_series.append(entry["total"])
-            else:
-                expense_series.append(entry["total"])
-
+        form = AdminDashboardForm(request.GET or None)
+        start, end, currency = form.selection(now().date())
+        if not form.is_bound:
+            form = AdminDashboardForm(initial={'start': start, 'end': end})
+
+        with replica_reads(user_id=request.user.pk):
+            dashboard = get_admin_dashboard(start, end, currency, request.user.base_currency)
+        chart_data = {
+            'income': float(dashboard['income']),
+            'expenses': float(dashboard['expenses']),
+            'categories': dashboard['categories'],
+            'category_totals': [float(total) for total in dashboard['category_totals']],
+            'months': dashboard['months'],
+            'income_series': [float(total) for total in dashboard['income_series']],
+            'expense_series': [float(total) for total in dashboard['expense_series']],
+        }
         context = dict(
             self.each_context(request),
-            accounts=balances,
-            income=income_total,
-            expenses=expense_total,
-            categories=categories,
-            category_totals=category_totals,
-            months=months,
-            income_series=income_series,
-            expense_series=expense_series,
+            form=form,
+            chart_data=chart_data,
+            **dashboard,
         )
         return TemplateResponse(request, 'admin/dashboard.html', context)
 
@@ -159,5 +158,7 @@ custom_admin_site = CustomAdminSite(name="custom_admin")
 custom_admin_site.register(Account, AccountAdmin)
 custom_admin_site.register(Category, CategoryAdmin)
 custom_admin_site.register(Transaction, TransactionAdmin)
+custom_admin_site.register(RecurringTransaction, RecurringTransactionAdmin)
 custom_admin_site.register(Budget, BudgetAdmin)
 custom_admin_site.register(Goal, GoalAdmin)
+custom_admin_site.register(Job, JobAdmin)
@@ -0,0 +1,145 @@
+"""Site-wide figures for the custom admin dashboard.
+
+Everything is aggregated in SQL from the monthly rollup and the accounts
+table, with bounded result sizes (one row per currency/account type, top-N
+accounts and categories), so the page costs the same at any table size.
+"""
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Sum
+
+from .cache import ADMIN_DASHBOARD_TTL, admin_dashboard_key
+from .dashboard import ZERO, month_bounds, next_month
+from .fx import converted
+from .models import Account, MonthlyRollup
+
+TOP_N = 10
+DEFAULT_MONTHS = 12
+
+
+def default_range(today):
+    """The DEFAULT_MONTHS months up to and including the current one."""
+    end = today.replace(day=1)
+    return shift_months(end, 1 - DEFAULT_MONTHS), end
+
+
+def shift_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def month_range(start, end):
+    months = []
+    month = start
+    while month <= end:
+        months.append(month)
+        month = month_bounds(month)[1]
+    return months
+
+
+def currency_totals(rollups):
+    """Income, expenses and transaction count per currency."""
+    rows = (
+        rollups.values('currency', 'transaction_type')
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by('currency')
+    )
+    totals = {}
+    for row in rows:
+        entry = totals.setdefault(row['currency'], {
+            'currency': row['currency'] or '-', 'income': ZERO, 'expenses': ZERO, 'count': 0,
+        })
+        entry['income' if row['transaction_type'] == 'income' else 'expenses'] = row['total']
+        entry['count'] += row['count']
+    for entry in totals.values():
+        entry['net'] = entry['income'] - entry['expenses']
+    return list(totals.values())
+
+
+def balance_totals():
+    """Current balances summed per currency and account type."""
+    labels = dict(Account._meta.get_field('account_type').choices)
+    rows = (
+        Account.objects.values('currency', 'account_type')
+        .annotate(balance=Sum('balance'), accounts=Count('id'))
+        .order_by('currency', 'account_type')
+    )
+    return [dict(row, account_type=labels.get(row['account_type'], row['account_type'])) for row in rows]
+
+
+def top_accounts(currency=None, limit=TOP_N):
+    accounts = Account.objects.all()
+    if currency:
+        accounts = accounts.filter(currency=currency)
+    return list(
+        accounts.order_by('-balance', 'id')
+        .values('id', 'name', 'currency', 'account_type', 'balance', owner=F('user__email'))[:limit]
+    )
+
+
+def top_categories(rollups, limit=TOP_N):
+    """Expense categories (by name, across users) with the largest totals."""
+    return list(
+        rollups.filter(transaction_type='expense')
+        .values('category__name')
+        .annotate(total=Sum('base_total'))
+        .order_by(F('total').desc(nulls_last=True), 'category__name')[:limit]
+    )
+
+
+def monthly_series(rollups, start, end):
+    """Income and expense series aligned with every month of the range, zero-filled."""
+    totals = {
+        (row['month'], row['transaction_type']): row['total'] or ZERO
+        for row in rollups.values('month', 'transaction_type').annotate(total=Sum('base_total')).order_by()
+    }
+    months = month_range(start, end)
+    return (
+        [month.strftime('%Y-%m') for month in months],
+        [totals.get((month, 'income'), ZERO) for month in months],
+        [totals.get((month, 'expense'), ZERO) for month in months],
+    )
+
+
+def build_admin_dashboard(start, end, currency=None, base='KES'):
+    """Build the admin dashboard for the months `start`..`end` (inclusive).
+
+    The per-currency tables keep their own currencies. The charts cover
+    `currency` only when given, otherwise every currency converted into
+    `base` at each month's rate (amounts without a rate are left out).
+    """
+    rollups = MonthlyRollup.objects.filter(month__gte=start, month__lte=end)
+    by_currency = currency_totals(rollups)
+    if currency:
+        rollups = rollups.filter(currency=currency)
+    target = currency or base
+    rollups = rollups.annotate(rate_before=next_month('month')).annotate(
+        base_total=converted('total', 'currency', target, OuterRef('rate_before')))
+    months, income_series, expense_series = monthly_series(rollups, start, end)
+    categories = top_categories(rollups)
+
+    return {
+        'start': start,
+        'end': end,
+        'currency': currency,
+        'chart_currency': target,
+        'currency_totals': by_currency,
+        'balance_totals': balance_totals(),
+        'top_accounts': top_accounts(currency),
+        'income': sum(income_series, ZERO),
+        'expenses': sum(expense_series, ZERO),
+        'categories': [row['category__name'] for row in categories],
+        'category_totals': [row['total'] or ZERO for row in categories],
+        'months': months,
+        'income_series': income_series,
+        'expense_series': expense_series,
+    }
+
+
+def get_admin_dashboard(start, end, currency=None, base='KES'):
+    """`build_admin_dashboard()`, cached for ADMIN_DASHBOARD_TTL seconds per range and currency."""
+    key = admin_dashboard_key(start, end, currency or f'to-{base}')
+    data = cache.get(key)
+    if data is None:
+        data = build_admin_dashboard(start, end, currency, base)
+        cache.set(key, data, timeout=ADMIN_DASHBOARD_TTL)
+    return data
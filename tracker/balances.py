@@ -0,0 +1,98 @@
+"""Point-in-time account balances from the monthly balance checkpoints.
+
+`AccountBalanceSnapshot` holds, per account and month, the net of the
+account's transactions up to the end of that month. The balance at the end
+of any day is the checkpoint of the month before it plus that month's
+transactions up to the day, so a history never replays more than the
+requested range. The account's `opening_balance` is added throughout, so
+the history agrees with `reconcile_balances` rather than absorbing drift.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.db.models import Sum
+
+from .dashboard import ZERO, month_bounds
+from .models import SIGNED_AMOUNT, AccountBalanceSnapshot
+
+INTERVALS = ('day', 'week', 'month')
+MAX_POINTS = 400
+DEFAULT_PERIODS = 30
+LATEST_END = date(9999, 11, 30)  # later weeks and months end past date.max
+
+
+def period_end(day, interval):
+    """Last day of the day, ISO week (Monday to Sunday) or month containing `day`."""
+    if interval == 'day':
+        return day
+    if interval == 'week':
+        return day + timedelta(days=6 - day.weekday())
+    return month_bounds(day)[1] - timedelta(days=1)
+
+
+def period_ends(start, end, interval, limit=MAX_POINTS):
+    """End of every period from `start` to `end`, the last one cut at `end`; None past `limit` points."""
+    points = []
+    day = start
+    while day <= end:
+        if len(points) == limit:
+            return None
+        points.append(min(period_end(day, interval), end))
+        day = points[-1] + timedelta(days=1)
+    return points
+
+
+def default_start(end, interval):
+    """Start of a range of DEFAULT_PERIODS periods ending with the one containing `end`, or date.min."""
+    if interval == 'month':
+        index = end.year * 12 + end.month - DEFAULT_PERIODS
+        return end.replace(year=index // 12, month=index % 12 + 1, day=1) if index >= 12 else date.min
+    days = DEFAULT_PERIODS - 1 if interval == 'day' else end.weekday() + 7 * (DEFAULT_PERIODS - 1)
+    return date.fromordinal(max(date.min.toordinal(), end.toordinal() - days))
+
+
+def balance_history(account, start, end, interval):
+    """Balance of `account` at the end of each `interval` period from `start` to `end`.
+
+    Costs two checkpoint lookups and one grouped scan of the transactions
+    from the first month of the range (only of the last month for monthly
+    intervals, whose other points are checkpoints).
+    """
+    points = period_ends(start, end, interval)
+    first_month = start.replace(day=1)
+    checkpoints = AccountBalanceSnapshot.objects.filter(account=account).order_by('-month')
+    carried = checkpoints.filter(month__lt=first_month).values_list('running_total', flat=True).first() or ZERO
+    in_range = dict(checkpoints.filter(month__gte=first_month, month__lte=end).values_list('month', 'running_total'))
+
+    # Running totals at the start and end of every month of the range
+    opens, closes = {}, {}
+    month = first_month
+    while month <= end:
+        opens[month] = carried
+        carried = closes[month] = in_range.get(month, carried)
+        month = month_bounds(month)[1]
+
+    scan_from = end.replace(day=1) if interval == 'month' else first_month
+    nets = list(
+        account.transactions.filter(date__gte=scan_from, date__lte=end)
+        .values('date').annotate(net=Sum(SIGNED_AMOUNT)).order_by('date')
+        .values_list('date', 'net')
+    )
+    days = [day for day, _ in nets]
+    cumulative = list(accumulate(net for _, net in nets))
+
+    def scanned(count):
+        # Net of the first `count` scanned days
+        return cumulative[count - 1] if count else ZERO
+
+    opening = account.opening_balance
+    history = []
+    for day in points:
+        month, next_month = month_bounds(day)
+        if day == next_month - timedelta(days=1):
+            running = closes[month]
+        else:
+            running = opens[month] + scanned(bisect_right(days, day)) - scanned(bisect_left(days, month))
+        history.append({'date': day, 'balance': opening + running})
+    return history
@@ -0,0 +1,110 @@
+"""Bulk update and delete of a user's transactions.
+
+The selected rows are locked and their ledger columns read with one query,
+changed or deleted with one UPDATE/DELETE, and their effect on balances,
+checkpoints, goals and rollups corrected with one `LedgerDelta`: one
+grouped delta per account, month and bucket, however many rows changed.
+Deletions are recorded as tombstones for syncing clients with one INSERT.
+
+`delete_transactions()` is the same delete without the size limit, behind
+`Transaction.objects.filter(...).delete()` and the cascades from deleted
+accounts and categories.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from .ledger import LedgerDelta
+from .models import Tombstone, Transaction
+
+MAX_BULK_ROWS = 5000
+FILTER_LOOKUPS = {'category': 'category_id', 'account': 'account_id', 'from': 'date__gte', 'to': 'date__lte'}
+
+
+class SelectionTooLarge(Exception):
+    pass
+
+
+class CurrencyMismatch(Exception):
+    pass
+
+
+def select_transactions(user, ids=None, filters=None):
+    """The user's transactions with the given ids, or matching `filters` (keys of FILTER_LOOKUPS)."""
+    queryset = Transaction.objects.filter(user=user)
+    if ids is not None:
+        return queryset.filter(pk__in=ids)
+    return queryset.filter(**{FILTER_LOOKUPS[key]: value for key, value in filters.items()})
+
+
+def lock_selection(queryset, bounded=True):
+    """Lock the selected rows and return them with their ledger fields, in id order.
+
+    Raises SelectionTooLarge past MAX_BULK_ROWS rows, unless not `bounded`.
+    """
+    rows = queryset.select_for_update().only(*Transaction.LEDGER_FIELDS).order_by('pk')
+    if not bounded:
+        return list(rows)
+    rows = list(rows[:MAX_BULK_ROWS + 1])
+    if len(rows) > MAX_BULK_ROWS:
+        raise SelectionTooLarge(f'The selection matches more than {MAX_BULK_ROWS} transactions.')
+    return rows
+
+
+def bulk_update(queryset, changes):
+    """Apply `changes` (field name to value) to the selected transactions; returns how many changed.
+
+    Transactions are only moved to an account of their own currency (those
+    without one take the account's), since amounts are not converted.
+    """
+    values = {Transaction._meta.get_field(name).attname: getattr(value, 'pk', value)
+              for name, value in changes.items()}
+    account = changes.get('account')
+    delta = LedgerDelta()
+    with transaction.atomic():
+        rows = lock_selection(queryset)
+        if not rows:
+            return 0
+        if account is not None:
+            mismatched = sum(1 for row in rows if row.currency and row.currency != account.currency)
+            if mismatched:
+                raise CurrencyMismatch(
+                    f'{mismatched} of the selected transactions are not in {account.currency}, the currency of the account.')
+            values['currency'] = account.currency
+        Transaction.objects.filter(pk__in=[row.pk for row in rows]).update(**values, updated_at=now())
+        for row in rows:
+            delta.add_transaction(row, sign=-1)
+            for attname, value in values.items():
+                setattr(row, attname, value)
+            delta.add_transaction(row)
+        delta.apply()
+    return len(rows)
+
+
+def delete_rows(rows):
+    """Delete the locked `rows` and reverse their effect; records their tombstones."""
+    delta = LedgerDelta()
+    deleted = defaultdict(list)
+    for row in rows:
+        delta.add_transaction(row, sign=-1)
+        deleted[row.user_id].append(row.pk)
+    ids = [row.pk for row in rows]
+    for start in range(0, len(ids), MAX_BULK_ROWS):
+        Transaction.objects.filter(pk__in=ids[start:start + MAX_BULK_ROWS]).delete_rows()
+    for user_id, object_ids in deleted.items():
+        Tombstone.objects.record(user_id, 'transactions', object_ids)
+    delta.apply()
+    return len(rows)
+
+
+def bulk_delete(queryset):
+    """Delete the selected transactions; returns how many were deleted."""
+    with transaction.atomic():
+        return delete_rows(lock_selection(queryset))
+
+
+def delete_transactions(queryset):
+    """Delete every selected transaction, however many; returns how many were deleted."""
+    with transaction.atomic():
+        return delete_rows(lock_selection(queryset, bounded=False))
@@ -0,0 +1,67 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PAYLOAD_TTL = 60 * 60 * 24
+
+
+def version_key(user_id):
+    return f'dashboard:version:{user_id}'
+
+
+def payload_key(user_id, version, today):
+    return f'dashboard:payload:{user_id}:{version}:{today:%Y%m%d}'
+
+
+RATES_VERSION_KEY = 'dashboard:version:rates'
+
+
+def dashboard_version(user_id):
+    """Current dashboard version of a user; changes whenever their data or the exchange rates do."""
+    keys = [version_key(user_id), RATES_VERSION_KEY]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Never restart from a fixed value, or an evicted version could be
+            # reissued and match a stale payload or a client's old ETag
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return '{}.{}'.format(*(versions[key] for key in keys))
+
+
+def bump_dashboard_version(*user_ids):
+    """Invalidate the cached dashboards (and ETags) of `user_ids`.
+
+    The bump happens once the current transaction commits; bumping earlier
+    would let a concurrent reader cache pre-commit data under the new version.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    def bump():
+        version = time.time_ns()
+        cache.set_many({version_key(user_id): version for user_id in user_ids}, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def bump_rates_version():
+    """Invalidate every cached dashboard after the exchange rates changed."""
+    transaction.on_commit(lambda: cache.set(RATES_VERSION_KEY, time.time_ns(), timeout=None))
+
+
+def get_dashboard(user_id, version, today):
+    return cache.get(payload_key(user_id, version, today))
+
+
+def set_dashboard(user_id, version, today, payload):
+    cache.set(payload_key(user_id, version, today), payload, timeout=PAYLOAD_TTL)
+
+
+ADMIN_DASHBOARD_TTL = 60
+
+
+def admin_dashboard_key(start, end, currency):
+    return f'admin-dashboard:{start:%Y%m}:{end:%Y%m}:{currency or "all"}'
@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, DateField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.timezone import now
+
+from .fx import converted, rate_expression
+from .models import Budget, Category, Goal, MonthlyRollup
+
+ZERO = Decimal('0.00')
+
+SECTION_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+
+
+def month_bounds(day):
+    """Return the first day of `day`'s month and the first day of the next one."""
+    start = day.replace(day=1)
+    if start.month == 12:
+        end = date(start.year + 1, 1, 1)
+    else:
+        end = date(start.year, start.month + 1, 1)
+    return start, end
+
+
+def next_month(field):
+    """SQL expression for the first day of the month after `field`, a first-of-month date."""
+    return TruncMonth(ExpressionWrapper(F(field) + timedelta(days=31), output_field=DateField()))
+
+
+def monthly_totals(user):
+    """Income and expense totals per month in the user's base currency, oldest first.
+
+    Each rollup bucket is converted inside the grouped query at the latest rate
+    of its month. Returns the rows and the currencies lacking a rate.
+    """
+    base = user.base_currency
+    rows = (
+        MonthlyRollup.objects.filter(user=user, count__gt=0)
+        .annotate(rate_before=next_month('month'))
+        .annotate(base_total=converted('total', 'currency', base, OuterRef('rate_before')))
+        .values('month', 'transaction_type')
+        .annotate(total=Sum('base_total'), buckets=Count('id'), converted_buckets=Count('base_total'))
+        .order_by('month')
+    )
+    rows = list(rows)
+
+    missing_rates = []
+    if any(row['buckets'] != row['converted_buckets'] for row in rows):
+        missing_rates = sorted(set(
+            MonthlyRollup.objects.filter(user=user, count__gt=0)
+            .annotate(rate_before=next_month('month'))
+            .annotate(rate=rate_expression('currency', base, OuterRef('rate_before')))
+            .filter(rate__isnull=True).exclude(currency='')
+            .values_list('currency', flat=True)
+        ))
+    return rows, missing_rates
+
+
+def summary_section(monthly_data, today):
+    """All-time and current-month totals, added up from the monthly history."""
+    month = today.strftime("%Y-%m")
+    total_income = sum((data['income'] for data in monthly_data.values()), ZERO)
+    total_expenses = sum((data['expenses'] for data in monthly_data.values()), ZERO)
+    this_month = monthly_data.get(month, {'income': ZERO, 'expenses': ZERO})
+
+    all_time_summary = {
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net_savings': total_income - total_expenses,
+    }
+    current_month_summary = {
+        'month': month,
+        'income': this_month['income'],
+        'expenses': this_month['expenses'],
+        'savings': this_month['income'] - this_month['expenses'],
+    }
+    return all_time_summary, current_month_summary
+
+
+def category_section(user, today):
+    """Budget vs expenditure per category for the current month.
+
+    This month's expenses and budgets are each summed per category by a
+    correlated subquery in one query, so the cost does not grow with the
+    category count and neither sum is multiplied by the other's rows.
+    """
+    start, end = month_bounds(today)
+    expenses = (
+        MonthlyRollup.objects.filter(category=OuterRef('pk'), transaction_type='expense', month=start)
+        .annotate(base_total=converted('total', 'currency', user.base_currency, end))
+        .values('category').annotate(total=Sum('base_total')).values('total')
+    )
+    budgets = (
+        Budget.objects.filter(category=OuterRef('pk'), user=user, month__gte=start, month__lt=end)
+        .values('category').annotate(total=Sum('amount')).values('total')
+    )
+    rows = (
+        Category.objects.filter(user=user)
+        .annotate(expenditure=Subquery(expenses), month_budget=Subquery(budgets))
+        .values('id', 'name', 'expenditure', 'month_budget')
+        .order_by('id')
+    )
+
+    category_summary = []
+    for row in rows:
+        expenditure = row['expenditure'] or ZERO
+        budget_amount = row['month_budget'] or ZERO
+        status = 'OK'
+        if row['month_budget'] is not None and expenditure > budget_amount:
+            status = 'Exceeded'
+
+        category_summary.append({
+            'category': row['name'],
+            'expenditure': expenditure,
+            'budget': budget_amount,
+            'balance': budget_amount - expenditure,
+            'status': status,
+        })
+    return category_summary
+
+
+def history_by_month(rows):
+    monthly_data = {}
+    for entry in rows:
+        month_str = entry['month'].strftime("%Y-%m")
+        data = monthly_data.setdefault(month_str, {'income': ZERO, 'expenses': ZERO})
+        if entry['transaction_type'] == 'income':
+            data['income'] = entry['total'] or ZERO
+        else:
+            data['expenses'] = entry['total'] or ZERO
+    return monthly_data
+
+
+def history_section(monthly_data):
+    """Income, expenses and savings per month, oldest first."""
+    return [
+        {
+            'month': month,
+            'income': data['income'],
+            'expenses': data['expenses'],
+            'savings': data['income'] - data['expenses'],
+        }
+        for month, data in monthly_data.items()
+    ]
+
+
+def goals_section(user):
+    return list(Goal.objects.filter(user=user).with_progress())
+
+
+def assemble_dashboard(user, today, monthly, category_summary, goals):
+    rows, missing_rates = monthly
+    monthly_data = history_by_month(rows)
+    all_time_summary, current_month_summary = summary_section(monthly_data, today)
+
+    return {
+        'base_currency': user.base_currency,
+        'missing_rates': missing_rates,
+        'all_time_summary': all_time_summary,
+        'current_month_summary': current_month_summary,
+        'category_summary': category_summary,
+        'monthly_history': history_section(monthly_data),
+        'goals': goals,
+    }
+
+
+def build_dashboard(user, today=None):
+    """Build the dashboard payload for `user` from a constant number of queries.
+
+    Amounts are in the user's base currency; `missing_rates` lists the
+    currencies whose amounts were left out for lack of an exchange rate.
+    """
+    today = today or now().date()
+    return assemble_dashboard(
+        user, today, monthly_totals(user), category_section(user, today), goals_section(user))
+
+
+def run_section(section, *args):
+    # Pool threads live outside the request cycle, so expire their
+    # connections the way request_started/request_finished would
+    close_old_connections()
+    try:
+        return section(*args)
+    finally:
+        close_old_connections()
+
+
+async def build_dashboard_async(user, today=None):
+    """`build_dashboard()` with the independent section queries run concurrently.
+
+    The sections run in SECTION_EXECUTOR, a bounded thread pool whose threads
+    hold their own database connections, so at most DASHBOARD_WORKERS
+    connections per process are used however many requests are waiting.
+    """
+    today = today or now().date()
+    loop = asyncio.get_running_loop()
+
+    def submit(section, *args):
+        # Carry the caller's context (e.g. database routing) into the pool thread
+        return loop.run_in_executor(SECTION_EXECUTOR, contextvars.copy_context().run, run_section, section, *args)
+
+    monthly, category_summary, goals = await asyncio.gather(
+        submit(monthly_totals, user),
+        submit(category_section, user, today),
+        submit(goals_section, user),
+    )
+    return assemble_dashboard(user, today, monthly, category_summary, goals)
@@ -0,0 +1,48 @@
+from django import forms
+
+from .admin_dashboard import DEFAULT_MONTHS, default_range, shift_months
+from .models import Account
+
+MAX_DASHBOARD_MONTHS = 120
+
+
+class MonthInput(forms.DateInput):
+    input_type = 'month'
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs, format='%Y-%m')
+
+
+class AdminDashboardForm(forms.Form):
+    """Month range (inclusive) and optional currency of the admin dashboard."""
+    start = forms.DateField(label='From', required=False, input_formats=['%Y-%m'], widget=MonthInput)
+    end = forms.DateField(label='To', required=False, input_formats=['%Y-%m'], widget=MonthInput)
+    currency = forms.ChoiceField(
+        required=False,
+        choices=[('', 'All currencies')] + list(Account._meta.get_field('currency').choices),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end:
+            if start > end:
+                raise forms.ValidationError('The start month must not be after the end month.')
+            if (end.year - start.year) * 12 + end.month - start.month >= MAX_DASHBOARD_MONTHS:
+                raise forms.ValidationError(f'Select at most {MAX_DASHBOARD_MONTHS} months.')
+        return cleaned_data
+
+    def selection(self, today):
+        """(start, end, currency) to show; the default range fills in whatever is missing or invalid."""
+        start, end = default_range(today)
+        if not self.is_bound or not self.is_valid():
+            return start, end, None
+
+        data = self.cleaned_data
+        if data['start'] and data['end']:
+            start, end = data['start'], data['end']
+        elif data['start']:
+            start, end = data['start'], min(max(end, data['start']), shift_months(data['start'], MAX_DASHBOARD_MONTHS - 1))
+        elif data['end']:
+            start, end = shift_months(data['end'], 1 - DEFAULT_MONTHS), data['end']
+        return start, end, data['currency'] or None
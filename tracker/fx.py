@@ -0,0 +1,108 @@
+"""Currency conversion with the rates in `ExchangeRate`.
+
+Amounts convert in SQL with `converted()`, which looks up the rate of
+each row's currency with a correlated subquery on the (base, quote, date)
+index.
+"""
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from django.db import transaction
+
+from .cache import bump_rates_version
+from .models import CURRENCY_CHOICES, ExchangeRate
+
+BATCH_SIZE = 1000
+CURRENCIES = {value for value, _ in CURRENCY_CHOICES}
+ONE = Decimal(1)
+
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+RATE_FIELD = DecimalField(max_digits=18, decimal_places=8)
+
+
+def latest_rates(base, quote, before):
+    return ExchangeRate.objects.filter(base=base, quote=quote, date__lt=before).order_by('-date').values('rate')[:1]
+
+
+def rate_expression(currency, base, before):
+    """SQL expression for the rate converting `currency` (a field name) into `base`.
+
+    Uses the latest rate dated before `before` (a date or an expression), or
+    the inverse of the opposite pair; NULL when neither exists, so Sum()
+    skips amounts that cannot be converted.
+    """
+    return Case(
+        When(**{currency: base}, then=Value(ONE)),
+        default=Coalesce(
+            Subquery(latest_rates(OuterRef(currency), base, before)),
+            Value(ONE) / Subquery(latest_rates(base, OuterRef(currency), before)),
+            output_field=RATE_FIELD,
+        ),
+        output_field=RATE_FIELD,
+    )
+
+
+def converted(amount, currency, base, before):
+    """`amount` (a field name) converted into `base` inside the query.
+
+    Amounts without a currency are taken to be in `base` already.
+    """
+    return Case(
+        When(Q(**{currency: base}) | Q(**{currency: ''}), then=F(amount)),
+        default=F(amount) * rate_expression(currency, base, before),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def parse_rate_row(row):
+    """Build an ExchangeRate from a CSV row, raising ValueError on bad input."""
+    try:
+        rate = ExchangeRate(
+            date=date.fromisoformat(row['date'].strip()),
+            base=row['base'].strip().upper(),
+            quote=row['quote'].strip().upper(),
+            rate=Decimal(row['rate'].strip()),
+        )
+    except (KeyError, AttributeError, InvalidOperation) as exc:
+        raise ValueError(f'Expected date, base, quote and rate columns ({exc!r}).')
+    if rate.base not in CURRENCIES or rate.quote not in CURRENCIES:
+        raise ValueError('Unsupported currency.')
+    if rate.base == rate.quote:
+        raise ValueError('Base and quote must differ.')
+    if not rate.rate.is_finite() or rate.rate <= 0:
+        raise ValueError('Rate must be positive.')
+    return rate
+
+
+def load_rates(lines):
+    """Upsert the rates of a date,base,quote,rate CSV in batches.
+
+    Returns the number of rows loaded and a list of (line number, message)
+    for the rows that were skipped.
+    """
+    loaded, errors, batch = 0, [], []
+
+    def flush():
+        ExchangeRate.objects.bulk_create(
+            batch, update_conflicts=True, unique_fields=['base', 'quote', 'date'], update_fields=['rate'])
+
+    with transaction.atomic():
+        for number, row in enumerate(csv.DictReader(lines), start=2):
+            try:
+                batch.append(parse_rate_row(row))
+            except ValueError as exc:
+                errors.append((number, str(exc)))
+                continue
+            if len(batch) >= BATCH_SIZE:
+                flush()
+                loaded += len(batch)
+                batch = []
+        if batch:
+            flush()
+            loaded += len(batch)
+        bump_rates_version()
+    return loaded, errors
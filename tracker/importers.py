@@ -0,0 +1,183 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+import bleach
+from django.db import transaction
+
+from .ledger import LedgerDelta
+from .models import Account, Category, Transaction
+from .serializers import ALLOWED_TAGS, ALLOWED_ATTRS
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+MAX_AMOUNT = Decimal('99999999.99')
+TRANSACTION_TYPES = {value for value, _ in Transaction.TRANSACTION_TYPES}
+CURRENCIES = {value for value, _ in Account._meta.get_field('currency').choices}
+
+
+class RowError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class UndecodableLine(ValueError):
+    def __init__(self, line):
+        super().__init__(f'Line {line} is not valid UTF-8.')
+        self.line = line
+
+
+def decode_lines(upload):
+    """Yield the upload's lines as text, raising `UndecodableLine` at the first one that is not UTF-8."""
+    encoding = 'utf-8-sig'
+    for number, line in enumerate(upload, start=1):
+        try:
+            yield line.decode(encoding)
+        except UnicodeDecodeError:
+            raise UndecodableLine(number) from None
+        encoding = 'utf-8'
+
+
+def iter_csv_rows(upload):
+    """Yield one dict per CSV data row, reading the upload line by line."""
+    yield from csv.DictReader(decode_lines(upload))
+
+
+def iter_ndjson_rows(upload):
+    """Yield one parsed object per non-blank NDJSON line."""
+    for line in decode_lines(upload):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else ValueError('Line is not a JSON object.')
+
+
+def detect_format(upload):
+    name = (upload.name or '').lower()
+    content_type = (upload.content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    return None
+
+
+def by_name_or_id(objects):
+    lookup = {}
+    for obj in objects:
+        lookup[str(obj.pk)] = obj
+        lookup.setdefault(obj.name.strip().lower(), obj)
+    return lookup
+
+
+class TransactionImporter:
+    """Validate and bulk insert uploaded transactions for one user.
+
+    The user's categories and accounts are loaded once up front, rows are
+    inserted `CHUNK_SIZE` at a time with `bulk_create`, and balances and
+    rollups are adjusted once per account/bucket at the end. Invalid rows are
+    reported and skipped; they never abort the rest of the import.
+    """
+
+    def __init__(self, user, chunk_size=None):
+        self.user = user
+        self.chunk_size = chunk_size or CHUNK_SIZE
+        self.categories = by_name_or_id(Category.objects.filter(user=user))
+        self.accounts = by_name_or_id(Account.objects.filter(user=user))
+        self.created = 0
+        self.errors = []
+        self.error_count = 0
+
+    def run(self, rows):
+        delta = LedgerDelta()
+        pending = []
+        with transaction.atomic():
+            for number, row in enumerate(rows, start=1):
+                try:
+                    pending.append(self.build(row))
+                except RowError as exc:
+                    self.add_error(number, exc.errors)
+                    continue
+                if len(pending) >= self.chunk_size:
+                    self.flush(pending, delta)
+                    pending = []
+            self.flush(pending, delta)
+            delta.apply()
+        return {
+            'created': self.created,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
+
+    def add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def flush(self, pending, delta):
+        if not pending:
+            return
+        Transaction.objects.bulk_create(pending)
+        for txn in pending:
+            delta.add_transaction(txn)
+        self.created += len(pending)
+
+    def build(self, row):
+        if isinstance(row, Exception):
+            raise RowError({'non_field_errors': [str(row)]})
+
+        def value(key):
+            raw = row.get(key)
+            return '' if raw is None else str(raw).strip()
+
+        errors = {}
+
+        try:
+            txn_date = date.fromisoformat(value('date'))
+        except ValueError:
+            errors['date'] = ['Enter a valid date in YYYY-MM-DD format.']
+
+        try:
+            amount = Decimal(value('amount'))
+            if not amount.is_finite() or amount <= 0 or amount > MAX_AMOUNT or amount != amount.quantize(Decimal('0.01')):
+                raise InvalidOperation
+        except InvalidOperation:
+            errors['amount'] = ['Enter a positive amount with at most 2 decimal places.']
+
+        transaction_type = value('transaction_type').lower()
+        if transaction_type not in TRANSACTION_TYPES:
+            errors['transaction_type'] = [f'Must be one of: {", ".join(sorted(TRANSACTION_TYPES))}.']
+
+        category = self.categories.get(value('category').lower())
+        if category is None:
+            errors['category'] = ['Unknown category.']
+
+        account = None
+        if value('account'):
+            account = self.accounts.get(value('account').lower())
+            if account is None:
+                errors['account'] = ['Unknown account.']
+
+        currency = value('currency').upper() or (account.currency if account else None)
+        if currency and currency not in CURRENCIES:
+            errors['currency'] = ['Unsupported currency.']
+
+        if errors:
+            raise RowError(errors)
+
+        return Transaction(
+            user=self.user,
+            account=account,
+            category=category,
+            transaction_type=transaction_type,
+            amount=amount,
+            currency=currency,
+            description=bleach.clean(value('description'), tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True),
+            date=txn_date,
+        )
@@ -0,0 +1,183 @@
+"""Database-backed background jobs.
+
+`enqueue()` stores a queued `Job`; `manage.py runworker` claims queued jobs
+with `claim_jobs()` and runs them with `execute()`, usually in a process
+pool. Handlers are registered per job kind with `@handler`.
+
+A running job's `heartbeat_at` is refreshed by its progress reports and
+by the worker every HEARTBEAT_EVERY. `requeue_stale()` recovers the jobs
+whose heartbeat stopped, however long they have run; a worker whose job
+was recovered that way no longer records its outcome.
+"""
+import os
+import socket
+import tempfile
+import threading
+import traceback
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .exports import API_COLUMNS, CONTENT_TYPES, csv_lines, ndjson_lines
+from .models import AccountBalanceSnapshot, Job, MonthlyRollup, Transaction
+
+MAX_ATTEMPTS = 3
+HEARTBEAT_EVERY = timedelta(minutes=1)
+STALE_AFTER = timedelta(minutes=10)  # without a heartbeat
+PROGRESS_EVERY = 5000  # rows between progress updates
+
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(user, kind, params=None):
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind {kind!r}')
+    return Job.objects.create(user=user, kind=kind, params=params or {})
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_jobs(limit, worker=None):
+    """Mark up to `limit` of the oldest queued jobs as running and return their ids.
+
+    Where the database supports it, candidates are locked with SELECT ... FOR
+    UPDATE SKIP LOCKED so concurrent workers pass over each other's rows.
+    Elsewhere (SQLite) the claim runs in autocommit, since a read transaction
+    there cannot be upgraded to a write while another worker writes; the
+    conditional UPDATE keeps each claim exclusive either way.
+    """
+    if limit <= 0:
+        return []
+    worker = worker or worker_name()
+    row_locks = connections[Job.objects.db].features.has_select_for_update_skip_locked
+    with transaction.atomic() if row_locks else nullcontext():
+        candidates = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED).order_by('created_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        claimed = []
+        for job_id in candidates:
+            updated = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, started_at=now(), heartbeat_at=now(), attempts=F('attempts') + 1)
+            if updated:
+                claimed.append(job_id)
+    return claimed
+
+
+def requeue_stale(older_than=STALE_AFTER):
+    """Recover jobs left running by a worker that died: retry them, or fail them after MAX_ATTEMPTS."""
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=now() - older_than)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=Job.FAILED, error='Worker stopped responding.', finished_at=now())
+    requeued = stale.update(status=Job.QUEUED, progress=0, worker='')
+    return requeued, failed
+
+
+def heartbeat(job_ids):
+    """Mark the running jobs `job_ids` as alive."""
+    return Job.objects.filter(pk__in=job_ids, status=Job.RUNNING).update(heartbeat_at=now())
+
+
+@contextmanager
+def keep_alive(job_ids):
+    """Heartbeat `job_ids` from a background thread while the block runs, e.g. a job run in this thread."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(HEARTBEAT_EVERY.total_seconds()):
+                try:
+                    heartbeat(job_ids)
+                except DatabaseError:
+                    pass  # try again at the next beat
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name='job-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def set_progress(job, percent):
+    """Record a running job's progress, and its heartbeat at least every HEARTBEAT_EVERY."""
+    percent = max(0, min(100, int(percent)))
+    moment = now()
+    beat_due = job.heartbeat_at is None or moment - job.heartbeat_at >= HEARTBEAT_EVERY
+    if percent != job.progress or beat_due:
+        job.progress, job.heartbeat_at = percent, moment
+        Job.objects.filter(pk=job.pk).update(progress=percent, heartbeat_at=moment)
+
+
+def execute(job_id):
+    """Run a claimed job and record its outcome; returns the final status.
+
+    The outcome is only written while the job is still this claim's: if it
+    was requeued meanwhile, and perhaps claimed again, it is discarded and
+    None is returned.
+    """
+    job = Job.objects.select_related('user').get(pk=job_id)
+    try:
+        job.result = HANDLERS[job.kind](job)
+    except Exception:
+        job.status = Job.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = Job.SUCCEEDED
+        job.progress = 100
+    job.finished_at = now()
+    recorded = Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker, attempts=job.attempts).update(
+        status=job.status, progress=job.progress, result=job.result, result_file=job.result_file,
+        error=job.error, finished_at=job.finished_at)
+    if not recorded:
+        if job.result_file:
+            job.result_file.delete(save=False)
+        return None
+    return job.status
+
+
+@handler('export_transactions')
+def export_transactions(job):
+    """Write the user's transactions to a CSV or NDJSON result file."""
+    file_format = job.params.get('format', 'csv')
+    if file_format not in CONTENT_TYPES:
+        raise ValueError(f'Unsupported export format {file_format!r}')
+    queryset = Transaction.objects.filter(user=job.user).order_by('date', 'id')
+    total = queryset.count()
+    lines = csv_lines if file_format == 'csv' else ndjson_lines
+
+    rows = 0
+    with tempfile.TemporaryFile(mode='w+b') as fh:
+        for line in lines(queryset, API_COLUMNS):
+            fh.write(line.encode())
+            rows += 1
+            if total and rows % PROGRESS_EVERY == 0:
+                set_progress(job, 100 * rows / (total + 1))
+        fh.seek(0)
+        job.result_file.save(f'transactions-{job.pk}.{file_format}', File(fh), save=False)
+    return {'rows': total, 'format': file_format}
+
+
+@handler('rebuild_rollups')
+def rebuild_rollups(job):
+    return {
+        'rows': MonthlyRollup.objects.rebuild(user=job.user),
+        'checkpoints': AccountBalanceSnapshot.objects.rebuild(user=job.user),
+    }
@@ -0,0 +1,63 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from .cache import bump_dashboard_version
+from .models import Account, AccountBalanceSnapshot, Goal, MonthlyRollup
+
+
+def signed_amount(transaction_type, amount):
+    """Effect of a transaction on its account balance."""
+    return amount if transaction_type == 'income' else -amount
+
+
+class LedgerDelta:
+    """Net effect of a batch of transaction writes on balances, balance checkpoints, goals and the monthly rollup.
+
+    Writes are recorded with `add()`/`add_transaction()` and applied once with
+    `apply()`, which issues one UPDATE for all touched account balances, one
+    for all touched goals and a few statements per touched checkpoint month
+    and rollup bucket, however many rows were written.
+    """
+
+    def __init__(self):
+        self.balances = defaultdict(Decimal)
+        self.checkpoints = defaultdict(Decimal)
+        self.goals = defaultdict(Decimal)
+        self.rollups = defaultdict(lambda: [Decimal('0.00'), 0])
+
+    def add(self, *, user_id, account_id, category_id, transaction_type, amount, date, currency=None, count=1,
+            goal_id=None):
+        """Record `count` transactions summing to `amount` (negative to reverse them)."""
+        if goal_id:
+            self.goals[goal_id] += amount
+        if account_id:
+            self.balances[account_id] += signed_amount(transaction_type, amount)
+            self.checkpoints[(account_id, date.replace(day=1))] += signed_amount(transaction_type, amount)
+        bucket = self.rollups[(user_id, date.replace(day=1), category_id, transaction_type, currency or '')]
+        bucket[0] += amount
+        bucket[1] += count
+
+    def add_transaction(self, txn, sign=1):
+        self.add(
+            user_id=txn.user_id,
+            account_id=txn.account_id,
+            category_id=txn.category_id,
+            transaction_type=txn.transaction_type,
+            amount=sign * txn.amount,
+            date=txn.date,
+            currency=txn.currency,
+            count=sign,
+            goal_id=txn.goal_id,
+        )
+
+    def apply(self):
+        Account.objects.apply_balance_deltas(self.balances)
+        # After the balance UPDATE, which locks the accounts' rows; in a fixed order
+        for (account_id, month), amount in sorted(self.checkpoints.items()):
+            if amount:
+                AccountBalanceSnapshot.objects.apply_delta(account_id, month, amount)
+        Goal.objects.apply_contribution_deltas(self.goals)
+        for (user_id, month, category_id, transaction_type, currency), (total, count) in self.rollups.items():
+            if total or count:
+                MonthlyRollup.objects.apply_delta(user_id, month, category_id, transaction_type, currency, total, count)
+        bump_dashboard_version(*{user_id for user_id, *_ in self.rollups})
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.fx import load_rates
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = "Load exchange rates from a CSV file with date,base,quote,rate columns, replacing existing rates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file; a rate means one unit of base is worth `rate` units of quote.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as fh:
+                loaded, errors = load_rates(fh)
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for number, message in errors[:MAX_REPORTED_ERRORS]:
+            self.stderr.write(f"Line {number}: {message}")
+        if errors:
+            self.stderr.write(self.style.WARNING(f"Skipped {len(errors)} invalid rows."))
+        self.stdout.write(self.style.SUCCESS(f"Loaded {loaded} exchange rates."))
@@ -0,0 +1,74 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from tracker.perf import (
+    BENCH_CACHES, DEFAULT_BUDGET_FILE, SeedConfig, check_budgets, compare_dashboards, format_asgi_report,
+    format_report, load_budgets, run_benchmarks, seed,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database with synthetic data, benchmark the dashboard, viewset and "
+        "admin endpoints and the list serializers, and fail if a performance budget is exceeded."
+    )
+
+    def add_arguments(self, parser):
+        defaults = SeedConfig()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--accounts', type=int, default=defaults.accounts, help="Accounts per user.")
+        parser.add_argument('--categories', type=int, default=defaults.categories, help="Categories per user.")
+        parser.add_argument('--budget-months', type=int, default=defaults.budget_months,
+                            help="Months of budgets per expense category.")
+        parser.add_argument('--transactions', type=int, default=defaults.transactions, help="Transactions per user.")
+        parser.add_argument('--seed', type=int, default=defaults.seed, help="Random seed for the synthetic data.")
+        parser.add_argument('--iterations', type=int, default=20, help="Requests per scenario.")
+        parser.add_argument('--budget-file', default=os.path.join(settings.BASE_DIR, DEFAULT_BUDGET_FILE),
+                            help="JSON file of per-scenario budgets; pass an empty string to skip the check.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+        parser.add_argument('--asgi', action='store_true',
+                            help="Also compare the sync and async dashboards served through the ASGI handler.")
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help="Simultaneous requests for the --asgi comparison (besides 1).")
+
+    def handle(self, *args, **options):
+        config = SeedConfig(
+            users=options['users'],
+            accounts=options['accounts'],
+            categories=options['categories'],
+            budget_months=options['budget_months'],
+            transactions=options['transactions'],
+            seed=options['seed'],
+        )
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(SECURE_SSL_REDIRECT=False, CACHES=BENCH_CACHES):
+                users = seed(config)
+                results = run_benchmarks(users[0], iterations=options['iterations'])
+                asgi_results = None
+                if options['asgi']:
+                    asgi_results = compare_dashboards(
+                        users[0], iterations=options['iterations'], concurrency=(1, options['concurrency']))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(dict(results, asgi=asgi_results) if asgi_results else results, indent=2))
+        else:
+            self.stdout.write(format_report(results))
+            if asgi_results:
+                self.stdout.write('\n' + format_asgi_report(asgi_results))
+
+        if options['budget_file']:
+            violations = check_budgets(results, load_budgets(options['budget_file']))
+            if violations:
+                raise CommandError("Performance budget exceeded:\n  " + "\n  ".join(violations))
+            self.stdout.write(self.style.SUCCESS("All performance budgets met."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.models import AccountBalanceSnapshot, MonthlyRollup, User
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly transaction rollup and the account balance checkpoints from the raw transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild the rollups of the user with this email.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['user']!r}.")
+
+        created = MonthlyRollup.objects.rebuild(user=user)
+        checkpoints = AccountBalanceSnapshot.objects.rebuild(user=user)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} rollup rows and {checkpoints} balance checkpoints."))
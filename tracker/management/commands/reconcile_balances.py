@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+# Pool processes are started with "spawn", so they import this module afresh:
+# keep model imports inside the functions, after django.setup() has run.
+
+MAX_LISTED = 50  # drifted accounts listed below verbosity 2
+
+
+def init_process():
+    import django
+    django.setup()
+
+
+def run_shard(bounds, fix):
+    from tracker.reconcile import reconcile_shard
+
+    close_old_connections()
+    try:
+        return reconcile_shard(*bounds, fix=fix)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Recompute every account's balance from its transactions and report (or fix) drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Correct the drifted balances.")
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="Size of the process pool; 0 checks the shards one at a time in this process.")
+        parser.add_argument('--shard-size', type=int, help="User ids per shard (one grouped query each).")
+
+    def handle(self, *args, **options):
+        from tracker.reconcile import SHARD_SIZE, shards
+
+        shard_size = options['shard_size'] or SHARD_SIZE
+        if shard_size <= 0:
+            raise CommandError("--shard-size must be positive.")
+        fix, processes = options['fix'], options['processes']
+        verbosity = options['verbosity']
+        pending = shards(shard_size)
+
+        if processes > 0 and len(pending) > 1:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(min(processes, len(pending)), mp_context=context,
+                                     initializer=init_process) as pool:
+                results = list(pool.map(run_shard, pending, [fix] * len(pending)))
+        else:
+            results = [run_shard(bounds, fix) for bounds in pending]
+
+        checked, listed, drifted, total_drift = 0, 0, 0, Decimal('0.00')
+        for shard_checked, shard_drifted in results:
+            checked += shard_checked
+            for account_id, user_id, balance, expected in shard_drifted:
+                drifted += 1
+                total_drift += abs(balance - expected)
+                if verbosity >= 2 or (verbosity and listed < MAX_LISTED):
+                    listed += 1
+                    self.stdout.write(f"Account {account_id} (user {user_id}): balance {balance}, "
+                                      f"expected {expected}, drift {balance - expected}")
+
+        if drifted > listed and verbosity:
+            self.stdout.write(f"... and {drifted - listed} more (use -v 2 to list all).")
+        summary = f"Checked {checked} accounts in {len(pending)} shards: {drifted} drifted by {total_drift} in total"
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(summary + "."))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(summary + ", all corrected."))
+        else:
+            self.stdout.write(self.style.WARNING(summary + "; run with --fix to correct them."))
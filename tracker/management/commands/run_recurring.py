@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.recurring import BATCH_SIZE, run_recurring
+
+
+class Command(BaseCommand):
+    help = "Generate the transactions due on every user's recurring schedules."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Generate occurrences due up to this day (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Schedules processed per database transaction.")
+
+    def handle(self, *args, **options):
+        through = None
+        if options['date']:
+            try:
+                through = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['date']!r}, expected YYYY-MM-DD.")
+        if options['batch_size'] <= 0:
+            raise CommandError("--batch-size must be positive.")
+
+        totals = run_recurring(through, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {totals['created']} transactions from {totals['schedules']} recurring schedules."))
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+# Pool processes are started with "spawn", so they import this module afresh:
+# keep model imports inside the functions, after django.setup() has run.
+
+
+def init_process():
+    import django
+    django.setup()
+
+
+def run_job(job_id):
+    from tracker.jobs import execute
+
+    close_old_connections()
+    try:
+        return job_id, execute(job_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Claim queued background jobs from the database and run them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help="Size of the process pool; 0 runs jobs one at a time in this process.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait between polls when the queue is empty.")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of polling for new jobs.")
+
+    def handle(self, *args, **options):
+        from tracker.jobs import worker_name
+
+        self.worker = worker_name()
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        processes = options['processes']
+        self.stdout.write(f"Worker {self.worker} started with {processes or 'no'} pool processes.")
+        try:
+            if processes > 0:
+                self.run_pool(processes)
+            else:
+                self.run_inline()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
+
+    def poll(self, limit):
+        from tracker.jobs import claim_jobs, requeue_stale
+
+        close_old_connections()
+        requeued, failed = requeue_stale()
+        if requeued or failed:
+            self.stderr.write(self.style.WARNING(f"Requeued {requeued} and failed {failed} stale jobs."))
+        return claim_jobs(limit, self.worker)
+
+    def report(self, job_id, status):
+        if status is None:
+            self.stderr.write(self.style.WARNING(f"Job {job_id} was requeued while running; its outcome was discarded."))
+            return
+        style = self.style.SUCCESS if status == 'succeeded' else self.style.ERROR
+        self.stdout.write(style(f"Job {job_id} {status}."))
+
+    def run_inline(self):
+        from tracker.jobs import execute, keep_alive
+
+        while True:
+            claimed = self.poll(1)
+            if not claimed:
+                if self.once:
+                    return
+                time.sleep(self.poll_interval)
+                continue
+            with keep_alive(claimed):
+                status = execute(claimed[0])
+            self.report(claimed[0], status)
+
+    def start_pool(self, processes):
+        context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(processes, mp_context=context, initializer=init_process)
+
+    def run_pool(self, processes):
+        from tracker.jobs import HEARTBEAT_EVERY, heartbeat
+
+        running = {}  # future: job id
+        last_heartbeat = time.monotonic()
+        pool = self.start_pool(processes)
+        try:
+            while True:
+                for job_id in self.poll(processes - len(running)):
+                    try:
+                        future = pool.submit(run_job, job_id)
+                    except BrokenProcessPool:
+                        # A pool process died abruptly (e.g. killed for memory) and the
+                        # pool takes no more work: replace it rather than stall the queue
+                        self.stderr.write(self.style.ERROR("Process pool broken; starting a new one."))
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        pool = self.start_pool(processes)
+                        future = pool.submit(run_job, job_id)
+                    running[future] = job_id
+                if not running:
+                    if self.once:
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    try:
+                        self.report(*future.result())
+                    except Exception as exc:
+                        # The job stays "running" until requeue_stale() picks it up
+                        self.stderr.write(self.style.ERROR(f"Worker process failed: {exc!r}"))
+                # Keep the jobs still running from being requeued, however long they take
+                if running and time.monotonic() - last_heartbeat >= HEARTBEAT_EVERY.total_seconds():
+                    heartbeat(running.values())
+                    last_heartbeat = time.monotonic()
+        finally:
+            pool.shutdown()
@@ -0,0 +1,90 @@
+"""In-process request metrics collected by RequestTimingMiddleware and exported in the Prometheus text format.
+
+Each process keeps its own histograms; with several workers Prometheus
+scrapes (or aggregates) them per process.
+"""
+import threading
+from bisect import bisect_left
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_bound(bound):
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+class Histogram:
+    """Histogram labelled by view name."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}  # view -> [count per bucket..., count above the last bucket, sum]
+
+    def observe(self, view, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.series.get(view)
+            if counts is None:
+                counts = self.series[view] = [0] * (len(self.buckets) + 1) + [0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+    def render(self):
+        with self.lock:
+            series = {view: list(counts) for view, counts in self.series.items()}
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for view in sorted(series):
+            counts = series[view]
+            label = escape_label(view)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{format_bound(bound)}"}} {cumulative}')
+            cumulative += counts[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{view="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {counts[-1]}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {cumulative}')
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'tracker_request_duration_seconds', 'Time spent handling the request.', DURATION_BUCKETS)
+DB_DURATION = Histogram(
+    'tracker_request_db_duration_seconds', 'Time spent executing SQL per request.', DURATION_BUCKETS)
+RENDER_DURATION = Histogram(
+    'tracker_request_render_duration_seconds', 'Time spent rendering the response body.', DURATION_BUCKETS)
+DB_QUERIES = Histogram(
+    'tracker_request_db_queries', 'Number of SQL queries per request.', QUERY_BUCKETS)
+
+HISTOGRAMS = (REQUEST_DURATION, DB_DURATION, RENDER_DURATION, DB_QUERIES)
+
+
+def observe_request(view, total, sql, queries, render):
+    REQUEST_DURATION.observe(view, total)
+    DB_DURATION.observe(view, sql)
+    RENDER_DURATION.observe(view, render)
+    DB_QUERIES.observe(view, queries)
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
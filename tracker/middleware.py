@@ -0,0 +1,80 @@
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import observe_request
+
+UNRESOLVED_VIEW = 'unresolved'
+
+
+class RequestTimer:
+    """Database execute hook counting and timing the queries of one request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += perf_counter() - start
+            self.queries += 1
+
+    def start_render(self):
+        self.render_started = perf_counter()
+
+    def finish_render(self, response):
+        if self.render_started is not None:
+            self.render += perf_counter() - self.render_started
+            self.render_started = None
+
+
+class RequestTimingMiddleware:
+    """Time each request and break it down into SQL, rendering and the rest.
+
+    Enabled with the REQUEST_METRICS setting. Adds a Server-Timing header and
+    feeds the histograms exported at /api/metrics, labelled by the resolved
+    URL name. Streaming bodies are produced after the middleware returns, so
+    only the work up to the first byte is measured for them.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = request.request_timer = RequestTimer()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        total = perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else UNRESOLVED_VIEW
+        observe_request(view, total, timer.sql, timer.queries, timer.render)
+
+        app = max(total - timer.sql - timer.render, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timer.sql * 1000:.2f};desc="{timer.queries} queries"',
+            f'render;dur={timer.render * 1000:.2f}',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs right before the response (DRF's included) is rendered
+        timer = request.request_timer
+        timer.start_render()
+        response.add_post_render_callback(timer.finish_render)
+        return response
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:29
+
+from django.db import migrations, models
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def split_rollups_by_currency(apps, schema_editor):
+    Transaction = apps.get_model('tracker', 'Transaction')
+    MonthlyRollup = apps.get_model('tracker', 'MonthlyRollup')
+    buckets = (
+        Transaction.objects.annotate(month=TruncMonth('date'), rollup_currency=Coalesce('currency', Value('')))
+        .values('user_id', 'month', 'category_id', 'transaction_type', 'rollup_currency')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    MonthlyRollup.objects.all().delete()
+    MonthlyRollup.objects.bulk_create((
+        MonthlyRollup(currency=bucket.pop('rollup_currency'), **bucket) for bucket in buckets.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='currency',
+            field=models.CharField(blank=True, default='', max_length=3),
+        ),
+        migrations.RunPython(split_rollups_by_currency, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together={('user', 'month', 'category', 'transaction_type', 'currency')},
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, Sum, When
+from django.db.models.functions import TruncMonth
+
+
+def build_snapshots(apps, schema_editor):
+    Transaction = apps.get_model('tracker', 'Transaction')
+    AccountBalanceSnapshot = apps.get_model('tracker', 'AccountBalanceSnapshot')
+    signed = Case(
+        When(transaction_type='income', then=F('amount')),
+        default=-F('amount'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    months = (
+        Transaction.objects.filter(account__isnull=False)
+        .annotate(month=TruncMonth('date'))
+        .values('account_id', 'month')
+        .annotate(net=Sum(signed))
+        .order_by('account_id', 'month')
+    )
+    running = {}
+
+    def rows():
+        for row in months.iterator():
+            total = running[row['account_id']] = running.get(row['account_id'], Decimal('0.00')) + row['net']
+            yield AccountBalanceSnapshot(account_id=row['account_id'], month=row['month'], running_total=total)
+
+    AccountBalanceSnapshot.objects.bulk_create(rows(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('running_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='tracker.account')),
+            ],
+            options={
+                'unique_together': {('account', 'month')},
+            },
+        ),
+        migrations.RunPython(build_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:56
+
+import django.db.models.deletion
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+FTS5_TABLE = [
+    # External content: the index stores only tokens, the text stays in tracker_transaction.
+    # user_id is indexed too so a search can be limited to one user inside the index.
+    "CREATE VIRTUAL TABLE tracker_transaction_fts USING fts5("
+    "description, user_id, content='tracker_transaction', content_rowid='id', prefix='2 3')",
+    # Rank on the description alone
+    "INSERT INTO tracker_transaction_fts(tracker_transaction_fts, rank) VALUES('rank', 'bm25(1.0, 0.0)')",
+    "CREATE TRIGGER tracker_transaction_fts_insert AFTER INSERT ON tracker_transaction BEGIN "
+    "INSERT INTO tracker_transaction_fts(rowid, description, user_id) VALUES (new.id, new.description, new.user_id); "
+    "END",
+    "CREATE TRIGGER tracker_transaction_fts_delete AFTER DELETE ON tracker_transaction BEGIN "
+    "INSERT INTO tracker_transaction_fts(tracker_transaction_fts, rowid, description, user_id) "
+    "VALUES ('delete', old.id, old.description, old.user_id); "
+    "END",
+    "CREATE TRIGGER tracker_transaction_fts_update AFTER UPDATE OF description, user_id ON tracker_transaction BEGIN "
+    "INSERT INTO tracker_transaction_fts(tracker_transaction_fts, rowid, description, user_id) "
+    "VALUES ('delete', old.id, old.description, old.user_id); "
+    "INSERT INTO tracker_transaction_fts(rowid, description, user_id) VALUES (new.id, new.description, new.user_id); "
+    "END",
+    "INSERT INTO tracker_transaction_fts(tracker_transaction_fts) VALUES('rebuild')",
+]
+DROP_FTS5_TABLE = [
+    "DROP TRIGGER IF EXISTS tracker_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS tracker_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS tracker_transaction_fts_update",
+    "DROP TABLE IF EXISTS tracker_transaction_fts",
+]
+# Must stay identical to tracker.search.DESCRIPTION_VECTOR for queries to use it
+GIN_INDEX = GinIndex(SearchVector('description', config='english'), name='tracker_txn_description_fts_idx')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in FTS5_TABLE:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('tracker', 'Transaction'), GIN_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for statement in DROP_FTS5_TABLE:
+            schema_editor.execute(statement)
+    elif vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('tracker', 'Transaction'), GIN_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0015_account_balance_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSearch',
+            fields=[
+                ('transaction', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='tracker.transaction')),
+                ('document', models.TextField(db_column='tracker_transaction_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'tracker_transaction_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
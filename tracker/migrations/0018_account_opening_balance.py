@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:15
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def backfill_opening_balances(apps, schema_editor):
+    """Whatever part of each balance the account's transactions don't explain becomes its opening balance."""
+    Account = apps.get_model('tracker', 'Account')
+    Transaction = apps.get_model('tracker', 'Transaction')
+    signed = Case(
+        When(transaction_type='income', then=F('amount')),
+        default=-F('amount'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    net = (
+        Transaction.objects.filter(account=OuterRef('pk'))
+        .values('account').annotate(net=Sum(signed)).values('net')
+    )
+    Account.objects.update(opening_balance=F('balance') - Coalesce(
+        Subquery(net), Value(Decimal('0.00')), output_field=DecimalField(max_digits=14, decimal_places=2)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0017_recurring_transactions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='opening_balance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(backfill_opening_balances, migrations.RunPython.noop),
+    ]
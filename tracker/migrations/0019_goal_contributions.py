@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0018_account_opening_balance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='goal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='contributions', to='tracker.goal'),
+        ),
+    ]
@@ -3,13 +3,34 @@ from django.db import models
 # Create your models here.
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, Count, DecimalField, F, FloatField, Sum, Value, When
+from django.db.models.functions import Coalesce, Least, TruncMonth
 from django.conf import settings
+from django.core.validators import MinValueValidator
+from django.utils.timezone import now
 from decimal import Decimal
+from .cache import bump_dashboard_version
+
+CURRENCY_CHOICES = [
+    ('KES', 'Kenyan Shilling'),
+    ('USD', 'US Dollar'),
+    ('EUR', 'Euro'),
+    ('GBP', 'Great British Pound'),
+    ('CNY', 'Chinese Yuan'),
+    ('JPY', 'Japanese Yen'),
+    ('CAD', 'Canadian Dollar'),
+    ('AUD', 'Australian Dollar'),
+    ('INR', 'Indian Rupee'),
+    ('ZAR', 'South African Rand'),
+    ('UGX', 'Ugandan Shilling'),
+    ('TZS', 'Tanzanian Shilling'),
+]
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     date_joined = models.DateTimeField(auto_now_add=True)
+    base_currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='KES')  # dashboard totals
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -17,6 +38,18 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+class AccountManager(models.Manager):
+    def apply_balance_deltas(self, deltas):
+        """Add `deltas[account_id]` to each account's balance in a single UPDATE."""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        delta = Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in deltas.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        return self.filter(pk__in=deltas).update(balance=F('balance') + delta, updated_at=now())
+
 class Account(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(
@@ -28,6 +61,8 @@ class Account(models.Model):
 
     name = models.CharField(max_length=100)
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # The part of `balance` no transaction explains: the starting balance plus manual adjustments
+    opening_balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     account_type = models.CharField(max_length=100, choices=[
@@ -37,26 +72,17 @@ class Account(models.Model):
         ('credit_card', 'Credit Card'),
         ('other', 'Other'),
         ])
-    currency = models.CharField(max_length=3, choices=[
-        ('KES', 'Kenyan Shilling'),
-        ('USD', 'US Dollar'),
-        ('EUR', 'Euro'),
-        ('GBP', 'Great British Pound'),
-        ('CNY', 'Chinese Yuan'),
-        ('JPY', 'Japanese Yen'),
-        ('CAD', 'Canadian Dollar'),
-        ('AUD', 'Australian Dollar'),
-        ('INR', 'Indian Rupee'),
-        ('ZAR', 'South African Rand'),
-        ('UGX', 'Ugandan Shilling'),
-        ('TZS', 'Tanzanian Shilling'),
-        ],
-        default='KES'
-    )
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='KES')
+
+    objects = AccountManager()
 
     class Meta:
         unique_together = ('user', 'name')
         ordering = ['-created_at']
+        indexes = [
+            # Rows changed since a sync token (see tracker.sync)
+            models.Index(fields=['user', 'updated_at'], name='tracker_account_sync_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.user.email}) - {self.currency}"
@@ -72,10 +98,35 @@ class Category(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="categories")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Rows changed since a sync token (see tracker.sync)
+            models.Index(fields=['user', 'updated_at'], name='tracker_category_sync_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.category_type})"
 
+class TransactionQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the selected transactions, reversing their effect on balances, goals and rollups.
+
+        Goes through tracker.bulk like the bulk delete endpoint, so deleting
+        by queryset (or by cascade, see tracker.signals) keeps the ledger and
+        records tombstones like `Transaction.delete()` does.
+        """
+        from .bulk import delete_transactions
+
+        deleted = delete_transactions(self)
+        return deleted, ({self.model._meta.label: deleted} if deleted else {})
+
+    def delete_rows(self):
+        """Plain DELETE of the selected rows, for callers that correct the ledger themselves."""
+        return super().delete()
+
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = (
         ('income', 'Income'),
@@ -91,52 +142,195 @@ class Transaction(models.Model):
     description = models.TextField(blank=True, null=True)
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set on the occurrences generated by run_recurring
+    recurring = models.ForeignKey(
+        'RecurringTransaction', on_delete=models.SET_NULL, related_name="occurrences", null=True, blank=True)
+    # The goal the transaction's amount counts towards
+    goal = models.ForeignKey('Goal', on_delete=models.SET_NULL, related_name="contributions", null=True, blank=True)
+
+    objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Transaction list ordering and keyset pagination
+            models.Index(fields=['user', '-date', '-id'], name='tracker_txn_user_date_id_idx'),
+            # Per-user income/expense totals over a date range
+            models.Index(fields=['user', 'transaction_type', 'date'], name='tracker_txn_user_type_date_idx'),
+            # Rows changed since a sync token (see tracker.sync)
+            models.Index(fields=['user', 'updated_at'], name='tracker_txn_sync_idx'),
+        ]
+        constraints = [
+            # One occurrence per schedule and day, so re-running the scheduler never duplicates.
+            # Partial, so it indexes only generated rows (and SQLite adds it without rebuilding
+            # the table, which would drop the full-text search triggers).
+            models.UniqueConstraint(fields=['recurring', 'date'], condition=models.Q(recurring__isnull=False),
+                                    name='tracker_txn_recurring_date_uniq'),
+        ]
+
+    LEDGER_FIELDS = ('user_id', 'account_id', 'category_id', 'transaction_type', 'amount', 'currency', 'date', 'goal_id')
+
+    def locked_ledger_state(self):
+        """Re-read this row's ledger fields under a row lock, or None if it is gone."""
+        return Transaction.objects.select_for_update().filter(pk=self.pk).only(*self.LEDGER_FIELDS).first()
 
     def save(self, *args, **kwargs):
+        """Save the transaction and apply its effect on the account balance and rollups.
+
+        Balances are adjusted with a single `F()` UPDATE covering both the old
+        and the new account, so concurrent writes to one account never lose
+        updates. The in-memory `self.account.balance` is not refreshed.
+        """
+        from .ledger import LedgerDelta
+
         if not self.currency and self.account:
             self.currency = self.account.currency #inherit from account
 
-        #If Updating,reverse old trasactions
-        if self.pk:
-            old = Transaction.objects.get(pk=self.pk)
-            if old.account and old.transaction_type == 'income':
-                old.account.balance -= old.amount
-                old.account.save()
-            elif old.account and old.transaction_type == 'expense':
-                old.account.balance += old.amount
-                old.account.save()
-
-        #Apply new transaction    
-        super().save(*args, **kwargs)
-        if self.account:
-            if self.transaction_type == 'income':
-                self.account.balance += self.amount
-            else:
-                self.account.balance -= self.amount
-            self.account.save()
- 
+        delta = LedgerDelta()
+        with transaction.atomic():
+            #If Updating,reverse old trasactions
+            old = self.locked_ledger_state() if self.pk else None
+            if old is not None:
+                delta.add_transaction(old, sign=-1)
+
+            #Apply new transaction
+            super().save(*args, **kwargs)
+            delta.add_transaction(self)
+            delta.apply()
+
+    def delete(self, *args, **kwargs):
+        from .ledger import LedgerDelta
+
+        delta = LedgerDelta()
+        with transaction.atomic():
+            old = self.locked_ledger_state()
+            if old is not None:
+                delta.add_transaction(old, sign=-1)
+                Tombstone.objects.record(old.user_id, 'transactions', [old.pk])
+            result = super().delete(*args, **kwargs)
+            delta.apply()
+        return result
+
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} {self.currency} ({self.category.name})"
 
+class TransactionSearch(models.Model):
+    """Row of the SQLite FTS5 index over transaction descriptions (see tracker.search).
+
+    The virtual table is created, and kept in sync with triggers, by a
+    migration; it does not exist on other databases.
+    """
+    transaction = models.OneToOneField(
+        Transaction, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', related_name='search')
+    # FTS5's hidden column named after the table: `= 'query'` runs a full-text match
+    document = models.TextField(db_column='tracker_transaction_fts')
+    rank = models.FloatField()  # bm25() of the current match, lower is better
+
+    class Meta:
+        managed = False
+        db_table = 'tracker_transaction_fts'
+
+class RecurringTransaction(models.Model):
+    """A schedule of transactions that `manage.py run_recurring` generates when due.
+
+    Occurrences fall on `start_date` plus whole multiples of the period (the
+    day of the month is kept, or the month's last day when it is shorter).
+    `next_date` is the first occurrence not generated yet.
+    """
+    FREQUENCIES = (
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recurring_transactions")
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="recurring_transactions", null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="recurring_transactions")
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, blank=True, null=True)
+    description = models.TextField(blank=True, null=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES)
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])  # every `interval` periods
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    next_date = models.DateField()
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The scheduler's scan for due schedules
+            models.Index(fields=['active', 'next_date'], name='tracker_recurring_due_idx'),
+            # Rows changed since a sync token (see tracker.sync)
+            models.Index(fields=['user', 'updated_at'], name='tracker_recurring_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} {self.amount} every {self.interval} {self.frequency} ({self.user})"
+
 class Budget(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     month = models.DateField()
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('user', 'category', 'month')
+        indexes = [
+            # Budgets of one user across a span of months
+            models.Index(fields=['user', 'month'], name='tracker_budget_user_month_idx'),
+            # Rows changed since a sync token (see tracker.sync)
+            models.Index(fields=['user', 'updated_at'], name='tracker_budget_sync_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.category.name} ({self.month}) : {self.amount}"
 
+class GoalQuerySet(models.QuerySet):
+    def with_progress(self):
+        """Annotate `progress_pct`, the share of the target reached (0 to 100), computed in SQL."""
+        return self.annotate(progress_pct=Case(
+            When(target_amount__gt=0, then=Least(
+                F('current_amount') * Value(100.0, output_field=FloatField()) / F('target_amount'),
+                Value(100.0, output_field=FloatField()),
+            )),
+            default=Value(0.0),
+            output_field=FloatField(),
+        ))
+
+    def apply_contribution_deltas(self, deltas):
+        """Add `deltas[goal_id]` to each goal's current amount in a single UPDATE."""
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        delta = Case(
+            *[When(pk=pk, then=Value(amount)) for pk, amount in deltas.items()],
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        return self.filter(pk__in=deltas).update(current_amount=F('current_amount') + delta, updated_at=now())
+
+
 class Goal(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="goals")
     name = models.CharField(max_length=200)  # e.g., "Car"
     target_amount = models.DecimalField(max_digits=12, decimal_places=2)
-    current_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    # Starts at the amount given by hand; linked transactions add their amounts (see LedgerDelta)
+    current_amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     deadline = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = GoalQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Rows changed since a sync token (see tracker.sync)
+            models.Index(fields=['user', 'updated_at'], name='tracker_goal_sync_idx'),
+        ]
 
     def progress(self):
         if not self.target_amount:
@@ -145,3 +339,228 @@ class Goal(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class MonthlyRollupManager(models.Manager):
+    def apply_delta(self, user_id, day, category_id, transaction_type, currency, amount, count):
+        """Add `amount` and `count` to the bucket `day` falls in, creating it if needed."""
+        lookup = dict(
+            user_id=user_id,
+            month=day.replace(day=1),
+            category_id=category_id,
+            transaction_type=transaction_type,
+            currency=currency or '',
+        )
+        delta = dict(total=F('total') + amount, count=F('count') + count)
+        if self.filter(**lookup).update(**delta):
+            return
+        try:
+            with transaction.atomic():
+                self.create(total=amount, count=count, **lookup)
+        except IntegrityError:
+            # Another writer created the bucket first
+            self.filter(**lookup).update(**delta)
+
+    def rebuild(self, user=None):
+        """Recompute the rollup from scratch, for every user or a single one."""
+        transactions = Transaction.objects.all()
+        rollups = self.all()
+        if user is not None:
+            transactions = transactions.filter(user=user)
+            rollups = rollups.filter(user=user)
+
+        buckets = (
+            transactions.annotate(month=TruncMonth('date'), rollup_currency=Coalesce('currency', Value('')))
+            .values('user_id', 'month', 'category_id', 'transaction_type', 'rollup_currency')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        with transaction.atomic():
+            rollups.delete()
+            created = self.bulk_create((
+                self.model(currency=bucket.pop('rollup_currency'), **bucket) for bucket in buckets.iterator()
+            ), batch_size=1000)
+        user_ids = {rollup.user_id for rollup in created}
+        if user is not None:
+            user_ids.add(user.pk)
+        bump_dashboard_version(*user_ids)
+        return len(created)
+
+
+class MonthlyRollup(models.Model):
+    """Per-user monthly transaction totals, kept up to date by `Transaction` writes."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="rollups")
+    month = models.DateField()  # first day of the month
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="rollups")
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    currency = models.CharField(max_length=3, blank=True, default='')  # '' when the transaction has none
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    count = models.IntegerField(default=0)
+
+    objects = MonthlyRollupManager()
+
+    class Meta:
+        unique_together = ('user', 'month', 'category', 'transaction_type', 'currency')
+        indexes = [
+            # Site-wide monthly totals on the admin dashboard
+            models.Index(fields=['month', 'transaction_type'], name='tracker_rollup_month_type_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.month:%Y-%m} {self.category_id} {self.transaction_type}: {self.total}"
+
+
+def signed_amount_expression(prefix=''):
+    """Effect of a transaction on its account's balance, in SQL; `prefix` reaches it through a relation."""
+    return Case(
+        When(**{f'{prefix}transaction_type': 'income'}, then=F(f'{prefix}amount')),
+        default=-F(f'{prefix}amount'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+SIGNED_AMOUNT = signed_amount_expression()
+
+
+class AccountBalanceSnapshotManager(models.Manager):
+    def apply_delta(self, account_id, day, amount):
+        """Add `amount` to the checkpoint of the month `day` falls in and to every later one.
+
+        A missing checkpoint is created from the previous one first. Callers
+        update the account's balance row beforehand, which serializes the
+        writers of an account for the rest of the transaction.
+        """
+        month = day.replace(day=1)
+        checkpoints = self.filter(account_id=account_id)
+        # This month's checkpoint, or else the one it starts from
+        latest = checkpoints.filter(month__lte=month).order_by('-month').values_list('month', 'running_total').first()
+        if latest is None or latest[0] != month:
+            start = latest[1] if latest else Decimal('0.00')
+            self.bulk_create([self.model(account_id=account_id, month=month, running_total=start)],
+                             ignore_conflicts=True)
+        checkpoints.filter(month__gte=month).update(running_total=F('running_total') + amount)
+
+    def rebuild(self, user=None):
+        """Recompute the checkpoints from scratch, for every account or a single user's."""
+        transactions = Transaction.objects.filter(account__isnull=False)
+        checkpoints = self.all()
+        if user is not None:
+            transactions = transactions.filter(account__user=user)
+            checkpoints = checkpoints.filter(account__user=user)
+
+        months = (
+            transactions.annotate(month=TruncMonth('date'))
+            .values('account_id', 'month')
+            .annotate(net=Sum(SIGNED_AMOUNT))
+            .order_by('account_id', 'month')
+        )
+        running = {}
+
+        def rows():
+            for row in months.iterator():
+                total = running[row['account_id']] = running.get(row['account_id'], Decimal('0.00')) + row['net']
+                yield self.model(account_id=row['account_id'], month=row['month'], running_total=total)
+
+        with transaction.atomic():
+            checkpoints.delete()
+            return len(self.bulk_create(rows(), batch_size=1000))
+
+
+class AccountBalanceSnapshot(models.Model):
+    """Monthly balance checkpoint: the net of an account's transactions up to the end of `month`.
+
+    Kept up to date by `Transaction` writes; see tracker.balances for how
+    point-in-time balances are derived from it.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name="balance_snapshots")
+    month = models.DateField()  # first day of the month
+    running_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    objects = AccountBalanceSnapshotManager()
+
+    class Meta:
+        # Also the index for "latest checkpoint of an account before a month"
+        unique_together = ('account', 'month')
+
+    def __str__(self):
+        return f"{self.account_id} - {self.month:%Y-%m}: {self.running_total}"
+
+
+class ExchangeRate(models.Model):
+    """Value of one unit of `base` in `quote` on `date`."""
+    date = models.DateField()
+    base = models.CharField(max_length=3, choices=CURRENCY_CHOICES)
+    quote = models.CharField(max_length=3, choices=CURRENCY_CHOICES)
+    rate = models.DecimalField(max_digits=18, decimal_places=8)
+
+    class Meta:
+        # Also the index for "latest rate of a pair on or before a date"
+        unique_together = ('base', 'quote', 'date')
+
+    def __str__(self):
+        return f"{self.date} {self.base}/{self.quote} {self.rate}"
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by `manage.py runworker`."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+    KINDS = (
+        ('export_transactions', 'Export transactions'),
+        ('rebuild_rollups', 'Rebuild monthly rollups'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="jobs")
+    kind = models.CharField(max_length=50, choices=KINDS)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    result = models.JSONField(null=True, blank=True)
+    result_file = models.FileField(upload_to='jobs/', blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # last sign of life from the worker running it
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming the oldest queued jobs and finding stale running ones
+            models.Index(fields=['status', 'created_at'], name='tracker_job_status_created_idx'),
+            # A user's jobs, newest first
+            models.Index(fields=['user', '-created_at'], name='tracker_job_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class TombstoneManager(models.Manager):
+    def record(self, user_id, kind, object_ids):
+        """Record the deletion of the `kind` rows (a key of tracker.sync.SYNCED) with `object_ids`."""
+        return self.bulk_create([Tombstone(user_id=user_id, kind=kind, object_id=pk) for pk in object_ids])
+
+
+class Tombstone(models.Model):
+    """A deleted row of a user's data, for clients syncing with /api/sync/."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="tombstones")
+    kind = models.CharField(max_length=20)  # e.g. "transactions"
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=now)
+
+    objects = TombstoneManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tracker_tombstone_sync_idx'),
+        ]
@@ -0,0 +1,96 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Keyset pagination over (-date, -id).
+
+    The cursor holds the (date, id) of the last row served; the next page seeks
+    past it with an index range scan, so it needs no COUNT(*) or OFFSET and
+    page N costs the same as page 1. Only forward links are provided.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by('-date', '-id')
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            last_date, last_id = position
+            queryset = queryset.filter(date__lte=last_date).filter(
+                Q(date__lt=last_date) | Q(date=last_date, id__lt=last_id)
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    @staticmethod
+    def position(row):
+        # Pages hold model instances or, on the fast list path, .values() dicts
+        if isinstance(row, dict):
+            return row['date'], row['id']
+        return row.date, row.pk
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def encode_cursor(self, row):
+        last_date, last_id = self.position(row)
+        return urlsafe_b64encode(f'{last_date.isoformat()}:{last_id}'.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            last_date, last_id = urlsafe_b64decode(encoded.encode()).decode().split(':')
+            return date.fromisoformat(last_date), int(last_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class TransactionPagination(PageNumberPagination):
+    """Page-number pagination with a client page size, or keyset pagination on request.
+
+    Clients opt in to keyset pagination with ?pagination=cursor and then follow
+    the `next` links. Both modes accept ?page_size= up to `max_page_size`.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
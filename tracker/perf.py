@@ -0,0 +1,340 @@
+"""Synthetic data seeding and endpoint benchmarks used by `manage.py perfbench` and the test suite."""
+import asyncio
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import Account, AccountBalanceSnapshot, Budget, Category, Goal, MonthlyRollup, Transaction, User
+from .serializers import TransactionSerializer, ValuesRowSerializer
+from .sync import SYNC_OVERLAP, make_token
+
+DEFAULT_BUDGET_FILE = 'perf_budgets.json'
+# The benchmark clears and fills the cache: give it one of its own, never the shared one
+BENCH_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'perfbench'}}
+
+
+@dataclass
+class SeedConfig:
+    users: int = 2
+    accounts: int = 3
+    categories: int = 20
+    budget_months: int = 6
+    transactions: int = 5000
+    goals: int = 3
+    days: int = 730
+    seed: int = 42
+
+
+def seed(config):
+    """Bulk insert synthetic users and their data; returns the created users."""
+    rng = random.Random(config.seed)
+    today = date.today()
+    this_month = today.replace(day=1)
+
+    User.objects.bulk_create([
+        User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(config.users)
+    ])
+    users = list(User.objects.filter(username__startswith='bench').order_by('pk'))
+
+    Account.objects.bulk_create([
+        Account(user=user, name=f'Account {i}', account_type='bank', balance=Decimal('1000.00'))
+        for user in users for i in range(config.accounts)
+    ])
+    Category.objects.bulk_create([
+        Category(user=user, name=f'Category {i}', category_type=('income', 'expense')[i % 4 != 0])
+        for user in users for i in range(config.categories)
+    ])
+    accounts = list(Account.objects.filter(user__in=users))
+    categories = list(Category.objects.filter(user__in=users))
+
+    months = []
+    month = this_month
+    for _ in range(config.budget_months):
+        months.append(month)
+        month = (month - timedelta(days=1)).replace(day=1)
+    Budget.objects.bulk_create([
+        Budget(user_id=category.user_id, category=category, month=month, amount=Decimal(rng.randint(50, 500)))
+        for category in categories if category.category_type == 'expense' for month in months
+    ], batch_size=1000)
+
+    Goal.objects.bulk_create([
+        Goal(user=user, name=f'Goal {i}', target_amount=Decimal('5000.00'), current_amount=Decimal(rng.randint(0, 5000)))
+        for user in users for i in range(config.goals)
+    ])
+
+    accounts_by_user, categories_by_user = {}, {}
+    for account in accounts:
+        accounts_by_user.setdefault(account.user_id, []).append(account)
+    for category in categories:
+        categories_by_user.setdefault(category.user_id, []).append(category)
+
+    def transactions():
+        for user in users:
+            for _ in range(config.transactions):
+                category = rng.choice(categories_by_user[user.pk])
+                yield Transaction(
+                    user=user,
+                    account=rng.choice(accounts_by_user[user.pk]),
+                    category=category,
+                    transaction_type=category.category_type,
+                    amount=Decimal(rng.randint(100, 100000)) / 100,
+                    currency='KES',
+                    description=f'Synthetic {category.name}',
+                    date=today - timedelta(days=rng.randrange(config.days)),
+                )
+
+    Transaction.objects.bulk_create(transactions(), batch_size=2000)
+    MonthlyRollup.objects.rebuild()
+    AccountBalanceSnapshot.objects.rebuild()
+    return users
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    url_name: str
+    params: dict = field(default_factory=dict)
+    payload: object = None  # callable(iteration, context) -> request body
+    admin: bool = False
+    cold_cache: bool = False
+    revalidate: bool = False
+
+
+def make_scenarios():
+    month = date.today().replace(day=1)
+    return [
+        Scenario('dashboard', 'get', 'dashboard', cold_cache=True),
+        Scenario('dashboard_revalidate', 'get', 'dashboard', revalidate=True),
+        Scenario('accounts_list', 'get', 'account-list'),
+        Scenario('categories_list', 'get', 'category-list'),
+        Scenario('transactions_list', 'get', 'transaction-list', params={'page_size': 100}),
+        Scenario('transactions_list_cursor', 'get', 'transaction-list', params={'pagination': 'cursor', 'page_size': 100}),
+        Scenario('transactions_search', 'get', 'transaction-list', params={'q': 'synthetic category 1', 'page_size': 100}),
+        Scenario('budgets_list', 'get', 'budget-list'),
+        Scenario('goals_list', 'get', 'goal-list'),
+        # A client that synced just now: nothing changed since its token
+        Scenario('sync_idle', 'get', 'sync', params={'since': make_token(now() + SYNC_OVERLAP)}),
+        Scenario('accounts_create', 'post', 'account-list',
+                 payload=lambda i, ctx: {'name': f'Bench account {i}', 'balance': '10.00'}),
+        Scenario('categories_create', 'post', 'category-list',
+                 payload=lambda i, ctx: {'name': f'Bench category {i}', 'category_type': 'expense'}),
+        Scenario('transactions_create', 'post', 'transaction-list',
+                 payload=lambda i, ctx: {
+                     'transaction_type': 'expense', 'amount': '12.34', 'date': date.today().isoformat(),
+                     'category': ctx['category'].pk, 'account': ctx['account'].pk, 'description': 'Bench',
+                 }),
+        Scenario('budgets_create', 'post', 'budget-list',
+                 payload=lambda i, ctx: {
+                     'category': ctx['category'].pk, 'amount': '100.00',
+                     'month': (month - timedelta(days=31 * (ctx['budget_months'] + i))).replace(day=1).isoformat(),
+                 }),
+        Scenario('goals_create', 'post', 'goal-list',
+                 payload=lambda i, ctx: {'name': f'Bench goal {i}', 'target_amount': '100.00'}),
+        Scenario('admin_dashboard', 'get', 'custom_admin:dashboard', admin=True, cold_cache=True),
+    ]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    # Nearest rank: the smallest value with at least pct% of the samples at or below it
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def count_rows(response):
+    if response.get('Content-Type', '').startswith('application/json') and response.content:
+        data = response.json()
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            return len(data['results'])
+        return 1
+    return 0
+
+
+def count_queries(captured):
+    # Savepoints depend on whether the caller already runs in a transaction (as tests do)
+    return sum(1 for query in captured if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT')))
+
+
+def run_scenario(scenario, client, iterations, context):
+    latencies, queries, rows = [], [], 0
+    url = reverse(scenario.url_name)
+    etag = None
+    for i in range(iterations):
+        if scenario.cold_cache:
+            cache.clear()
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        request = getattr(client, scenario.method)
+        data = scenario.payload(i, context) if scenario.payload else scenario.params
+
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = request(url, data, format='json', **headers) if scenario.method == 'post' \
+                else request(url, data, **headers)
+            elapsed = time.perf_counter() - start
+
+        if response.status_code >= 400:
+            raise RuntimeError(f'{scenario.name}: HTTP {response.status_code} {response.content[:200]!r}')
+        if scenario.revalidate:
+            etag = response.get('ETag')
+        latencies.append(elapsed)
+        queries.append(count_queries(ctx.captured_queries))
+        rows += count_rows(response)
+
+    total = sum(latencies)
+    return {
+        'requests': iterations,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'queries': max(queries),
+        'rows_per_sec': round(rows / total, 1) if total else 0.0,
+    }
+
+
+def compare_serializers(user, iterations=20, limit=1000):
+    """Serialization alone of the same `limit` transactions: TransactionSerializer vs ValuesRowSerializer.
+
+    Both fixtures are fetched once up front, so only the conversion to
+    primitives is timed; the queries column is always 0.
+    """
+    queryset = Transaction.objects.filter(user=user).order_by('-date', '-id')[:limit]
+    instances = list(queryset.select_related('category', 'account'))
+    row_serializer = ValuesRowSerializer.for_class(TransactionSerializer)
+    rows = list(queryset.values(*row_serializer.lookups))
+
+    results = {}
+    for name, serialize in (
+        ('serialize_model', lambda: TransactionSerializer(instances, many=True).data),
+        ('serialize_values', lambda: row_serializer.to_representation(rows)),
+    ):
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            serialize()
+            latencies.append(time.perf_counter() - start)
+        total = sum(latencies)
+        results[name] = {
+            'requests': iterations,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'queries': 0,
+            'rows_per_sec': round(len(rows) * iterations / total, 1) if total else 0.0,
+        }
+    return results
+
+
+def run_benchmarks(user, iterations=20, scenarios=None):
+    """Exercise every scenario for `user` through the test client and return per-scenario stats."""
+    client = APIClient()
+    client.force_authenticate(user)
+
+    admin = User.objects.create_superuser(username='bench-admin', email='bench-admin@example.com', password=None)
+    admin_client = APIClient()
+    admin_client.force_login(admin)
+
+    context = {
+        'account': Account.objects.filter(user=user).first(),
+        'category': Category.objects.filter(user=user, category_type='expense').first(),
+        'budget_months': Budget.objects.filter(user=user).values('month').distinct().count(),
+    }
+    results = {}
+    for scenario in scenarios or make_scenarios():
+        results[scenario.name] = run_scenario(
+            scenario, admin_client if scenario.admin else client, iterations, context)
+    if scenarios is None:
+        results.update(compare_serializers(user, iterations))
+    return results
+
+
+async def time_concurrent_gets(client, url, headers, iterations, concurrency):
+    latencies = []
+
+    async def timed_get():
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: HTTP {response.status_code}')
+        latencies.append(elapsed)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        cache.clear()
+        await asyncio.gather(*(timed_get() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def compare_dashboards(user, iterations=20, concurrency=(1, 8)):
+    """Cold-cache latency of the sync and async dashboards through Django's ASGI request path.
+
+    Requests go through AsyncClient, which runs the same async handler as an
+    ASGI server such as uvicorn, `concurrency` at a time on one event loop.
+    The sync view runs in the single thread Django reserves for sync code;
+    the async one fans its sections out to the dashboard thread pool.
+    """
+    client = AsyncClient()
+    headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+    results = {}
+    for level in concurrency:
+        for name in ('dashboard', 'dashboard-async'):
+            latencies, wall = asyncio.run(time_concurrent_gets(client, reverse(name), headers, iterations, level))
+            results[f'{name} x{level}'] = {
+                'requests': len(latencies),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'requests_per_sec': round(len(latencies) / wall, 1),
+            }
+    return results
+
+
+def format_asgi_report(results):
+    lines = [f"{'ASGI dashboard (cold cache)':<30}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}"]
+    for name, stats in results.items():
+        lines.append(f"{name:<30}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['requests_per_sec']:>10}")
+    return '\n'.join(lines)
+
+
+def load_budgets(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def check_budgets(results, budgets):
+    """Return a list of human readable budget violations."""
+    violations = []
+    for name, limits in budgets.items():
+        stats = results.get(name)
+        if stats is None:
+            continue
+        for metric, limit in limits.items():
+            value = stats.get(metric)
+            if value is None:
+                continue
+            exceeded = value < limit if metric == 'rows_per_sec' else value > limit
+            if exceeded:
+                violations.append(f'{name}: {metric} {value} (budget {limit})')
+    return violations
+
+
+def format_report(results):
+    lines = [f"{'scenario':<26}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}{'rows/s':>12}"]
+    for name, stats in results.items():
+        lines.append(
+            f"{name:<26}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['queries']:>9}{stats['rows_per_sec']:>12}"
+        )
+    return '\n'.join(lines)
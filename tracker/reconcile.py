@@ -0,0 +1,53 @@
+"""Reconciliation of the cached account balances with the transactions.
+
+An account's balance should be its opening balance plus the signed sum of
+its transactions. `reconcile_shard()` checks the accounts of a range of user
+ids with one grouped query and can correct the drifted ones with one
+UPDATE; `manage.py reconcile_balances` runs the shards in a process pool.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Account, User, signed_amount_expression
+
+SHARD_SIZE = 1000  # user ids per shard
+CENT = Decimal('0.01')
+NET = Coalesce(
+    Sum(signed_amount_expression('transactions__')), Value(Decimal('0.00')),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+
+def shards(shard_size=SHARD_SIZE):
+    """Half-open ranges of user ids, `shard_size` ids each, covering every user."""
+    bounds = User.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    return [(low, low + shard_size) for low in range(bounds['low'], bounds['high'] + 1, shard_size)]
+
+
+def reconcile_shard(low, high, fix=False):
+    """Check the balances of the accounts of users `low` <= id < `high`.
+
+    Returns the number of accounts checked and the drifted ones as
+    (account id, user id, balance, expected balance). With `fix`, drifted
+    balances are moved by their drift in one UPDATE, so transactions written
+    since the check are not lost.
+    """
+    accounts = (
+        Account.objects.filter(user_id__gte=low, user_id__lt=high)
+        .annotate(expected=F('opening_balance') + NET)
+        .values_list('id', 'user_id', 'balance', 'expected')
+        .order_by('id')
+    )
+    checked, drifted = 0, []
+    for account_id, user_id, balance, expected in accounts:
+        checked += 1
+        expected = expected.quantize(CENT)  # SQLite sums decimals as floats
+        if balance != expected:
+            drifted.append((account_id, user_id, balance, expected))
+    if fix and drifted:
+        Account.objects.apply_balance_deltas({row[0]: row[3] - row[2] for row in drifted})
+    return checked, drifted
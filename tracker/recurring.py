@@ -0,0 +1,160 @@
+"""Generation of the transactions due on recurring schedules.
+
+`run_recurring()` (behind `manage.py run_recurring`) takes the due schedules
+of every user a batch at a time. For each batch it inserts all missed
+occurrences with one `bulk_create`, applies their effect on balances and
+rollups with one `LedgerDelta`, and advances the schedules' `next_date`
+with one `bulk_update`, all in one database transaction.
+
+Occurrences are keyed on (schedule, date), which is unique: occurrences
+that already exist are skipped, so re-running over the same days never
+duplicates a transaction or double-counts a balance.
+"""
+from calendar import monthrange
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils.timezone import localdate, now
+
+from .ledger import LedgerDelta
+from .models import RecurringTransaction, Transaction
+
+BATCH_SIZE = 500
+MAX_CATCH_UP = 366  # occurrences per schedule per batch; the rest are generated by the next batch
+PERIOD_DAYS = {'daily': 1, 'weekly': 7}
+PERIOD_MONTHS = {'monthly': 1, 'yearly': 12}
+SCHEDULE_FIELDS = ('frequency', 'interval', 'start_date')
+
+
+def add_months(day, months):
+    """`day` moved by `months` months, on the last day of the month when that month is shorter."""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = index // 12, index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def occurrence(schedule, index):
+    """Date of the `index`-th occurrence of `schedule`, counting from 0 at `start_date`."""
+    if schedule.frequency in PERIOD_DAYS:
+        return schedule.start_date + timedelta(days=index * schedule.interval * PERIOD_DAYS[schedule.frequency])
+    return add_months(schedule.start_date, index * schedule.interval * PERIOD_MONTHS[schedule.frequency])
+
+
+def occurrence_index(schedule, day):
+    """Index of the first occurrence of `schedule` on or after `day`."""
+    if day <= schedule.start_date:
+        return 0
+    if schedule.frequency in PERIOD_DAYS:
+        step = schedule.interval * PERIOD_DAYS[schedule.frequency]
+        return -(-(day - schedule.start_date).days // step)
+    step = schedule.interval * PERIOD_MONTHS[schedule.frequency]
+    months = (day.year - schedule.start_date.year) * 12 + day.month - schedule.start_date.month
+    index = max(0, months // step)
+    while occurrence(schedule, index) < day:
+        index += 1
+    return index
+
+
+def next_occurrence(schedule, day):
+    """First occurrence of `schedule` on or after `day`."""
+    return occurrence(schedule, occurrence_index(schedule, day))
+
+
+def reschedule(schedule):
+    """`next_date` for a schedule whose timing changed: its first occurrence after those already generated."""
+    last = schedule.occurrences.aggregate(last=Max('date'))['last'] if schedule.pk else None
+    return next_occurrence(schedule, last + timedelta(days=1) if last else schedule.start_date)
+
+
+def due_dates(schedule, through, limit=MAX_CATCH_UP):
+    """Up to `limit` occurrences from `next_date` to `through`, and the occurrence following them."""
+    last = min(through, schedule.end_date or through)
+    index = occurrence_index(schedule, schedule.next_date)
+    dates = []
+    day = occurrence(schedule, index)
+    while day <= last and len(dates) < limit:
+        dates.append(day)
+        index += 1
+        day = occurrence(schedule, index)
+    return dates, day
+
+
+def due_schedules(through):
+    return RecurringTransaction.objects.filter(
+        Q(end_date__isnull=True) | Q(end_date__gte=F('next_date')),
+        active=True, next_date__lte=through,
+    )
+
+
+def build_occurrence(schedule, day):
+    return Transaction(
+        user_id=schedule.user_id,
+        account=schedule.account,
+        category_id=schedule.category_id,
+        transaction_type=schedule.transaction_type,
+        amount=schedule.amount,
+        currency=schedule.currency or (schedule.account.currency if schedule.account else None),
+        description=schedule.description,
+        date=day,
+        recurring=schedule,
+    )
+
+
+def run_batch(through, batch_size):
+    """Generate the occurrences of one batch of due schedules.
+
+    Returns the number of schedules and of transactions created, or None when
+    nothing is due. Where the database has row locks, the batch's schedules
+    are locked and concurrent runs skip them.
+    """
+    with transaction.atomic():
+        schedules = list(
+            due_schedules(through).select_for_update(skip_locked=True, of=('self',))
+            .select_related('account').order_by('next_date', 'id')[:batch_size]
+        )
+        if not schedules:
+            return None
+
+        planned = {}
+        for schedule in schedules:
+            dates, schedule.next_date = due_dates(schedule, through)
+            if schedule.end_date and schedule.next_date > schedule.end_date:
+                schedule.active = False
+            planned[schedule] = dates
+
+        earliest = min((dates[0] for dates in planned.values() if dates), default=through)
+        existing = set(
+            Transaction.objects.filter(recurring__in=schedules, date__gte=earliest, date__lte=through)
+            .values_list('recurring_id', 'date')
+        )
+        pending = [
+            build_occurrence(schedule, day)
+            for schedule, dates in planned.items()
+            for day in dates
+            if (schedule.pk, day) not in existing
+        ]
+
+        Transaction.objects.bulk_create(pending)
+        delta = LedgerDelta()
+        for txn in pending:
+            delta.add_transaction(txn)
+        delta.apply()
+        for schedule in schedules:
+            schedule.updated_at = now()
+        RecurringTransaction.objects.bulk_update(schedules, ['next_date', 'active', 'updated_at'])
+    return len(schedules), len(pending)
+
+
+def run_recurring(through=None, batch_size=BATCH_SIZE):
+    """Generate every occurrence due up to `through` (today by default) across all users.
+
+    Returns the number of schedules processed (a schedule far behind counts
+    once per batch it takes) and of transactions created.
+    """
+    through = through or localdate()
+    totals = {'schedules': 0, 'created': 0}
+    while (result := run_batch(through, batch_size)) is not None:
+        totals['schedules'] += result[0]
+        totals['created'] += result[1]
+    return totals
@@ -0,0 +1,53 @@
+"""Budget vs actual spending over a range of months."""
+from django.db.models import F, FilteredRelation, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .dashboard import ZERO, month_bounds, next_month
+from .fx import converted
+from .models import Budget
+
+MAX_REPORT_MONTHS = 120
+
+
+def budget_rows(user, start, end):
+    """Each budget of `user` from month `start` to month `end` with the expenses of its category and month.
+
+    One grouped query: budgets are joined to the monthly rollup of their
+    category on the budget's month, and the expenses are converted into the
+    user's base currency at that month's rates.
+    """
+    return (
+        Budget.objects.filter(user=user, month__gte=start, month__lt=month_bounds(end)[1])
+        .annotate(
+            budget_month=TruncMonth('month'),
+            rate_before=next_month('budget_month'),
+            expenses=FilteredRelation('category__rollups', condition=Q(
+                category__rollups__transaction_type='expense',
+                category__rollups__month=F('budget_month'),
+            )),
+        )
+        .values('id', 'budget_month', 'amount', 'category_id', category_name=F('category__name'))
+        .annotate(spent=Sum(converted('expenses__total', 'expenses__currency', user.base_currency,
+                                      OuterRef('rate_before'))))
+        .order_by('budget_month', 'category_name', 'id')
+    )
+
+
+def budget_report(user, start, end):
+    """Report rows (month, category, budget, spent, variance, status) and their totals."""
+    rows, totals = [], {'budget': ZERO, 'spent': ZERO}
+    for row in budget_rows(user, start, end):
+        spent = row['spent'] or ZERO
+        rows.append({
+            'month': row['budget_month'].strftime('%Y-%m'),
+            'category': row['category_id'],
+            'category_name': row['category_name'],
+            'budget': row['amount'],
+            'spent': spent,
+            'variance': row['amount'] - spent,
+            'status': 'Exceeded' if spent > row['amount'] else 'OK',
+        })
+        totals['budget'] += row['amount']
+        totals['spent'] += spent
+    totals['variance'] = totals['budget'] - totals['spent']
+    return rows, totals
@@ -0,0 +1,104 @@
+"""Send the reads of read-only API requests to the `replica` database, if one is configured.
+
+Views opt in with `replica_reads()` (see `ReplicaReadMixin`). Everything
+else, including every write, uses the primary. Once a request has written,
+its remaining reads go to the primary as well so it sees its own writes,
+and the writer's next requests stay on the primary for REPLICA_PIN_SECONDS
+to ride out replication lag. Reads made inside a transaction on the primary
+also stay there, since the replica cannot see its uncommitted rows.
+
+The pins live in the default cache, which must be shared by every worker
+process for a pin to reach the worker serving the next request; the
+`check_pin_cache` system check warns when it is not.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+REPLICA_PIN_SECONDS = 10
+
+_state = ContextVar('replica_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+def replica_configured():
+    return REPLICA_ALIAS in connections.settings
+
+
+def primary_in_transaction():
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+def pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pinned_to_primary(user_id):
+    return user_id is not None and cache.get(pin_key(user_id)) is not None
+
+
+def pin_to_primary(user_id):
+    cache.set(pin_key(user_id), True, timeout=REPLICA_PIN_SECONDS)
+
+
+def check_pin_cache(app_configs=None, **kwargs):
+    if not replica_configured() or getattr(settings, 'TESTING', False):
+        return []
+    if isinstance(caches['default'], (LocMemCache, DummyCache)):
+        return [checks.Warning(
+            'Read-your-writes pins are kept in a per-process cache, so requests served by another '
+            'worker read from the replica right after a write.',
+            hint='Use a cache shared by all worker processes (see CACHES and DJANGO_CACHE_DIR).',
+            id='tracker.W001',
+        )]
+    return []
+
+
+@contextmanager
+def replica_reads(user_id=None, enabled=True):
+    """Route the reads made in this block to the replica.
+
+    With `user_id`, skip the replica while that user is pinned to the
+    primary, and pin them if the block writes anything.
+    """
+    state = RoutingState(enabled and replica_configured() and not pinned_to_primary(user_id))
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+        if state.wrote and user_id is not None and replica_configured():
+            pin_to_primary(user_id)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.use_replica and not state.wrote and not primary_in_transaction():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
@@ -0,0 +1,80 @@
+"""Full-text search over transaction descriptions.
+
+SQLite matches against the FTS5 table `tracker_transaction_fts` (created and
+kept in sync by triggers in migration 0016), joined in through
+`TransactionSearch`; the user's id is indexed alongside the description, so
+the index itself narrows a search to one user. PostgreSQL matches
+`to_tsvector('english', description)`, which has a GIN expression index.
+Either way the query never scans the transactions table. Other databases
+fall back to an unindexed `icontains`.
+
+Every term must match, the last one as a prefix. Results are annotated
+with `search_rank`, higher meaning more relevant.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, FloatField, Value
+
+SEARCH_CONFIG = 'english'
+DESCRIPTION_VECTOR = SearchVector('description', config=SEARCH_CONFIG)
+MAX_TERMS = 10
+TERM = re.compile(r'\w+')
+NO_RANK = Value(0.0, output_field=FloatField())
+
+
+def search_terms(text):
+    return TERM.findall(text.lower())[:MAX_TERMS]
+
+
+def fts5_query(terms, user_id=None):
+    """FTS5 query requiring every term, the last one as a prefix, optionally within one user's rows.
+
+    Only the last term is expanded (for search as you type): expanding a
+    short prefix merges many terms' postings and costs more than a word.
+    """
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    query = 'description : (' + ' AND '.join(phrases) + ')'
+    if user_id is not None:
+        query = f'user_id : "{int(user_id)}" AND {query}'
+    return query
+
+
+def tsquery(terms):
+    """Raw tsquery requiring every term, the last one as a prefix, as `fts5_query()` does for SQLite."""
+    lexemes = [f"'{term}'" for term in terms]
+    lexemes[-1] += ':*'
+    return ' & '.join(lexemes)
+
+
+def search_transactions(queryset, text, user=None):
+    """Transactions of `queryset` whose description matches `text`, annotated with `search_rank`.
+
+    To search one user's transactions pass `user` rather than filtering
+    `queryset` on it: SQLite then applies the restriction inside the
+    full-text index, leaving the planner no B-tree condition on the
+    transactions table to start from, which would make it evaluate the
+    full-text query once per row.
+    """
+    terms = search_terms(text)
+    if not terms:
+        return queryset.annotate(search_rank=NO_RANK).none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        # user_id is a single token, so the phrase matches exactly the user's rows
+        return queryset.filter(search__document=fts5_query(terms, user and user.pk)).annotate(
+            search_rank=-F('search__rank'))
+
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if vendor == 'postgresql':
+        query = SearchQuery(tsquery(terms), config=SEARCH_CONFIG, search_type='raw')
+        return queryset.annotate(search_vector=DESCRIPTION_VECTOR).filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+
+    for term in terms:
+        queryset = queryset.filter(description__icontains=term)
+    return queryset.annotate(search_rank=NO_RANK)
@@ -1,17 +1,103 @@
 import bleach
-from rest_framework import serializers
+from decimal import Decimal
+from functools import lru_cache
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
 from .models import User
 from .models import Account
-from .models import Category, Transaction, Budget, Goal
+from .models import Category, Transaction, Budget, Goal, Job, RecurringTransaction
+from .admin_dashboard import shift_months
+from .balances import INTERVALS, LATEST_END, MAX_POINTS, default_start, period_ends
+from .bulk import MAX_BULK_ROWS
+from .dashboard import month_bounds
+from .recurring import SCHEDULE_FIELDS, reschedule
+from .reports import MAX_REPORT_MONTHS
 
 ALLOWED_TAGS = []   # no HTML tags allowed
 ALLOWED_ATTRS = {}  # no HTML attributes allowed
 
+# Fields whose representation of a plain column value is the value itself
+PASSTHROUGH_FIELDS = (serializers.CharField, serializers.ChoiceField, serializers.IntegerField, PrimaryKeyRelatedField)
+
+def column_converter(field):
+    """Return a function rendering a plain column value like `field` would, or None if unchanged.
+
+    Decimal, date and datetime columns get precomputed equivalents of the DRF
+    conversions; anything else falls back to the field's own to_representation.
+    """
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return None
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if isinstance(field, serializers.DecimalField) and coerce_to_string and not field.localize \
+            and not field.normalize_output and field.decimal_places is not None:
+        exponent = Decimal(1).scaleb(-field.decimal_places)
+        return lambda value: '{:f}'.format(value.quantize(exponent))
+    if isinstance(field, serializers.DateTimeField):
+        if settings.USE_TZ and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601:
+            field_timezone = getattr(field, 'timezone', None)
+
+            def datetime_converter(value):
+                value = value.astimezone(field_timezone or timezone.get_current_timezone()).isoformat()
+                return value[:-6] + 'Z' if value.endswith('+00:00') else value
+            return datetime_converter
+    elif isinstance(field, serializers.DateField):
+        if getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601:
+            return lambda value: value.isoformat()
+    return field.to_representation
+
+class ValuesRowSerializer:
+    """Fast read-only twin of a ModelSerializer for list responses.
+
+    Works on `.values(*lookups)` rows instead of model instances. The converter
+    for each column is resolved once per serializer class from the matching
+    DRF field, so the JSON is identical to the serializer's, including omitting
+    a related field's key when the relation is null.
+    """
+
+    def __init__(self, serializer_class):
+        self.columns = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            self.columns.append((name, field.source.replace('.', '__'), column_converter(field), '.' in field.source))
+        self.lookups = [lookup for _, lookup, _, _ in self.columns]
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def for_class(cls, serializer_class):
+        return cls(serializer_class)
+
+    def to_representation(self, rows):
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, converter, through_relation in self.columns:
+                value = row[lookup]
+                if value is None:
+                    if not through_relation:
+                        item[name] = None
+                elif converter is None:
+                    item[name] = value
+                else:
+                    item[name] = converter(value)
+            data.append(item)
+        return data
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta: 
         model = User
         fields = ['id', 'username', 'email', 'date_joined']
 
+class ProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'email', 'base_currency', 'date_joined']
+        read_only_fields = ['id', 'email', 'date_joined']
+
 class AccountSerializer(serializers.ModelSerializer):
     class Meta:
         model = Account
@@ -30,6 +116,129 @@ class AccountSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('You already have an account with this name.')
         return value
 
+    def create(self, validated_data):
+        validated_data['opening_balance'] = validated_data.get('balance', Decimal('0.00'))
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        # Save only the edited columns, so a stale copy of the balance never overwrites
+        # transactions applied meanwhile; a balance edit is an adjustment of the opening balance.
+        balance = validated_data.pop('balance', None)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        if balance is not None:
+            Account.objects.filter(pk=instance.pk).update(
+                opening_balance=F('opening_balance') + balance - F('balance'), balance=balance)
+            instance.refresh_from_db(fields=['balance', 'opening_balance'])
+        return instance
+
+class BalanceHistoryParamsSerializer(serializers.Serializer):
+    """Query parameters of an account's balance history."""
+    to = serializers.DateField(required=False)
+    interval = serializers.ChoiceField(choices=INTERVALS, default='day')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)  # a keyword, so not declarable above
+        return fields
+
+    def validate(self, data):
+        end = data.get('to') or timezone.localdate()
+        if end > LATEST_END:
+            raise serializers.ValidationError({'to': f'Must not be after {LATEST_END}.'})
+        start = data.get('from') or default_start(end, data['interval'])
+        if start > end:
+            raise serializers.ValidationError({'from': 'Must not be after `to`.'})
+        if period_ends(start, end, data['interval']) is None:
+            raise serializers.ValidationError(
+                {'interval': f'The range covers more than {MAX_POINTS} periods; use a longer interval.'})
+        return {'from': start, 'to': end, 'interval': data['interval']}
+
+class BudgetReportParamsSerializer(serializers.Serializer):
+    """Query parameters of the budget report: a span of months given as YYYY-MM."""
+    to = serializers.DateField(input_formats=['%Y-%m'], required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(input_formats=['%Y-%m'], required=False)
+        return fields
+
+    def validate(self, data):
+        end = data.get('to') or timezone.localdate().replace(day=1)
+        start = data.get('from') or shift_months(end, -11)
+        if start > end:
+            raise serializers.ValidationError({'from': 'Must not be after `to`.'})
+        if (end.year - start.year) * 12 + end.month - start.month >= MAX_REPORT_MONTHS:
+            raise serializers.ValidationError({'to': f'The report covers at most {MAX_REPORT_MONTHS} months.'})
+        return {'from': start, 'to': end}
+
+class BulkFilterSerializer(serializers.Serializer):
+    """Transactions of one category and/or account within a date range."""
+    category = serializers.IntegerField(required=False)
+    account = serializers.IntegerField(required=False)
+    to = serializers.DateField(required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, data):
+        if not data:
+            raise serializers.ValidationError('Give at least one of category, account, from and to.')
+        if data.get('from') and data.get('to') and data['from'] > data['to']:
+            raise serializers.ValidationError({'from': 'Must not be after `to`.'})
+        return data
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """Transactions to act on in bulk: a list of `ids` or a `filter`."""
+    ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=MAX_BULK_ROWS, required=False)
+    filter = BulkFilterSerializer(required=False)
+
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError('Give either ids or filter.')
+        return data
+
+class BulkChangesSerializer(serializers.Serializer):
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+    account = serializers.PrimaryKeyRelatedField(queryset=Account.objects.all(), required=False, allow_null=True)
+    goal = serializers.PrimaryKeyRelatedField(queryset=Goal.objects.all(), required=False, allow_null=True)
+    date = serializers.DateField(required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_description(self, value):
+        return bleach.clean(value, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
+
+    def validate(self, data):
+        user = self.context['request'].user
+        for field in ('category', 'account', 'goal'):
+            if data.get(field) and data[field].user_id != user.pk:
+                raise serializers.ValidationError({field: f'{field.capitalize()} not found.'})
+        if not data:
+            raise serializers.ValidationError('Give at least one field to change.')
+        return data
+
+class BulkUpdateSerializer(BulkSelectionSerializer):
+    changes = BulkChangesSerializer()
+
+class SyncParamsSerializer(serializers.Serializer):
+    since = serializers.CharField(required=False)
+
+    def validate_since(self, value):
+        from .sync import parse_token
+
+        try:
+            parse_token(value)
+        except ValueError:
+            raise serializers.ValidationError('Invalid sync token; sync again without `since`.')
+        return value
+
+class BalancePointSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    balance = serializers.DecimalField(max_digits=14, decimal_places=2)
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -42,7 +251,7 @@ class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ['id', 'transaction_type', 'amount', 'currency', 'description', 'date', 'category', 'category_name',
-        'account', 'account_name', 'created_at']
+        'account', 'account_name', 'goal', 'created_at']
 
     def validate_description(self, value):
         # Strip HTML/JS input to prevent XSS
@@ -50,31 +259,118 @@ class TransactionSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         user = self.context['request'].user
-        category = data['category']
-        date = ['date']
-        month = date.strftime('%Y-%m')
-        qs = Budget.objects.filter(user=user, category=category, month=month)
-        if self.instance:
-            qs = qs.exclude(pk=self.instance.pk)
-        if qs.exists():
-            raise serializers.ValidationError("Budget already exists for this category and month.")
+        category = data.get('category')
+        account = data.get('account')
+        if category and category.user_id != user.pk:
+            raise serializers.ValidationError({'category': 'Category not found.'})
+        if account and account.user_id != user.pk:
+            raise serializers.ValidationError({'account': 'Account not found.'})
+        goal = data.get('goal')
+        if goal and goal.user_id != user.pk:
+            raise serializers.ValidationError({'goal': 'Goal not found.'})
+        # Same rule as bulk moves: an account only holds amounts in its own currency
+        account = data.get('account', getattr(self.instance, 'account', None))
+        currency = data.get('currency', getattr(self.instance, 'currency', None))
+        if account and currency and currency != account.currency:
+            raise serializers.ValidationError(
+                {'currency': f'Must match the currency of the account ({account.currency}).'})
         return data
 
+class RecurringTransactionSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    account_name = serializers.CharField(source='account.name', read_only=True)
+
+    class Meta:
+        model = RecurringTransaction
+        fields = ['id', 'transaction_type', 'amount', 'currency', 'description', 'category', 'category_name',
+                  'account', 'account_name', 'frequency', 'interval', 'start_date', 'end_date', 'next_date',
+                  'active', 'created_at']
+        read_only_fields = ['next_date']
+
+    def validate_description(self, value):
+        return bleach.clean(value or "", tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
+
+    def validate(self, data):
+        user = self.context['request'].user
+        category = data.get('category')
+        account = data.get('account')
+        if category and category.user_id != user.pk:
+            raise serializers.ValidationError({'category': 'Category not found.'})
+        if account and account.user_id != user.pk:
+            raise serializers.ValidationError({'account': 'Account not found.'})
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError({'end_date': 'End date cannot be before the start date.'})
+        return data
+
+    def create(self, validated_data):
+        validated_data['next_date'] = validated_data['start_date']
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        if any(field in validated_data and validated_data[field] != getattr(instance, field)
+               for field in SCHEDULE_FIELDS):
+            for field, value in validated_data.items():
+                setattr(instance, field, value)
+            validated_data['next_date'] = reschedule(instance)
+        return super().update(instance, validated_data)
+
 class BudgetSerializer(serializers.ModelSerializer):
     class Meta:
         model = Budget
         fields = ['id', 'user', 'category', 'month', 'amount']
         read_only_fields = ['user']
 
+    def validate(self, data):
+        user = self.context['request'].user
+        category = data.get('category', getattr(self.instance, 'category', None))
+        month = data.get('month', getattr(self.instance, 'month', None))
+        if category and category.user_id != user.pk:
+            raise serializers.ValidationError({'category': 'Category not found.'})
+        start, end = month_bounds(month)
+        qs = Budget.objects.filter(user=user, category=category, month__gte=start, month__lt=end)
+        if self.instance:
+            qs = qs.exclude(pk=self.instance.pk)
+        if qs.exists():
+            raise serializers.ValidationError("Budget already exists for this category and month.")
+        return data
+
 class GoalSerializer(serializers.ModelSerializer):
-    progress = serializers.SerializerMethodField()
+    # Annotated by Goal.objects.with_progress()
+    progress = serializers.FloatField(source='progress_pct', read_only=True)
 
     class Meta:
         model = Goal
         fields = ['id', 'name', 'target_amount', 'current_amount', 'deadline', 'created_at', 'progress']
 
-    def get_progress(self, obj):
-        return obj.progress()
+    def update(self, instance, validated_data):
+        # Save only the edited columns, so a stale current amount never overwrites contributions made meanwhile
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+class JobSerializer(serializers.ModelSerializer):
+    has_file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'params', 'status', 'progress', 'result', 'has_file', 'error', 'attempts',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = ['id', 'status', 'progress', 'result', 'error', 'attempts',
+                            'created_at', 'started_at', 'finished_at']
+
+    def get_has_file(self, obj):
+        return bool(obj.result_file)
+
+    def validate(self, data):
+        params = data.get('params') or {}
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({'params': 'Must be an object.'})
+        if data['kind'] == 'export_transactions' and params.get('format', 'csv') not in ('csv', 'ndjson'):
+            raise serializers.ValidationError({'params': 'format must be one of: csv, ndjson.'})
+        return data
 
 # Dashboard Serializers
 class AllTimeSummarySerializer(serializers.Serializer):
@@ -102,9 +398,26 @@ class MonthlyHistorySerializer(serializers.Serializer):
     savings = serializers.DecimalField(max_digits=12, decimal_places=2)
 
 class DashboardSerializer(serializers.Serializer):
+    base_currency = serializers.CharField()
+    missing_rates = serializers.ListField(child=serializers.CharField())
     all_time_summary = AllTimeSummarySerializer()
     current_month_summary = CurrentMonthSummarySerializer()
     category_summary = CategorySummarySerializer(many=True)
     monthly_history = MonthlyHistorySerializer(many=True)
+    goals = GoalSerializer(many=True)
     
 
+
+class BudgetReportRowSerializer(serializers.Serializer):
+    month = serializers.CharField()
+    category = serializers.IntegerField()
+    category_name = serializers.CharField()
+    budget = serializers.DecimalField(max_digits=12, decimal_places=2)
+    spent = serializers.DecimalField(max_digits=12, decimal_places=2)
+    variance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    status = serializers.CharField()
+
+class BudgetReportTotalsSerializer(serializers.Serializer):
+    budget = serializers.DecimalField(max_digits=14, decimal_places=2)
+    spent = serializers.DecimalField(max_digits=14, decimal_places=2)
+    variance = serializers.DecimalField(max_digits=14, decimal_places=2)
@@ -0,0 +1,63 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+from .cache import bump_dashboard_version
+from .models import Account, Budget, Category, Goal, RecurringTransaction, Tombstone, User
+
+
+# Transaction writes go through LedgerDelta.apply(), which bumps the version itself
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def invalidate_dashboard(sender, instance, **kwargs):
+    bump_dashboard_version(instance.user_id)
+
+
+def deleting_user(origin):
+    """Whether a deletion is part of deleting a whole user, whose tombstones go too."""
+    return isinstance(origin, User) or (isinstance(origin, QuerySet) and origin.model is User)
+
+
+# Tombstones for /api/sync/. Transaction deletes record their own (see tracker.bulk).
+TOMBSTONE_KINDS = {
+    Account: 'accounts',
+    Category: 'categories',
+    Budget: 'budgets',
+    Goal: 'goals',
+    RecurringTransaction: 'recurring',
+}
+
+
+@receiver(post_delete, sender=Account)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=Goal)
+@receiver(post_delete, sender=RecurringTransaction)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    if not deleting_user(origin):
+        Tombstone.objects.record(instance.user_id, TOMBSTONE_KINDS[sender], [instance.pk])
+
+
+@receiver(pre_delete, sender=Account)
+@receiver(pre_delete, sender=Category)
+def delete_cascaded_transactions(sender, instance, origin=None, **kwargs):
+    # The cascade would delete them with a plain DELETE; deleting them first, through
+    # the ledger, reverses their effect on balances, goals and rollups and records tombstones
+    if not deleting_user(origin):
+        instance.transactions.all().delete()
+
+
+@receiver(pre_delete, sender=Goal)
+@receiver(pre_delete, sender=RecurringTransaction)
+def touch_unlinked_transactions(sender, instance, origin=None, **kwargs):
+    # The deletion sets their goal/recurring to NULL with a plain UPDATE that would leave updated_at alone
+    if not deleting_user(origin):
+        related = instance.contributions if sender is Goal else instance.occurrences
+        related.update(updated_at=now())
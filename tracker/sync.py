@@ -0,0 +1,103 @@
+"""Delta sync for offline clients.
+
+A sync token is a point in time. `sync()` returns the user's rows of every
+SYNCED kind whose `updated_at` is after the token, and the ids of the rows
+deleted after it (from `Tombstone`), each found through a (user, updated_at)
+or (user, deleted_at) index, so an idle client's sync is a few empty index
+range scans. The response carries the token for the next sync.
+
+A row's timestamp is taken before its transaction commits, so the window
+starts SYNC_OVERLAP before the token: rows committed slightly after a sync
+are still seen by the next one. Clients upsert by id, as a row can come
+twice. A window holding more than MAX_SYNC_ROWS rows of one kind is cut
+short at a point in time; the response says `has_more` and its token
+continues exactly from there.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils.timezone import now
+
+from .models import Account, Budget, Category, Goal, RecurringTransaction, Tombstone, Transaction
+from .serializers import (AccountSerializer, BudgetSerializer, CategorySerializer, GoalSerializer,
+                          RecurringTransactionSerializer, TransactionSerializer, ValuesRowSerializer)
+
+MAX_SYNC_ROWS = 1000  # per kind and response
+SYNC_OVERLAP = timedelta(seconds=60)
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+EXACT = '.'  # suffix of the tokens continuing a window that was cut short
+
+# Kind: the user's rows and the serializer rendering them
+SYNCED = {
+    'accounts': (lambda user: Account.objects.filter(user=user), AccountSerializer),
+    'categories': (lambda user: Category.objects.filter(user=user), CategorySerializer),
+    'transactions': (lambda user: Transaction.objects.filter(user=user), TransactionSerializer),
+    'budgets': (lambda user: Budget.objects.filter(user=user), BudgetSerializer),
+    'goals': (lambda user: Goal.objects.filter(user=user).with_progress(), GoalSerializer),
+    'recurring': (lambda user: RecurringTransaction.objects.filter(user=user), RecurringTransactionSerializer),
+}
+
+
+def make_token(moment, exact=False):
+    return str((moment - EPOCH) // MICROSECOND) + (EXACT if exact else '')
+
+
+def parse_token(token):
+    """The point in time of `token` and whether it continues a cut-short window; ValueError if malformed."""
+    exact = token.endswith(EXACT)
+    micros = token[:-1] if exact else token
+    if not micros.isdigit():
+        raise ValueError(f'Invalid sync token {token!r}')
+    return EPOCH + int(micros) * MICROSECOND, exact
+
+
+def window(queryset, field, lower, upper, limit=None):
+    queryset = queryset.filter(**{f'{field}__lte': upper})
+    if lower is not None:
+        queryset = queryset.filter(**{f'{field}__gt': lower})
+    queryset = queryset.order_by(field, 'id')
+    return queryset if limit is None else queryset[:limit]
+
+
+def sync(user, token=None):
+    """Rows changed and ids deleted since `token` (everything without one), and the next token."""
+    upper = now()
+    lower = None
+    if token:
+        lower, exact = parse_token(token)
+        if not exact:
+            lower -= SYNC_OVERLAP
+
+    streams = {}
+    for kind, (rows, serializer_class) in SYNCED.items():
+        lookups = ValuesRowSerializer.for_class(serializer_class).lookups
+        streams[kind] = (rows(user).values(*lookups, 'updated_at'), 'updated_at')
+    if lower is not None:  # a first sync has nothing to delete
+        streams['deleted'] = (Tombstone.objects.filter(user=user).values('kind', 'object_id', 'deleted_at'), 'deleted_at')
+
+    fetched = {name: list(window(queryset, field, lower, upper, MAX_SYNC_ROWS + 1))
+               for name, (queryset, field) in streams.items()}
+    cut = {name: rows for name, rows in fetched.items() if len(rows) > MAX_SYNC_ROWS}
+    has_more = bool(cut)
+    if has_more:
+        upper = min(rows[MAX_SYNC_ROWS - 1][streams[name][1]] for name, rows in cut.items())
+        for name, rows in fetched.items():
+            field = streams[name][1]
+            if name in cut and rows[MAX_SYNC_ROWS][field] == upper:
+                # More rows share the cut-off time than were fetched
+                fetched[name] = list(window(streams[name][0], field, lower, upper))
+            else:
+                fetched[name] = [row for row in rows if row[field] <= upper]
+
+    deleted = {kind: [] for kind in SYNCED}
+    for row in fetched.pop('deleted', []):
+        deleted.setdefault(row['kind'], []).append(row['object_id'])
+    return {
+        'token': make_token(upper, exact=has_more),
+        'has_more': has_more,
+        'changes': {
+            kind: ValuesRowSerializer.for_class(serializer_class).to_representation(fetched[kind])
+            for kind, (_, serializer_class) in SYNCED.items()
+        },
+        'deleted': deleted,
+    }
@@ -1,3 +1,1885 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_init
+from django.forms.models import model_to_dict
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from .admin import AccountAdmin, custom_admin_site, export_transactions_to_csv
+from . import dashboard as dashboard_module
+from .admin_dashboard import build_admin_dashboard
+from .jobs import HANDLERS, claim_jobs, enqueue, execute, heartbeat, requeue_stale, set_progress
+from .management.commands.runworker import Command as RunWorkerCommand
+from .metrics import reset_metrics
+from .routers import REPLICA_ALIAS, ReplicaRouter, check_pin_cache, pin_key, replica_configured, replica_reads
+from .search import search_transactions, tsquery
+from .reconcile import reconcile_shard
+from .recurring import run_recurring
+from . import sync as sync_module
+from .perf import DEFAULT_BUDGET_FILE, SeedConfig, check_budgets, load_budgets, run_benchmarks, seed
+from .serializers import AccountSerializer, TransactionSerializer, ValuesRowSerializer
+from .models import User, Account, Category, Transaction, Budget, Goal, MonthlyRollup, ExchangeRate, Job
+from .models import AccountBalanceSnapshot, RecurringTransaction, Tombstone
+
+
+def make_user(username='alice'):
+    return User.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class DashboardViewTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Wallet', account_type='cash')
+        self.today = now().date()
+        self.month = self.today.replace(day=1)
+
+    def add_category(self, name, budget=None, spent=None):
+        category = Category.objects.create(user=self.user, name=name, category_type='expense')
+        if budget is not None:
+            Budget.objects.create(user=self.user, category=category, month=self.month, amount=budget)
+        if spent is not None:
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=category,
+                transaction_type='expense', amount=spent, date=self.today,
+            )
+        return category
+
+    def dashboard_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_payload(self):
+        salary = Category.objects.create(user=self.user, name='Salary', category_type='income')
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=salary,
+            transaction_type='income', amount=Decimal('1000.00'), date=self.today,
+        )
+        Transaction.objects.create(
+            user=self.user, account=self.account, category=salary,
+            transaction_type='income', amount=Decimal('500.00'), date=date(2020, 1, 15),
+        )
+        self.add_category('Food', budget=Decimal('100.00'), spent=Decimal('150.00'))
+        self.add_category('Rent', budget=Decimal('400.00'), spent=Decimal('400.00'))
+        Goal.objects.create(user=self.user, name='Car', target_amount=Decimal('1000.00'))
+
+        data = self.client.get(reverse('dashboard')).json()
+
+        self.assertEqual(data['all_time_summary'], {
+            'total_income': '1500.00', 'total_expenses': '550.00', 'net_savings': '950.00',
+        })
+        self.assertEqual(data['current_month_summary']['income'], '1000.00')
+        self.assertEqual(data['current_month_summary']['savings'], '450.00')
+
+        by_name = {row['category']: row for row in data['category_summary']}
+        self.assertEqual(by_name['Food']['status'], 'Exceeded')
+        self.assertEqual(by_name['Food']['balance'], '-50.00')
+        self.assertEqual(by_name['Rent']['status'], 'OK')
+        self.assertEqual(by_name['Salary']['expenditure'], '0.00')
+        self.assertEqual(by_name['Salary']['budget'], '0.00')
+
+        self.assertEqual(data['monthly_history'][0], {
+            'month': '2020-01', 'income': '500.00', 'expenses': '0.00', 'savings': '500.00',
+        })
+        self.assertEqual([goal['name'] for goal in data['goals']], ['Car'])
+
+    def test_several_budgets_in_a_month_neither_double_spending_nor_drop(self):
+        food = self.add_category('Food', budget=Decimal('100.00'), spent=Decimal('10.00'))
+        second_day = self.month + timedelta(days=1)
+        Budget.objects.create(user=self.user, category=food, month=second_day, amount=Decimal('50.00'))
+
+        row, = self.client.get(reverse('dashboard')).json()['category_summary']
+        self.assertEqual((row['expenditure'], row['budget'], row['balance']), ('10.00', '150.00', '140.00'))
+
+    def test_query_count_is_independent_of_category_count(self):
+        self.add_category('Food', budget=Decimal('100.00'), spent=Decimal('10.00'))
+        baseline = self.dashboard_query_count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(30):
+                self.add_category(f'Category {i}', budget=Decimal('50.00'), spent=Decimal('5.00'))
+            Goal.objects.create(user=self.user, name='Holiday', target_amount=Decimal('300.00'))
+
+        self.assertEqual(self.dashboard_query_count(), baseline)
+
+
+class MonthlyRollupTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.account = Account.objects.create(user=self.user, name='Wallet', account_type='cash')
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.rent = Category.objects.create(user=self.user, name='Rent', category_type='expense')
+
+    def buckets(self):
+        return {
+            (r.month, r.category_id, r.transaction_type): (r.total, r.count)
+            for r in MonthlyRollup.objects.filter(user=self.user, count__gt=0)
+        }
+
+    def add(self, amount, day, category=None, transaction_type='expense'):
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=category or self.food,
+            transaction_type=transaction_type, amount=Decimal(amount), date=day,
+        )
+
+    def test_writes_maintain_rollup(self):
+        first = self.add('10.00', date(2025, 3, 2))
+        self.add('5.50', date(2025, 3, 20))
+        moved = self.add('7.00', date(2025, 4, 1))
+
+        moved.date = date(2025, 3, 31)
+        moved.category = self.rent
+        moved.save()
+        first.delete()
+
+        self.assertEqual(self.buckets(), {
+            (date(2025, 3, 1), self.food.pk, 'expense'): (Decimal('5.50'), 1),
+            (date(2025, 3, 1), self.rent.pk, 'expense'): (Decimal('7.00'), 1),
+        })
+
+    def test_rebuild_command_matches_incremental_rollup(self):
+        self.add('10.00', date(2025, 1, 5))
+        self.add('20.00', date(2025, 1, 6), category=self.rent)
+        self.add('30.00', date(2025, 2, 7), transaction_type='income')
+        incremental = self.buckets()
+
+        MonthlyRollup.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(self.buckets(), incremental)
+
+
+class TransactionImportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Bank', account_type='bank', balance=Decimal('100.00'))
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.salary = Category.objects.create(user=self.user, name='Salary', category_type='income')
+
+    def upload(self, name, content, content_type):
+        upload = SimpleUploadedFile(name, content.encode(), content_type=content_type)
+        return self.client.post(reverse('transaction-import-transactions'), {'file': upload}, format='multipart')
+
+    def test_csv_import(self):
+        content = (
+            "date,amount,transaction_type,category,account,description\n"
+            "2025-01-03,40.00,expense,food,Bank,<b>Lunch</b>\n"
+            "2025-01-31,500.00,INCOME,Salary,Bank,\n"
+            "not-a-date,1.00,expense,Food,Bank,\n"
+            "2025-02-01,-5,expense,Unknown,Bank,\n"
+            f"2025-02-02,10.00,expense,{self.food.pk},,No account\n"
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.upload('statement.csv', content, 'text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(len(ctx.captured_queries), 25)
+
+        data = response.json()
+        self.assertEqual(data['created'], 3)
+        self.assertEqual(data['error_count'], 2)
+        self.assertEqual(data['errors'][0], {'row': 3, 'errors': {'date': ['Enter a valid date in YYYY-MM-DD format.']}})
+        self.assertEqual(set(data['errors'][1]['errors']), {'amount', 'category'})
+
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('560.00'))
+        lunch = Transaction.objects.get(amount=Decimal('40.00'))
+        self.assertEqual((lunch.description, lunch.currency), ('Lunch', 'KES'))
+        self.assertEqual(
+            MonthlyRollup.objects.get(user=self.user, category=self.food, month=date(2025, 2, 1)).total,
+            Decimal('10.00'),
+        )
+
+    def test_ndjson_import_in_chunks(self):
+        lines = [
+            '{"date": "2025-03-%02d", "amount": "1.50", "transaction_type": "expense", "category": "Food", '
+            '"account": "bank"}' % day
+            for day in range(1, 26)
+        ]
+        lines.insert(3, 'not json')
+        with mock.patch('tracker.importers.CHUNK_SIZE', 10), CaptureQueriesContext(connection) as ctx:
+            response = self.upload('rows.ndjson', "\n".join(lines) + "\n", 'application/x-ndjson')
+
+        self.assertEqual(response.status_code, 201)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "tracker_transaction"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(response.json()['created'], 25)
+        self.assertEqual(response.json()['errors'], [{'row': 4, 'errors': {'non_field_errors': ['Line is not a JSON object.']}}])
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('62.50'))
+
+    def test_rejects_unknown_format(self):
+        response = self.upload('rows.txt', 'hello', 'text/plain')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_upload_that_is_not_utf8(self):
+        uploads = {
+            'statement.csv': "date,amount,transaction_type,category,account,description\n"
+                             "2025-01-03,40.00,expense,Food,Bank,Lunch\n"
+                             "2025-01-04,5.00,expense,Food,Bank,Caf\u00e9\n",
+            'rows.ndjson': '{"date": "2025-01-03", "amount": "40.00", "transaction_type": "expense", "category": "Food"}\n'
+                           '\n'
+                           '{"date": "2025-01-04", "amount": "5.00", "description": "Caf\u00e9"}\n',
+        }
+        for name, content in uploads.items():
+            upload = SimpleUploadedFile(name, content.encode('latin-1'))
+            response = self.client.post(reverse('transaction-import-transactions'), {'file': upload}, format='multipart')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'file': ['Line 3 is not valid UTF-8.']})
+        self.assertFalse(Transaction.objects.exists())
+
+
+class BalanceLedgerTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.wallet = Account.objects.create(user=self.user, name='Wallet', account_type='cash', balance=Decimal('100.00'))
+        self.bank = Account.objects.create(user=self.user, name='Bank', account_type='bank', balance=Decimal('100.00'))
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+
+    def add(self, amount, account=None, transaction_type='expense'):
+        return Transaction.objects.create(
+            user=self.user, account=account or self.wallet, category=self.food,
+            transaction_type=transaction_type, amount=Decimal(amount), date=date(2025, 5, 1),
+        )
+
+    def balances(self):
+        return tuple(Account.objects.filter(pk__in=[self.wallet.pk, self.bank.pk]).order_by('name').values_list('balance', flat=True))
+
+    def test_create_update_and_delete_adjust_balances(self):
+        txn = self.add('30.00')
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('70.00')))
+
+        txn.account = self.bank
+        txn.amount = Decimal('20.00')
+        txn.transaction_type = 'income'
+        txn.save()
+        self.assertEqual(self.balances(), (Decimal('120.00'), Decimal('100.00')))
+
+        txn.delete()
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('100.00')))
+
+    def test_cascaded_and_queryset_deletes_reverse_balances(self):
+        self.add('30.00')
+        self.add('20.00', account=self.bank)
+        self.food.delete()
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('100.00')))
+        self.assertEqual(set(AccountBalanceSnapshot.objects.values_list('running_total', flat=True)), {Decimal('0.00')})
+        self.assertEqual(set(MonthlyRollup.objects.values_list('count', flat=True)), set())
+
+        self.food = Category.objects.create(user=self.user, name='Fun', category_type='expense')
+        kept = self.add('5.00', account=self.bank)
+        self.add('10.00')
+        self.add('15.00')
+        self.assertEqual(Transaction.objects.exclude(pk=kept.pk).delete(), (2, {'tracker.Transaction': 2}))
+        self.assertEqual(self.balances(), (Decimal('95.00'), Decimal('100.00')))
+        self.assertEqual(MonthlyRollup.objects.get().count, 1)
+        self.assertEqual(Tombstone.objects.filter(user=self.user, kind='transactions').count(), 4)
+
+    def test_updates_and_deletes_re_read_the_row_under_a_lock(self):
+        txn = self.add('30.00')
+        stale = Transaction.objects.get(pk=txn.pk)
+        txn.amount = Decimal('20.00')
+        txn.save()
+        lock = mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update)
+        with lock as select_for_update:
+            # Reverses the stored 20.00, not the 30.00 this instance was loaded with
+            stale.amount = Decimal('25.00')
+            stale.save()
+            stale.delete()
+        self.assertEqual(select_for_update.call_count, 2)
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('100.00')))
+
+    def test_writes_landing_between_read_and_update_are_kept(self):
+        """Another writer changes the balance after this write read its state, just before its own UPDATE."""
+        interleaved = []
+
+        def other_writer(execute, sql, params, many, context):
+            if sql.startswith('UPDATE "tracker_account"') and not interleaved:
+                interleaved.append(sql)
+                Account.objects.filter(pk=self.wallet.pk).update(balance=F('balance') + 5)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(other_writer):
+            txn = self.add('30.00')
+        txn.amount = Decimal('10.00')
+        interleaved.clear()
+        with connection.execute_wrapper(other_writer):
+            txn.save()
+        self.assertEqual(len(interleaved), 1)
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('100.00')))
+
+    def test_stale_account_instances_do_not_lose_updates(self):
+        # Two requests that loaded the account before either one wrote
+        first_view = Account.objects.get(pk=self.wallet.pk)
+        second_view = Account.objects.get(pk=self.wallet.pk)
+        for account in (first_view, second_view):
+            self.add('10.00', account=account)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('80.00'))
+
+    def test_query_counts_are_fixed(self):
+        txn = self.add('5.00')
+        # savepoint, insert, balance update, checkpoint lookup and update, rollup update, release
+        with self.assertNumQueries(7):
+            self.add('5.00')
+        txn.account = self.bank
+        txn.amount = Decimal('7.00')
+        # savepoint, locked re-read, update, one balance update for both accounts,
+        # checkpoint lookup, insert and update for the new account, and lookup and update
+        # for the old one, rollup update, release
+        with self.assertNumQueries(11):
+            txn.save()
+        # ... and the tombstone insert for syncing clients
+        with self.assertNumQueries(9):
+            txn.delete()
+
+
+class ReconcileBalancesTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        response = self.client.post(reverse('account-list'), {'name': 'Wallet', 'account_type': 'cash', 'balance': '100.00'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.wallet = Account.objects.get(pk=response.data['id'])
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        Transaction.objects.create(user=self.user, account=self.wallet, category=self.food, transaction_type='expense',
+                                   amount=Decimal('30.00'), date=date(2025, 5, 1))
+        other = make_user('bob')
+        self.other = Account.objects.create(user=other, name='Bob', account_type='bank')
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_balances', '--processes', '0', '--shard-size', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_reports_and_fixes_drift(self):
+        self.assertIn('Checked 2 accounts in 2 shards: 0 drifted', self.reconcile())
+        Account.objects.filter(pk=self.wallet.pk).update(balance=Decimal('95.00'))
+
+        out = self.reconcile()
+        self.assertIn(f'Account {self.wallet.pk} (user {self.user.pk}): balance 95.00, expected 70.00, drift 25.00', out)
+        self.assertIn('1 drifted by 25.00 in total; run with --fix', out)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('95.00'))
+
+        self.assertIn('all corrected', self.reconcile('--fix'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('70.00'))
+        self.assertIn('0 drifted', self.reconcile())
+
+    def test_balance_edits_adjust_the_opening_balance(self):
+        response = self.client.patch(reverse('account-detail', args=[self.wallet.pk]), {'balance': '150.00'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.wallet.refresh_from_db()
+        self.assertEqual((self.wallet.balance, self.wallet.opening_balance), (Decimal('150.00'), Decimal('180.00')))
+        self.assertIn('0 drifted', self.reconcile())
+
+    def test_one_query_per_shard(self):
+        with self.assertNumQueries(1):
+            checked, drifted = reconcile_shard(self.user.pk, self.user.pk + 2)
+        self.assertEqual((checked, drifted), (2, []))
+
+
+class BalanceHistoryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Bank', account_type='bank',
+                                              balance=Decimal('100.00'), opening_balance=Decimal('100.00'))
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.salary = Category.objects.create(user=self.user, name='Salary', category_type='income')
+        for day, category, amount in (
+            (date(2025, 1, 10), self.salary, '1000.00'),
+            (date(2025, 1, 20), self.food, '50.00'),
+            (date(2025, 3, 5), self.food, '25.00'),
+            (date(2025, 3, 31), self.food, '5.00'),
+        ):
+            self.add(day, category, amount)
+
+    def add(self, day, category, amount):
+        return Transaction.objects.create(
+            user=self.user, account=self.account, category=category,
+            transaction_type=category.category_type, amount=Decimal(amount), date=day,
+        )
+
+    def checkpoints(self):
+        return list(AccountBalanceSnapshot.objects.filter(account=self.account).order_by('month')
+                    .values_list('month', 'running_total'))
+
+    def replayed_balance(self, day):
+        """Balance at the end of `day` by replaying every later transaction backwards."""
+        self.account.refresh_from_db()
+        balance = self.account.balance
+        for txn in self.account.transactions.filter(date__gt=day):
+            balance -= txn.amount if txn.transaction_type == 'income' else -txn.amount
+        return balance
+
+    def history(self, **params):
+        response = self.client.get(reverse('account-balance-history', args=[self.account.pk]), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {point['date']: Decimal(point['balance']) for point in response.json()['points']}
+
+    def test_checkpoints_follow_writes(self):
+        self.assertEqual(self.checkpoints(), [(date(2025, 1, 1), Decimal('950.00')), (date(2025, 3, 1), Decimal('920.00'))])
+
+        # A backdated transaction creates its month's checkpoint and shifts the later ones
+        backdated = self.add(date(2025, 2, 14), self.food, '20.00')
+        self.assertEqual(self.checkpoints()[1:], [(date(2025, 2, 1), Decimal('930.00')), (date(2025, 3, 1), Decimal('900.00'))])
+
+        backdated.date = date(2024, 12, 31)
+        backdated.save()
+        backdated.delete()
+        # Emptied months keep a checkpoint equal to the previous one
+        self.assertEqual([total for _, total in self.checkpoints()], [Decimal(v) for v in ('0', '950', '950', '920')])
+        AccountBalanceSnapshot.objects.rebuild(user=self.user)
+        self.assertEqual(self.checkpoints(), [(date(2025, 1, 1), Decimal('950.00')), (date(2025, 3, 1), Decimal('920.00'))])
+
+    def test_history_matches_replay(self):
+        expected_points = {
+            'day': ('2025-01-09', '2025-01-10', '2025-02-28', '2025-03-05', '2025-03-31', '2025-04-02'),
+            'week': ('2025-01-12', '2025-01-19', '2025-03-09', '2025-04-02'),
+            'month': ('2025-01-31', '2025-02-28', '2025-03-31', '2025-04-02'),
+        }
+        for interval, days in expected_points.items():
+            with self.subTest(interval=interval), self.assertNumQueries(4):
+                history = self.history(**{'from': '2025-01-09', 'to': '2025-04-02', 'interval': interval})
+            for day in days:
+                self.assertEqual(history[day], self.replayed_balance(date.fromisoformat(day)), (interval, day))
+        self.assertEqual(len(history), 4)
+        self.assertEqual(self.history(**{'from': '2025-01-09', 'to': '2025-01-09'}), {'2025-01-09': Decimal('100.00')})
+
+    def test_drift_is_not_folded_into_the_history(self):
+        Account.objects.filter(pk=self.account.pk).update(balance=F('balance') - 10)
+        history = self.history(**{'from': '2025-03-31', 'to': '2025-03-31'})
+        self.assertEqual(history, {'2025-03-31': Decimal('1020.00')})  # the opening 100 plus the net 920
+
+    def test_invalid_ranges(self):
+        url = reverse('account-balance-history', args=[self.account.pk])
+        self.assertEqual(self.client.get(url, {'interval': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2025-02-01', 'to': '2025-01-01'}).status_code, 400)
+        response = self.client.get(url, {'from': '2020-01-01', 'to': '2025-01-01', 'interval': 'day'})
+        self.assertIn('interval', response.json())
+        self.assertIn('to', self.client.get(url, {'to': '9999-12-31', 'interval': 'week'}).json())
+        other = Account.objects.create(user=make_user('bob'), name='Bank', account_type='bank')
+        self.assertEqual(self.client.get(reverse('account-balance-history', args=[other.pk])).status_code, 404)
+
+    def test_default_range_stops_at_the_first_representable_day(self):
+        for interval, first in (('day', '0001-01-01'), ('week', '0001-01-07'), ('month', '0001-01-10')):
+            with self.subTest(interval=interval):
+                history = self.history(to='0001-01-10', interval=interval)
+                self.assertEqual(next(iter(history)), first)
+                self.assertEqual(set(history.values()), {Decimal('100.00')})
+        self.assertEqual(len(self.history(to='0001-06-01', interval='month')), 6)
+
+
+def run_in_threads(func, count):
+    """Run `func` in `count` threads started together; returns their results."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+    errors = []
+
+    def run(index):
+        try:
+            barrier.wait()
+            results[index] = func()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+@skipIf(connection.vendor == 'sqlite', "SQLite serialises writers; BalanceLedgerTests forces the interleaving instead.")
+class ConcurrentBalanceTests(TransactionTestCase):
+    WORKERS = 4
+    WRITES_PER_WORKER = 25
+
+    def test_concurrent_writes_do_not_lose_updates(self):
+        user = make_user()
+        account = Account.objects.create(user=user, name='Shared', account_type='bank')
+        category = Category.objects.create(user=user, name='Salary', category_type='income')
+
+        def worker():
+            for _ in range(self.WRITES_PER_WORKER):
+                txn = Transaction.objects.create(
+                    user=user, account=account, category=category,
+                    transaction_type='income', amount=Decimal('1.00'), date=date(2025, 5, 1),
+                )
+            txn.amount = Decimal('2.00')
+            txn.save()
+
+        run_in_threads(worker, self.WORKERS)
+        account.refresh_from_db()
+        self.assertEqual(account.balance, Decimal(self.WORKERS * (self.WRITES_PER_WORKER + 1)))
+
+
+class TransactionExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Bank', account_type='bank')
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        for day in (1, 15, 28):
+            Transaction.objects.create(
+                user=self.user, account=self.account, category=self.food, transaction_type='expense',
+                amount=Decimal('12.50'), date=date(2025, 2, day), description=f'Day {day}',
+            )
+        Transaction.objects.create(
+            user=self.user, category=self.food, transaction_type='expense',
+            amount=Decimal('3.00'), date=date(2025, 3, 1),
+        )
+        other = make_user('bob')
+        Transaction.objects.create(
+            user=other, category=Category.objects.create(user=other, name='X', category_type='expense'),
+            transaction_type='expense', amount=Decimal('1.00'), date=date(2025, 2, 2),
+        )
+
+    def export(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('transaction-export'), params)
+            body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return response, body
+
+    def test_csv_export(self):
+        response, body = self.export(format='csv', **{'from': '2025-02-10'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,date,transaction_type,amount,currency,category,account,description')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['2025-02-15', '2025-02-28', '2025-03-01'])
+        self.assertTrue(lines[-1].endswith(',Food,,'))
+
+    def test_ndjson_export(self):
+        response, body = self.export(format='ndjson', to='2025-02-20')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['amount'], '12.50')
+        self.assertEqual(rows[0]['account'], 'Bank')
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse('transaction-export'), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('transaction-export'), {'from': 'yesterday'}).status_code, 400)
+
+    def test_admin_action_streams_rows_without_accounts(self):
+        response = export_transactions_to_csv(None, None, Transaction.objects.filter(user=self.user))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'User,Account,Category,Type,Amount,Currency,Date')
+        self.assertEqual(lines[-1], 'alice@example.com,,Food,expense,3.00,,2025-03-01')
+
+
+class TransactionSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.lunch = self.add('Lunch at the office', date(2025, 1, 3))
+        self.add('Team lunch, lunch money back', date(2025, 1, 2))
+        self.add('Groceries', date(2025, 1, 4))
+        self.add(None, date(2025, 1, 5))
+        bob = make_user('bob')
+        Transaction.objects.create(
+            user=bob, category=Category.objects.create(user=bob, name='Food', category_type='expense'),
+            transaction_type='expense', amount=Decimal('1.00'), date=date(2025, 1, 3), description='Lunch',
+        )
+
+    def add(self, description, day):
+        return Transaction.objects.create(
+            user=self.user, category=self.food, transaction_type='expense',
+            amount=Decimal('1.00'), date=day, description=description,
+        )
+
+    def search(self, q, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('transaction-list'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        if connection.vendor == 'sqlite':
+            self.assertTrue(all('LIKE' not in query['sql'] for query in ctx.captured_queries))
+        return [row['description'] for row in response.json()['results']]
+
+    def test_ranked_prefix_search_of_own_transactions(self):
+        self.assertEqual(self.search('LUNCH'), ['Team lunch, lunch money back', 'Lunch at the office'])
+        self.assertEqual(self.search('office lun'), ['Lunch at the office'])
+        self.assertEqual(self.search('lunch', pagination='cursor'), ['Lunch at the office', 'Team lunch, lunch money back'])
+        self.assertEqual(self.search('"*:'), [])
+        self.assertEqual(self.search('dinner'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.lunch.description = 'Dinner with friends'
+        self.lunch.save()
+        self.assertEqual(self.search('dinner'), ['Dinner with friends'])
+        self.assertEqual(self.search('office'), [])
+
+        Transaction.objects.filter(pk=self.lunch.pk).update(description='Office party')
+        self.assertEqual(self.search('office'), ['Office party'])
+        self.lunch.delete()
+        self.assertEqual(self.search('office'), [])
+
+    def test_postgresql_query_expands_the_last_term(self):
+        self.assertEqual(tsquery(['office', 'lun']), "'office' & 'lun':*")
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            queryset = search_transactions(Transaction.objects.all(), 'Office lun!', user=self.user)
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn('to_tsquery', sql)
+        self.assertIn("'office' & 'lun':*", params)
+
+    def test_admin_search(self):
+        admin_client = Client()
+        admin_client.force_login(User.objects.create_superuser(username='root', email='root@example.com', password='x'))
+        response = admin_client.get(reverse('custom_admin:tracker_transaction_changelist'), {'q': 'lunch'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+
+class TransactionPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, category=category, transaction_type='expense',
+                amount=Decimal('1.00'), date=date(2025, 1, 1 + i // 3),
+            )
+            for i in range(25)
+        ])
+        self.expected = list(
+            Transaction.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True)
+        )
+
+    def list_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [q['sql'] for q in ctx.captured_queries]
+
+    def test_keyset_pages_follow_next_links(self):
+        url, params = reverse('transaction-list'), {'pagination': 'cursor', 'page_size': 4}
+        seen = []
+        while url:
+            data, queries = self.list_queries(url, params)
+            params = None
+            self.assertNotIn('count', data)
+            self.assertFalse(any('COUNT(' in sql or 'OFFSET' in sql for sql in queries))
+            self.assertEqual(len([sql for sql in queries if 'FROM "tracker_transaction"' in sql]), 1)
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+
+        self.assertEqual(seen, self.expected)
+
+    def test_page_size_is_capped(self):
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, category=Category.objects.get(name='Food'), transaction_type='expense',
+                amount=Decimal('1.00'), date=date(2024, 1, 1),
+            )
+            for _ in range(100)
+        ])
+        data, _ = self.list_queries(reverse('transaction-list'), {'page_size': 500})
+        self.assertEqual(len(data['results']), 100)
+        self.assertEqual(data['count'], 125)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('transaction-list'), {'pagination': 'cursor', 'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries must be answered from the composite indexes, not table scans."""
+
+    def setUp(self):
+        self.user = make_user()
+        self.category = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, category=self.category, transaction_type=('income', 'expense')[i % 2],
+                amount=Decimal('1.00'), date=date(2025, 1 + i % 12, 1),
+            )
+            for i in range(200)
+        ])
+        MonthlyRollup.objects.rebuild()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Tiny test tables would otherwise always be sequentially scanned
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_transaction_list(self):
+        queryset = Transaction.objects.filter(user=self.user).order_by('-date', '-id')[:10]
+        self.assertUsesIndex(queryset, 'tracker_txn_user_date_id_idx')
+
+    def test_transaction_date_range(self):
+        queryset = Transaction.objects.filter(user=self.user, date__gte=date(2025, 3, 1), date__lt=date(2025, 4, 1))
+        self.assertUsesIndex(queryset, 'tracker_txn_user_date_id_idx')
+
+    def test_transaction_type_date_range(self):
+        queryset = Transaction.objects.filter(
+            user=self.user, transaction_type='expense', date__gte=date(2025, 3, 1),
+        ).values('amount')
+        self.assertUsesIndex(queryset, 'tracker_txn_user_type_date_idx')
+
+    def test_dashboard_rollup(self):
+        queryset = MonthlyRollup.objects.filter(user=self.user, month=date(2025, 3, 1))
+        self.assertUsesIndex(queryset, 'user_id_month')
+
+    def test_admin_month_range(self):
+        queryset = MonthlyRollup.objects.filter(month__gte=date(2025, 3, 1), transaction_type='expense')
+        self.assertUsesIndex(queryset, 'tracker_rollup_month_type_idx')
+
+    def test_budget_month_range(self):
+        queryset = Budget.objects.filter(user=self.user, month__gte=date(2025, 1, 1), month__lt=date(2026, 1, 1))
+        self.assertUsesIndex(queryset, 'tracker_budget_user_month_idx')
+
+
+class ListQueryCountTests(APITestCase):
+    """List endpoints must not issue extra queries per listed row."""
+
+    def setUp(self):
+        super().setUp()
+        self.counter = 0
+
+    def make_rows(self, endpoint, count):
+        for _ in range(count):
+            self.counter += 1
+            n = self.counter
+            category = Category.objects.create(user=self.user, name=f'Category {n}', category_type='expense')
+            if endpoint == 'account-list':
+                Account.objects.create(user=self.user, name=f'Account {n}', account_type='bank')
+            elif endpoint == 'transaction-list':
+                account = Account.objects.create(user=self.user, name=f'Account {n}', account_type='bank')
+                Transaction.objects.create(
+                    user=self.user, account=account, category=category, transaction_type='expense',
+                    amount=Decimal('1.00'), date=date(2025, 1, 1),
+                )
+            elif endpoint == 'budget-list':
+                Budget.objects.create(user=self.user, category=category, month=date(2025, 1, 1), amount=Decimal('5.00'))
+            elif endpoint == 'goal-list':
+                Goal.objects.create(user=self.user, name=f'Goal {n}', target_amount=Decimal('10.00'))
+
+    def query_count(self, endpoint, expected_rows):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(endpoint))
+        self.assertEqual(len(response.json()['results']), expected_rows)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for endpoint in ('account-list', 'category-list', 'transaction-list', 'budget-list', 'goal-list'):
+            with self.subTest(endpoint=endpoint):
+                Category.objects.filter(user=self.user).delete()
+                Account.objects.filter(user=self.user).delete()
+                Goal.objects.filter(user=self.user).delete()
+                self.make_rows(endpoint, 1)
+                few = self.query_count(endpoint, 1)
+                self.make_rows(endpoint, 9)
+                self.assertEqual(self.query_count(endpoint, 10), few)
+
+
+class DashboardCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(user=self.user, name='Food', category_type='expense')
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'), **headers)
+        return response, len(ctx.captured_queries)
+
+    def assertRevalidates(self):
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response, queries = self.get(etag)
+        self.assertEqual((response.status_code, queries), (304, 0))
+        response, queries = self.get()
+        self.assertEqual((response.status_code, queries), (200, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, category=self.category, transaction_type='expense',
+                amount=Decimal('9.99'), date=now().date(),
+            )
+        response, queries = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(queries, 0)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['all_time_summary']['total_expenses'], '9.99')
+
+    def test_local_memory_cache(self):
+        self.assertRevalidates()
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with self.settings(CACHES={'default': backend}):
+                self.assertRevalidates()
+
+    def test_budget_goal_account_and_category_writes_invalidate(self):
+        writes = [
+            lambda: Budget.objects.create(user=self.user, category=self.category, month=now().date().replace(day=1), amount=1),
+            lambda: Goal.objects.create(user=self.user, name='Car', target_amount=10),
+            lambda: Account.objects.create(user=self.user, name='Wallet', account_type='cash'),
+            lambda: Account.objects.get(user=self.user, name='Wallet').delete(),
+            lambda: Category.objects.filter(pk=self.category.pk).first().delete(),
+        ]
+        for write in writes:
+            etag = self.get()[0]['ETag']
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertEqual(self.get(etag)[0].status_code, 200)
+
+    def test_deleting_an_account_removes_its_transactions_from_the_totals(self):
+        account = Account.objects.create(user=self.user, name='Wallet', account_type='cash')
+        Transaction.objects.create(user=self.user, account=account, category=self.category, transaction_type='expense',
+                                   amount=Decimal('10.00'), date=now().date())
+        etag = self.get()[0]['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('account-detail', args=[account.pk]))
+        self.assertEqual(response.status_code, 204)
+        response = self.get(etag)[0]
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['all_time_summary']['total_expenses'], '0.00')
+        self.assertEqual(set(MonthlyRollup.objects.values_list('count', flat=True)), {0})
+
+    def test_other_users_writes_do_not_invalidate(self):
+        etag = self.get()[0]['ETag']
+        other = make_user('bob')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(user=other, name='Food', category_type='expense')
+        self.assertEqual(self.get(etag)[0].status_code, 304)
+
+
+class FastListSerializationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Bank', account_type='bank', balance=Decimal('10.5'))
+        category = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        for i in range(300):
+            Transaction.objects.create(
+                user=self.user, account=self.account if i % 3 else None, category=category,
+                transaction_type='expense', amount=Decimal('1.1') + i,
+                description=None if i % 2 else f'Item {i}', date=date(2025, 1, 1 + i % 28),
+            )
+
+    def slow_and_fast(self, viewset_queryset, serializer_class):
+        row_serializer = ValuesRowSerializer.for_class(serializer_class)
+        slow = serializer_class(list(viewset_queryset), many=True).data
+        fast = row_serializer.to_representation(viewset_queryset.values(*row_serializer.lookups))
+        return slow, fast
+
+    def test_same_json_as_model_serializers(self):
+        transactions = Transaction.objects.filter(user=self.user).select_related('category', 'account').order_by('-date', '-id')
+        slow, fast = self.slow_and_fast(transactions, TransactionSerializer)
+        self.assertEqual([dict(row) for row in slow], fast)
+        self.assertNotIn('account_name', fast[0] if fast[0]['account'] is None else fast[1])
+
+        slow, fast = self.slow_and_fast(Account.objects.filter(user=self.user), AccountSerializer)
+        self.assertEqual([dict(row) for row in slow], fast)
+
+    def test_list_endpoints_match_retrieve(self):
+        listed = self.client.get(reverse('transaction-list')).json()['results'][0]
+        self.assertEqual(listed, self.client.get(reverse('transaction-detail', args=[listed['id']])).json())
+        listed = self.client.get(reverse('account-list')).json()['results'][0]
+        self.assertEqual(listed, self.client.get(reverse('account-detail', args=[listed['id']])).json())
+
+    def test_lists_serialize_values_rows(self):
+        """No model instances and no per-row serializer calls; list latency is budgeted by perfbench."""
+        instantiated = set()
+
+        def record(sender, **kwargs):
+            instantiated.add(sender)
+
+        post_init.connect(record)
+        self.addCleanup(post_init.disconnect, record)
+        with mock.patch.object(TransactionSerializer, 'to_representation', side_effect=AssertionError), \
+                mock.patch.object(AccountSerializer, 'to_representation', side_effect=AssertionError):
+            self.assertEqual(len(self.client.get(reverse('transaction-list')).json()['results']), 10)
+            self.assertEqual(len(self.client.get(reverse('account-list')).json()['results']), 1)
+        self.assertFalse(instantiated & {Transaction, Account})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PerformanceBudgetTests(TestCase):
+    """A small-scale `manage.py perfbench` run held to the query budgets in perf_budgets.json.
+
+    Latency budgets are only enforced by the full `perfbench` command, where the
+    data volume and the machine are controlled.
+    """
+
+    def test_query_budgets(self):
+        cache.clear()
+        users = seed(SeedConfig(users=2, accounts=2, categories=12, budget_months=3, transactions=300))
+        results = run_benchmarks(users[0], iterations=3)
+
+        budgets = load_budgets(os.path.join(settings.BASE_DIR, DEFAULT_BUDGET_FILE))
+        query_budgets = {name: {'queries': limits['queries']} for name, limits in budgets.items()}
+        self.assertEqual(set(results), set(budgets))
+        self.assertEqual(check_budgets(results, query_budgets), [])
+
+
+@override_settings(REQUEST_METRICS=True)
+class RequestMetricsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        timings = dict(part.split(';', 1) for part in response['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'db', 'render', 'app', 'total'})
+        self.assertRegex(timings['db'], r'^dur=[\d.]+;desc="[1-9]\d* queries"$')
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('account-list'))
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE tracker_request_duration_seconds histogram', body)
+        self.assertIn('tracker_request_duration_seconds_count{view="dashboard"} 2', body)
+        self.assertIn('tracker_request_duration_seconds_bucket{view="dashboard",le="+Inf"} 2', body)
+        self.assertIn('tracker_request_db_queries_count{view="account-list"} 1', body)
+        self.assertIn('tracker_request_render_duration_seconds_count{view="metrics"} 1', body)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AdminDashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='root', email='root@example.com', password='pass12345')
+        self.client.force_login(self.admin)
+        self.alice, self.bob = make_user('alice'), make_user('bob')
+
+    def add(self, user, currency, transaction_type, amount, day):
+        account, _ = Account.objects.get_or_create(
+            user=user, name=f'Main {currency}', defaults={'account_type': 'bank', 'currency': currency})
+        category, _ = Category.objects.get_or_create(user=user, name='Food', category_type=transaction_type)
+        Transaction.objects.create(
+            user=user, account=account, category=category,
+            transaction_type=transaction_type, amount=Decimal(amount), date=day,
+        )
+
+    def test_totals_and_aligned_series(self):
+        self.add(self.alice, 'KES', 'income', '1000.00', date(2025, 1, 10))
+        self.add(self.alice, 'KES', 'expense', '200.00', date(2025, 1, 12))
+        self.add(self.alice, 'USD', 'expense', '30.00', date(2025, 2, 3))  # expense-only month
+        self.add(self.bob, 'KES', 'expense', '50.00', date(2025, 4, 1))  # March has nothing
+        self.add(self.bob, 'KES', 'income', '999.00', date(2024, 12, 31))  # outside the range
+
+        ExchangeRate.objects.create(date=date(2025, 1, 1), base='USD', quote='KES', rate=Decimal('130'))
+
+        data = build_admin_dashboard(date(2025, 1, 1), date(2025, 4, 1), base='KES')
+
+        self.assertEqual(data['months'], ['2025-01', '2025-02', '2025-03', '2025-04'])
+        self.assertEqual(data['income_series'], [Decimal('1000.00'), 0, 0, 0])
+        self.assertEqual(data['expense_series'], [Decimal('200.00'), Decimal('3900.00'), 0, Decimal('50.00')])
+        self.assertEqual(
+            [(row['currency'], row['income'], row['expenses'], row['count']) for row in data['currency_totals']],
+            [('KES', Decimal('1000.00'), Decimal('250.00'), 3), ('USD', 0, Decimal('30.00'), 1)],
+        )
+        # Same-named accounts of different users are both listed
+        self.assertEqual(
+            [(row['name'], row['owner']) for row in data['top_accounts']],
+            [('Main KES', 'bob@example.com'), ('Main KES', 'alice@example.com'), ('Main USD', 'alice@example.com')],
+        )
+        self.assertEqual(
+            [(row['currency'], row['account_type'], row['accounts']) for row in data['balance_totals']],
+            [('KES', 'Bank', 2), ('USD', 'Bank', 1)],
+        )
+
+        usd = build_admin_dashboard(date(2025, 1, 1), date(2025, 4, 1), currency='USD')
+        self.assertEqual((usd['income'], usd['expenses']), (0, Decimal('30.00')))
+        self.assertEqual(usd['expense_series'], [0, Decimal('30.00'), 0, 0])
+
+    def test_view_uses_range_and_cache(self):
+        self.add(self.alice, 'KES', 'expense', '200.00', date(2025, 1, 12))
+        url = reverse('custom_admin:dashboard')
+
+        response = self.client.get(url, {'start': '2025-01', 'end': '2025-03'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['months'], ['2025-01', '2025-02', '2025-03'])
+        self.assertContains(response, 'id="dashboard-data"')
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, {'start': '2025-01', 'end': '2025-03'})
+        self.assertFalse([q for q in ctx.captured_queries if 'tracker_monthlyrollup' in q['sql']])
+
+    def test_delete_selected_reverses_balances(self):
+        self.add(self.alice, 'KES', 'expense', '200.00', date(2025, 1, 12))
+        self.add(self.alice, 'KES', 'income', '50.00', date(2025, 1, 13))
+        response = self.client.post(reverse('custom_admin:tracker_transaction_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': list(Transaction.objects.values_list('pk', flat=True)),
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(Account.objects.get(user=self.alice).balance, Decimal('0.00'))
+        self.assertEqual(Tombstone.objects.filter(user=self.alice, kind='transactions').count(), 2)
+
+    def test_invalid_range_falls_back_to_default(self):
+        response = self.client.get(reverse('custom_admin:dashboard'), {'start': '2025-05', 'end': '2025-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(len(response.context['months']), 12)
+
+
+class AccountAdminTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().post('/')
+        self.request.user = User.objects.create_superuser(username='root', email='root@example.com', password='x')
+        self.model_admin = AccountAdmin(Account, custom_admin_site)
+        self.account = Account.objects.create(user=make_user(), name='Bank', account_type='bank',
+                                              balance=Decimal('100.00'), opening_balance=Decimal('100.00'))
+        self.food = Category.objects.create(user=self.account.user, name='Food', category_type='expense')
+
+    def save(self, stale, **changes):
+        form_class = self.model_admin.get_form(self.request, stale, change=True)
+        form = form_class(data={**model_to_dict(stale), **changes}, instance=stale)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.model_admin.save_model(self.request, form.save(commit=False), form, True)
+
+    def test_edits_keep_transactions_applied_meanwhile(self):
+        stale = Account.objects.get(pk=self.account.pk)  # the change form was opened
+        Transaction.objects.create(user=self.account.user, account=self.account, category=self.food,
+                                   transaction_type='expense', amount=Decimal('40.00'), date=date(2025, 1, 1))
+
+        self.save(stale, name='Main bank')
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.name, self.account.balance, self.account.opening_balance),
+                         ('Main bank', Decimal('60.00'), Decimal('100.00')))
+
+        self.save(stale, balance='200.00')  # an adjustment against the balance as it is now
+        self.account.refresh_from_db()
+        self.assertEqual((self.account.balance, self.account.opening_balance), (Decimal('200.00'), Decimal('240.00')))
+
+
+class BudgetReportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.rent = Category.objects.create(user=self.user, name='Rent', category_type='expense')
+
+    def spend(self, category, amount, day, currency='KES'):
+        Transaction.objects.create(
+            user=self.user, category=category, transaction_type='expense',
+            amount=Decimal(amount), currency=currency, date=day,
+        )
+
+    def report(self, **params):
+        response = self.client.get(reverse('budget-report'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_budget_vs_actual_per_month(self):
+        ExchangeRate.objects.create(date=date(2025, 1, 1), base='USD', quote='KES', rate=Decimal('130'))
+        Budget.objects.create(user=self.user, category=self.food, month=date(2025, 1, 1), amount=Decimal('100.00'))
+        Budget.objects.create(user=self.user, category=self.food, month=date(2025, 2, 15), amount=Decimal('300.00'))
+        Budget.objects.create(user=self.user, category=self.rent, month=date(2025, 2, 1), amount=Decimal('500.00'))
+        Budget.objects.create(user=self.user, category=self.food, month=date(2025, 4, 1), amount=Decimal('1.00'))
+        self.spend(self.food, '80.00', date(2025, 1, 31))
+        self.spend(self.food, '40.00', date(2025, 1, 2))
+        self.spend(self.food, '2.00', date(2025, 2, 20), currency='USD')
+        self.spend(self.rent, '999.00', date(2025, 3, 1))  # no budget that month
+
+        data = self.report(**{'from': '2025-01', 'to': '2025-03'})
+        self.assertEqual(
+            [(row['month'], row['category_name'], row['budget'], row['spent'], row['variance'], row['status'])
+             for row in data['rows']],
+            [
+                ('2025-01', 'Food', '100.00', '120.00', '-20.00', 'Exceeded'),
+                ('2025-02', 'Food', '300.00', '260.00', '40.00', 'OK'),
+                ('2025-02', 'Rent', '500.00', '0.00', '500.00', 'OK'),
+            ],
+        )
+        self.assertEqual(data['totals'], {'budget': '900.00', 'spent': '380.00', 'variance': '520.00'})
+        self.assertEqual((data['from'], data['to'], data['currency']), ('2025-01', '2025-03', 'KES'))
+
+    def test_one_query_for_any_span(self):
+        categories = [Category.objects.create(user=self.user, name=f'Cat {i}', category_type='expense') for i in range(5)]
+        for month in range(1, 13):
+            for category in categories:
+                Budget.objects.create(user=self.user, category=category, month=date(2025, month, 1), amount=Decimal('10'))
+                self.spend(category, '1.00', date(2025, month, 3))
+        with self.assertNumQueries(1):
+            data = self.report(**{'from': '2025-01', 'to': '2025-12'})
+        self.assertEqual(len(data['rows']), 60)
+
+    def test_invalid_ranges(self):
+        url = reverse('budget-report')
+        self.assertEqual(self.client.get(url, {'from': '2025-13'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2025-05', 'to': '2025-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2000-01', 'to': '2025-01'}).status_code, 400)
+        self.assertEqual(len(self.report()['rows']), 0)
+
+
+class BulkTransactionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.wallet = Account.objects.create(user=self.user, name='Wallet', account_type='cash')
+        self.bank = Account.objects.create(user=self.user, name='Bank', account_type='bank')
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.fun = Category.objects.create(user=self.user, name='Fun', category_type='expense')
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, account=self.wallet if i % 2 else self.bank, category=self.food,
+                        transaction_type='expense', amount=Decimal('10.00'), currency='KES',
+                        date=date(2025, 1 + i % 3, 10))
+            for i in range(60)
+        ])
+        call_command('rebuild_rollups', stdout=StringIO())
+        Account.objects.update(balance=Decimal('-300.00'))
+
+    def bulk(self, method, payload):
+        return getattr(self.client, method)(reverse('transaction-bulk'), payload, format='json')
+
+    def rebuilt_state(self):
+        """Balances and rollups as recomputed from scratch, to compare with the incremental ones."""
+        def month_end_totals():
+            # Checkpoints may exist for months without transactions; compare what they imply
+            return [
+                AccountBalanceSnapshot.objects.filter(account=account, month__lte=date(2025, month, 1))
+                .order_by('-month').values_list('running_total', flat=True).first()
+                for account in (self.wallet, self.bank) for month in (1, 2, 3)
+            ]
+
+        state = (
+            list(Account.objects.order_by('name').values_list('balance', flat=True)),
+            sorted(MonthlyRollup.objects.filter(count__gt=0).values_list('month', 'category_id', 'total', 'count')),
+            month_end_totals(),
+        )
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertIn('0 drifted', self.reconcile())
+        self.assertEqual(state[1], sorted(MonthlyRollup.objects.values_list('month', 'category_id', 'total', 'count')))
+        self.assertEqual(state[2], month_end_totals())
+        return state
+
+    def reconcile(self):
+        out = StringIO()
+        call_command('reconcile_balances', '--processes', '0', stdout=out)
+        return out.getvalue()
+
+    def test_recategorize_and_move_by_filter(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.bulk('patch', {
+                'filter': {'category': self.food.pk, 'account': self.wallet.pk, 'from': '2025-02-01'},
+                'changes': {'category': self.fun.pk, 'account': self.bank.pk},
+            })
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data, {'updated': 20})
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "tracker_transaction"') for q in ctx.captured_queries), 1)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "tracker_account"') for q in ctx.captured_queries), 1)
+
+        balances, rollups, _ = self.rebuilt_state()
+        self.assertEqual(balances, [Decimal('-500.00'), Decimal('-100.00')])
+        self.assertIn((date(2025, 2, 1), self.fun.pk, Decimal('100.00'), 10), rollups)
+        self.assertEqual(Transaction.objects.filter(category=self.fun, account=self.bank).count(), 20)
+
+    def test_moves_keep_to_the_transactions_currency(self):
+        dollars = Account.objects.create(user=self.user, name='Dollars', account_type='bank', currency='USD')
+        response = self.bulk('patch', {'filter': {'account': self.wallet.pk}, 'changes': {'account': dollars.pk}})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('30 of the selected transactions are not in USD', response.data['non_field_errors'][0])
+        self.assertFalse(dollars.transactions.exists())
+
+        bare = Transaction.objects.filter(account=self.wallet).order_by('pk')[:2]
+        Transaction.objects.filter(pk__in=bare.values('pk')).update(currency=None)
+        MonthlyRollup.objects.rebuild(user=self.user)
+        response = self.bulk('patch', {'ids': list(bare.values_list('pk', flat=True)), 'changes': {'account': dollars.pk}})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(dollars.transactions.values_list('currency', flat=True)), {'USD'})
+        self.assertEqual(
+            sorted(MonthlyRollup.objects.filter(count__gt=0).values_list('currency', flat=True).distinct()), ['KES', 'USD'])
+        self.rebuilt_state()
+
+    def test_single_move_keeps_to_the_transactions_currency(self):
+        dollars = Account.objects.create(user=self.user, name='Dollars', account_type='bank', currency='USD')
+        txn = Transaction.objects.filter(account=self.wallet).first()
+        url = reverse('transaction-detail', args=[txn.pk])
+
+        response = self.client.patch(url, {'account': dollars.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['currency'], ['Must match the currency of the account (USD).'])
+        response = self.client.patch(url, {'currency': 'USD'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(dollars.transactions.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {'account': dollars.pk, 'currency': 'USD'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(dollars.transactions.get().currency, 'USD')
+        self.rebuilt_state()
+
+    def test_delete_by_ids_only_touches_own_rows(self):
+        other = make_user('bob')
+        other_category = Category.objects.create(user=other, name='Food', category_type='expense')
+        foreign = Transaction.objects.create(user=other, category=other_category, transaction_type='expense',
+                                             amount=Decimal('1.00'), date=date(2025, 1, 1))
+        ids = list(Transaction.objects.filter(user=self.user, account=self.wallet).values_list('id', flat=True)[:5])
+
+        response = self.bulk('delete', {'ids': ids + [foreign.pk]})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data, {'deleted': 5})
+        self.assertTrue(Transaction.objects.filter(pk=foreign.pk).exists())
+        balances, _, _ = self.rebuilt_state()
+        self.assertEqual(balances, [Decimal('-300.00'), Decimal('-250.00')])
+
+    def test_invalid_requests(self):
+        foreign_category = Category.objects.create(user=make_user('bob'), name='Food', category_type='expense')
+        for method, payload in (
+            ('delete', {}),
+            ('delete', {'filter': {}}),
+            ('delete', {'ids': [1], 'filter': {'category': self.food.pk}}),
+            ('patch', {'ids': [1]}),
+            ('patch', {'ids': [1], 'changes': {}}),
+            ('patch', {'ids': [1], 'changes': {'category': foreign_category.pk}}),
+        ):
+            self.assertEqual(self.bulk(method, payload).status_code, 400, payload)
+        with mock.patch('tracker.bulk.MAX_BULK_ROWS', 10):
+            response = self.bulk('delete', {'filter': {'category': self.food.pk}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Transaction.objects.count(), 60)
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Main', account_type='bank')
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.rent = Category.objects.create(user=self.user, name='Rent', category_type='expense')
+        self.lunch = self.add('12.00', 'Lunch')
+
+    def add(self, amount, description=''):
+        return Transaction.objects.create(user=self.user, account=self.account, category=self.food,
+                                          transaction_type='expense', amount=Decimal(amount),
+                                          description=description, date=date(2025, 5, 1))
+
+    def sync(self, since=None):
+        response = self.client.get(reverse('sync'), {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def later(self, data):
+        """Sync `data`'s token from after the overlap window, so only newer changes are returned."""
+        moment, _ = sync_module.parse_token(data['token'])
+        return sync_module.make_token(moment + sync_module.SYNC_OVERLAP)
+
+    def test_first_then_delta_sync(self):
+        make_user('bob')
+        first = self.sync()
+        self.assertFalse(first['has_more'])
+        self.assertEqual([row['description'] for row in first['changes']['transactions']], ['Lunch'])
+        self.assertEqual({row['name'] for row in first['changes']['categories']}, {'Food', 'Rent'})
+        self.assertEqual(first['changes']['transactions'][0],
+                         self.client.get(reverse('transaction-detail', args=[self.lunch.pk])).json())
+        self.assertEqual(first['deleted']['transactions'], [])
+
+        with mock.patch.object(sync_module, 'SYNC_OVERLAP', timedelta(0)):
+            with self.assertNumQueries(len(sync_module.SYNCED) + 1):  # one index range per kind and the tombstones
+                idle = sync_module.sync(self.user, first['token'])
+            self.assertFalse(any(idle['changes'].values()) or any(idle['deleted'].values()))
+
+            dinner = self.add('30.00', 'Dinner')
+            bulk_delete = self.client.delete(reverse('transaction-bulk'), {'ids': [self.lunch.pk]}, format='json')
+            self.assertEqual(bulk_delete.status_code, 200)
+            rent_id = self.rent.pk
+            self.rent.delete()
+            goal = Goal.objects.create(user=self.user, name='Car', target_amount=Decimal('100.00'))
+            second = self.sync(first['token'])
+
+        self.assertEqual([row['id'] for row in second['changes']['transactions']], [dinner.pk])
+        # Rows changed several times come once, as they are now
+        self.assertEqual([row['balance'] for row in second['changes']['accounts']], ['-30.00'])
+        self.assertEqual(second['changes']['goals'][0]['progress'], 0.0)
+        self.assertEqual(second['deleted']['transactions'], [self.lunch.pk])
+        self.assertEqual(second['deleted']['categories'], [rent_id])
+        # The overlap window repeats recent changes; clients upsert them by id
+        self.assertIn(goal.pk, [row['id'] for row in self.sync(second['token'])['changes']['goals']])
+
+    def test_cascaded_deletes_and_unlinks_are_synced(self):
+        goal = Goal.objects.create(user=self.user, name='Car', target_amount=Decimal('100.00'))
+        Transaction.objects.filter(pk=self.lunch.pk).update(goal=goal)
+        token = sync_module.make_token(now())
+        goal_id, account_id = goal.pk, self.account.pk
+        with mock.patch.object(sync_module, 'SYNC_OVERLAP', timedelta(0)):
+            goal.delete()
+            data = self.sync(token)
+            self.assertEqual(data['deleted']['goals'], [goal_id])
+            self.assertEqual([(row['id'], row['goal']) for row in data['changes']['transactions']], [(self.lunch.pk, None)])
+
+            self.account.delete()
+            data = self.sync(token)
+        self.assertEqual(data['deleted']['accounts'], [account_id])
+        self.assertEqual(data['deleted']['transactions'], [self.lunch.pk])
+
+        self.user.delete()
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_large_windows_are_paged(self):
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, category=self.food, transaction_type='expense', amount=Decimal('1.00'),
+                        date=date(2025, 5, 1)) for _ in range(7)
+        ])
+        Transaction.objects.update(updated_at=now())  # all with the same timestamp
+        self.add('2.00')
+        seen, token = [], None
+        with mock.patch.object(sync_module, 'MAX_SYNC_ROWS', 3):
+            for _ in range(5):
+                data = self.sync(token)
+                seen += [row['id'] for row in data['changes']['transactions']]
+                token = data['token']
+                if not data['has_more']:
+                    break
+        self.assertFalse(data['has_more'])
+        self.assertEqual(sorted(set(seen)), sorted(Transaction.objects.values_list('id', flat=True)))
+
+    def test_invalid_token(self):
+        response = self.client.get(reverse('sync'), {'since': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+class GoalContributionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Main', account_type='bank')
+        self.savings = Category.objects.create(user=self.user, name='Savings', category_type='expense')
+        self.car = Goal.objects.create(user=self.user, name='Car', target_amount=Decimal('1000.00'),
+                                       current_amount=Decimal('100.00'))
+        self.house = Goal.objects.create(user=self.user, name='House', target_amount=Decimal('500.00'))
+
+    def amounts(self):
+        return tuple(Goal.objects.order_by('name').values_list('current_amount', flat=True))
+
+    def test_linked_transactions_fund_goals(self):
+        response = self.client.post(reverse('transaction-list'), {
+            'transaction_type': 'expense', 'amount': '50.00', 'category': self.savings.pk,
+            'account': self.account.pk, 'goal': self.car.pk, 'date': '2025-05-01',
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['goal'], self.car.pk)
+        self.assertEqual(self.amounts(), (Decimal('150.00'), Decimal('0.00')))
+
+        txn = Transaction.objects.get(pk=response.data['id'])
+        txn.goal = self.house
+        txn.amount = Decimal('80.00')
+        txn.save()
+        self.assertEqual(self.amounts(), (Decimal('100.00'), Decimal('80.00')))
+        txn.delete()
+        self.assertEqual(self.amounts(), (Decimal('100.00'), Decimal('0.00')))
+
+        other_goal = Goal.objects.create(user=make_user('bob'), name='Bike', target_amount=Decimal('10.00'))
+        response = self.client.post(reverse('transaction-list'), {
+            'transaction_type': 'expense', 'amount': '5.00', 'category': self.savings.pk,
+            'goal': other_goal.pk, 'date': '2025-05-01',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_progress_is_computed_in_the_query(self):
+        Goal.objects.create(user=self.user, name='Trip', target_amount=Decimal('10.00'), current_amount=Decimal('25.00'))
+        Goal.objects.create(user=self.user, name='Someday', target_amount=Decimal('0.00'))
+        with mock.patch.object(Goal, 'progress', side_effect=AssertionError('computed in Python')):
+            data = self.client.get(reverse('goal-list')).json()['results']
+            dashboard = self.client.get(reverse('dashboard')).json()
+        expected = {'Car': 10.0, 'House': 0.0, 'Trip': 100.0, 'Someday': 0.0}
+        self.assertEqual({goal['name']: goal['progress'] for goal in data}, expected)
+        self.assertEqual({goal['name']: goal['progress'] for goal in dashboard['goals']}, expected)
+
+        response = self.client.patch(reverse('goal-detail', args=[self.car.pk]), {'target_amount': '200.00'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['progress'], 50.0)
+
+class RecurringTransactionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.account = Account.objects.create(user=self.user, name='Main', account_type='bank', currency='KES')
+        self.rent = Category.objects.create(user=self.user, name='Rent', category_type='expense')
+
+    def schedule(self, **fields):
+        fields = {
+            'user': self.user, 'account': self.account, 'category': self.rent, 'transaction_type': 'expense',
+            'amount': Decimal('100.00'), 'frequency': 'monthly', 'start_date': date(2025, 1, 31), **fields,
+        }
+        fields.setdefault('next_date', fields['start_date'])
+        return RecurringTransaction.objects.create(**fields)
+
+    def test_generates_missed_occurrences_once(self):
+        rent = self.schedule(description='Rent')
+        salary_category = Category.objects.create(user=self.user, name='Salary', category_type='income')
+        salary = self.schedule(category=salary_category, transaction_type='income', amount=Decimal('1000.00'),
+                               frequency='weekly', interval=2, start_date=date(2025, 3, 3))
+        other = make_user('bob')
+        other_account = Account.objects.create(user=other, name='Bob', account_type='cash', currency='USD')
+        other_category = Category.objects.create(user=other, name='Food', category_type='expense')
+        self.schedule(user=other, account=other_account, category=other_category, frequency='daily',
+                      amount=Decimal('5.00'), start_date=date(2025, 3, 30))
+
+        self.assertEqual(run_recurring(date(2025, 3, 31)), {'schedules': 3, 'created': 8})
+        self.assertEqual(
+            list(rent.occurrences.order_by('date').values_list('date', 'description', 'currency')),
+            [(date(2025, 1, 31), 'Rent', 'KES'), (date(2025, 2, 28), 'Rent', 'KES'), (date(2025, 3, 31), 'Rent', 'KES')],
+        )
+        self.assertEqual(list(salary.occurrences.values_list('date', flat=True).order_by('date')),
+                         [date(2025, 3, 3), date(2025, 3, 17), date(2025, 3, 31)])
+        self.account.refresh_from_db()
+        other_account.refresh_from_db()
+        self.assertEqual((self.account.balance, other_account.balance), (Decimal('2700.00'), Decimal('-10.00')))
+        rent.refresh_from_db()
+        self.assertEqual(rent.next_date, date(2025, 4, 30))
+
+        # Reruns, even from the start of the schedule, never duplicate
+        self.assertEqual(run_recurring(date(2025, 3, 31)), {'schedules': 0, 'created': 0})
+        RecurringTransaction.objects.update(next_date=F('start_date'))
+        self.assertEqual(run_recurring(date(2025, 3, 31))['created'], 0)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('2700.00'))
+        self.assertEqual(Transaction.objects.count(), 8)
+        self.assertEqual(
+            MonthlyRollup.objects.get(user=self.user, category=self.rent, month=date(2025, 2, 1)).count, 1)
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(
+            MonthlyRollup.objects.get(user=self.user, category=self.rent, month=date(2025, 2, 1)).count, 1)
+
+    def test_one_balance_update_per_batch(self):
+        for day in range(1, 21):
+            self.schedule(frequency='daily', start_date=date(2025, 3, day))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(run_recurring(date(2025, 3, 31), batch_size=50)['created'], sum(range(12, 32)))
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "tracker_account"')]
+        self.assertEqual(len(updates), 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('-100.00') * sum(range(12, 32)))
+
+    def test_end_date_finishes_schedule(self):
+        schedule = self.schedule(frequency='yearly', start_date=date(2024, 2, 29), end_date=date(2026, 3, 1))
+        out = StringIO()
+        call_command('run_recurring', '--date', '2030-01-01', stdout=out)
+        self.assertIn('Created 3 transactions', out.getvalue())
+        self.assertEqual(list(schedule.occurrences.values_list('date', flat=True).order_by('date')),
+                         [date(2024, 2, 29), date(2025, 2, 28), date(2026, 2, 28)])
+        schedule.refresh_from_db()
+        self.assertFalse(schedule.active)
+
+    def test_api(self):
+        url = reverse('recurring-list')
+        payload = {'transaction_type': 'expense', 'amount': '50.00', 'category': self.rent.pk,
+                   'account': self.account.pk, 'frequency': 'monthly', 'start_date': '2025-01-15'}
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['next_date'], '2025-01-15')
+        run_recurring(date(2025, 2, 20))
+
+        # Changing the timing resumes after the occurrences already generated
+        response = self.client.patch(reverse('recurring-detail', args=[response.data['id']]), {'frequency': 'weekly'},
+                                     format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['next_date'], '2025-02-19')
+
+        other_category = Category.objects.create(user=make_user('bob'), name='Food', category_type='expense')
+        for invalid in ({'category': other_category.pk}, {'interval': 0}, {'end_date': '2024-12-31'}):
+            response = self.client.post(url, {**payload, **invalid}, format='json')
+            self.assertEqual(response.status_code, 400, invalid)
+
+class ExchangeRateTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        self.salary = Category.objects.create(user=self.user, name='Salary', category_type='income')
+        self.today = now().date()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.rates_path = os.path.join(tmpdir.name, 'rates.csv')
+
+    def add(self, category, amount, currency, day):
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, category=category, transaction_type=category.category_type,
+                amount=Decimal(amount), currency=currency, date=day,
+            )
+
+    def load(self, text):
+        with open(self.rates_path, 'w') as fh:
+            fh.write(text)
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('load_exchange_rates', self.rates_path, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_load_command_upserts_and_reports_bad_rows(self):
+        out, err = self.load(
+            'date,base,quote,rate\n'
+            '2025-01-01,USD,KES,129.5\n'
+            '2025-01-01,usd,kes,130\n'
+            '2025-01-02,USD,XXX,1\n'
+            '2025-01-03,EUR,KES,-1\n'
+        )
+        self.assertIn('Loaded 2 exchange rates.', out)
+        self.assertIn('Line 4: Unsupported currency.', err)
+        self.assertIn('Line 5: Rate must be positive.', err)
+        self.assertEqual(ExchangeRate.objects.get().rate, Decimal('130'))
+
+    def test_dashboard_totals_in_base_currency(self):
+        ExchangeRate.objects.create(date=date(2025, 1, 1), base='USD', quote='KES', rate=Decimal('125'))
+        ExchangeRate.objects.create(date=date(2025, 2, 10), base='USD', quote='KES', rate=Decimal('130'))
+        ExchangeRate.objects.create(date=date(2025, 1, 1), base='KES', quote='EUR', rate=Decimal('0.005'))
+        self.add(self.salary, '1000.00', 'KES', date(2025, 1, 5))
+        self.add(self.food, '10.00', 'USD', date(2025, 1, 20))  # January rate: 1250 KES
+        self.add(self.food, '10.00', 'USD', date(2025, 2, 1))  # latest February rate: 1300 KES
+        self.add(self.food, '2.00', 'EUR', date(2025, 2, 3))  # inverse of KES/EUR: 400 KES
+        self.add(self.food, '5.00', 'GBP', date(2025, 2, 4))  # no rate
+
+        data = self.client.get(reverse('dashboard')).json()
+
+        self.assertEqual(data['base_currency'], 'KES')
+        self.assertEqual(data['missing_rates'], ['GBP'])
+        self.assertEqual(
+            [(row['month'], row['income'], row['expenses']) for row in data['monthly_history']],
+            [('2025-01', '1000.00', '1250.00'), ('2025-02', '0.00', '1700.00')],
+        )
+        self.assertEqual(data['all_time_summary']['total_expenses'], '2950.00')
+
+    def test_changing_rates_or_base_currency_invalidates_dashboard(self):
+        self.add(self.food, '10.00', 'USD', self.today)
+        etag = self.client.get(reverse('dashboard'))['ETag']
+        self.assertEqual(self.client.get(reverse('dashboard'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.load(f'date,base,quote,rate\n{self.today.replace(day=1)},USD,KES,130\n')
+        response = self.client.get(reverse('dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['current_month_summary']['expenses'], '1300.00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('profile'), {'base_currency': 'USD'}, format='json')
+        self.assertEqual(response.json()['base_currency'], 'USD')
+        data = self.client.get(reverse('dashboard')).json()
+        self.assertEqual((data['base_currency'], data['current_month_summary']['expenses']), ('USD', '10.00'))
+
+
+class JobQueueTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        for amount in ('10.00', '20.00'):
+            Transaction.objects.create(
+                user=self.user, category=food, transaction_type='expense',
+                amount=Decimal(amount), date=date(2025, 1, 5),
+            )
+
+    def run_worker(self):
+        out = StringIO()
+        call_command('runworker', '--once', '--processes', '0', stdout=out)
+        return out.getvalue()
+
+    def test_enqueue_run_poll_and_download(self):
+        response = self.client.post(reverse('job-list'), {'kind': 'export_transactions', 'params': {'format': 'csv'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], Job.QUEUED)
+        job_url = response['Location']
+
+        self.assertIn(f"Job {response.data['id']} succeeded.", self.run_worker())
+        job = self.client.get(job_url).data
+        self.assertEqual((job['status'], job['progress'], job['has_file']), (Job.SUCCEEDED, 100, True))
+        self.assertEqual(job['result'], {'rows': 2, 'format': 'csv'})
+
+        download = self.client.get(reverse('job-download', args=[job['id']]))
+        self.assertEqual(download['Content-Type'], 'text/csv')
+        lines = b''.join(download.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,date,transaction_type,amount,currency,category,account,description')
+        self.assertEqual(len(lines), 3)
+
+    def test_invalid_jobs_are_rejected_and_jobs_are_private(self):
+        response = self.client.post(reverse('job-list'), {'kind': 'export_transactions', 'params': {'format': 'xml'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(reverse('job-list'), {'kind': 'mine_bitcoin'}, format='json').status_code, 400)
+
+        other = enqueue(make_user('bob'), 'rebuild_rollups')
+        self.assertEqual(self.client.get(reverse('job-detail', args=[other.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('job-list')).data['count'], 0)
+
+    def test_claims_are_exclusive_and_stale_jobs_are_retried(self):
+        first, second = enqueue(self.user, 'rebuild_rollups'), enqueue(self.user, 'rebuild_rollups')
+        self.assertEqual(claim_jobs(1, 'a'), [first.pk])
+        self.assertEqual(claim_jobs(5, 'b'), [second.pk])
+        self.assertEqual(claim_jobs(5, 'c'), [])
+
+        Job.objects.filter(pk=first.pk).update(heartbeat_at=now() - timedelta(hours=2))
+        Job.objects.filter(pk=second.pk).update(heartbeat_at=now() - timedelta(hours=2), attempts=3)
+        self.assertEqual(requeue_stale(), (1, 1))
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=second.pk).status, Job.FAILED)
+
+    def test_long_running_jobs_that_report_progress_are_not_requeued(self):
+        enqueue(self.user, 'export_transactions')
+        job = Job.objects.get(pk=claim_jobs(1, 'a')[0])
+        started = now() - timedelta(hours=3)
+        Job.objects.filter(pk=job.pk).update(started_at=started, heartbeat_at=started)
+        job.refresh_from_db()
+
+        set_progress(job, 40)
+        self.assertEqual(requeue_stale(), (0, 0))
+        with self.assertNumQueries(0):
+            set_progress(job, 40)
+        job.heartbeat_at = started  # much later: no progress, but the heartbeat is due
+        with self.assertNumQueries(1):
+            set_progress(job, 40)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.started_at), (Job.RUNNING, 40, started))
+
+        # The worker's own heartbeat covers jobs that do not report progress
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=started)
+        self.assertEqual(heartbeat([job.pk]), 1)
+        self.assertEqual(requeue_stale(), (0, 0))
+
+    def test_failures_are_recorded(self):
+        job = enqueue(self.user, 'rebuild_rollups')
+        with mock.patch.dict('tracker.jobs.HANDLERS', rebuild_rollups=mock.Mock(side_effect=RuntimeError('boom'))):
+            self.assertIn(f'Job {job.pk} failed.', self.run_worker())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertIsNotNone(job.finished_at)
+
+
+    def test_outcome_of_a_requeued_job_is_discarded(self):
+        job = enqueue(self.user, 'export_transactions')
+        claim_jobs(1, 'a')
+        export_transactions = HANDLERS['export_transactions']
+
+        def taken_over(job):
+            # The heartbeat stopped: another worker recovered and claimed the job meanwhile
+            Job.objects.filter(pk=job.pk).update(heartbeat_at=now() - timedelta(hours=1))
+            requeue_stale()
+            claim_jobs(1, 'b')
+            return export_transactions(job)
+
+        with mock.patch.dict(HANDLERS, export_transactions=taken_over):
+            self.assertIsNone(execute(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts, job.result_file.name), (Job.RUNNING, 'b', 2, ''))
+
+    def test_inline_worker_heartbeats_jobs_without_progress(self):
+        job = enqueue(self.user, 'rebuild_rollups')
+        beaten = threading.Event()
+
+        def slow_job(job):
+            self.assertTrue(beaten.wait(5))
+            return {}
+
+        with mock.patch('tracker.jobs.HEARTBEAT_EVERY', timedelta(milliseconds=10)), \
+                mock.patch('tracker.jobs.heartbeat', side_effect=lambda ids: beaten.set()) as beat, \
+                mock.patch.dict('tracker.jobs.HANDLERS', rebuild_rollups=slow_job):
+            self.assertIn(f'Job {job.pk} succeeded.', self.run_worker())
+        beat.assert_called_with([job.pk])
+
+    def test_broken_process_pool_is_replaced(self):
+        class InlinePool:
+            def __init__(self, broken=False):
+                self.broken = broken
+
+            def submit(self, fn, *args):
+                if self.broken:
+                    raise BrokenProcessPool('A process in the process pool was terminated abruptly.')
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                pass
+
+        jobs = [enqueue(self.user, 'rebuild_rollups') for _ in range(2)]
+        out, err = StringIO(), StringIO()
+        pools = [InlinePool(broken=True), InlinePool()]
+        with mock.patch.object(RunWorkerCommand, 'start_pool', side_effect=pools):
+            call_command('runworker', '--once', '--processes', '2', stdout=out, stderr=err)
+        self.assertIn('Process pool broken; starting a new one.', err.getvalue())
+        for job in jobs:
+            self.assertIn(f'Job {job.pk} succeeded.', out.getvalue())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AsyncDashboardTests(TransactionTestCase):
+    """The section queries run on pool threads with their own connections,
+    which only see committed data, hence TransactionTestCase."""
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        account = Account.objects.create(user=self.user, name='Wallet', account_type='cash')
+        food = Category.objects.create(user=self.user, name='Food', category_type='expense')
+        Budget.objects.create(user=self.user, category=food, month=now().date().replace(day=1), amount=Decimal('50'))
+        Goal.objects.create(user=self.user, name='Car', target_amount=Decimal('1000.00'))
+        for amount in ('12.50', '40.00'):
+            Transaction.objects.create(
+                user=self.user, account=account, category=food,
+                transaction_type='expense', amount=Decimal(amount), date=now().date(),
+            )
+
+    def test_same_payload_as_sync_view(self):
+        threads = set()
+        original = dashboard_module.run_section
+
+        def run_section(section, *args):
+            threads.add(threading.current_thread().name)
+            return original(section, *args)
+
+        with mock.patch.object(dashboard_module, 'run_section', run_section):
+            response = self.client.get(reverse('dashboard-async'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith('dashboard') for name in threads))
+
+        cache.clear()
+        sync_response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.json(), sync_response.json())
+        self.assertEqual(response.json()['category_summary'][0]['status'], 'Exceeded')
+
+        # Both views share the cache and ETags
+        response = self.client.get(reverse('dashboard-async'), HTTP_IF_NONE_MATCH=sync_response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_requires_authentication(self):
+        response = APIClient().get(reverse('dashboard-async'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('detail', response.json())
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        for name, value in (('replica_configured', True), ('primary_in_transaction', False)):
+            patcher = mock.patch(f'tracker.routers.{name}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_reads_and_writes(self):
+        self.assertIsNone(self.router.db_for_read(Transaction))
+        with replica_reads(user_id=1) as state:
+            self.assertEqual(self.router.db_for_read(Transaction), REPLICA_ALIAS)
+            self.assertIsNone(self.router.db_for_write(Transaction))
+            # Read-after-write stays on the primary
+            self.assertIsNone(self.router.db_for_read(Transaction))
+        self.assertTrue(state.wrote)
+        self.assertIsNone(self.router.db_for_read(Transaction))
+
+        # The writer is pinned to the primary for a while
+        self.assertIsNotNone(cache.get(pin_key(1)))
+        with replica_reads(user_id=1):
+            self.assertIsNone(self.router.db_for_read(Transaction))
+        with replica_reads(user_id=2):
+            self.assertEqual(self.router.db_for_read(Transaction), REPLICA_ALIAS)
+
+    def test_disabled_or_inside_a_primary_transaction(self):
+        with replica_reads(user_id=1, enabled=False) as state:
+            self.assertIsNone(self.router.db_for_read(Transaction))
+        with replica_reads(user_id=1), mock.patch('tracker.routers.primary_in_transaction', return_value=True):
+            self.assertIsNone(self.router.db_for_read(Transaction))
+        self.assertFalse(state.wrote)
+        self.assertIsNone(cache.get(pin_key(1)))
+
+    def test_pins_need_a_shared_cache(self):
+        with override_settings(TESTING=False):
+            self.assertEqual([warning.id for warning in check_pin_cache()], ['tracker.W001'])
+            with tempfile.TemporaryDirectory() as location:
+                backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+                with self.settings(CACHES={'default': backend}):
+                    self.assertEqual(check_pin_cache(), [])
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_views_route_safe_methods(self):
+        user = make_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        original = ReplicaRouter.db_for_read
+        decisions = []
+
+        def record(router, model, **hints):
+            decisions.append(original(router, model, **hints))
+            return None  # keep reading from the test database
+
+        def routed(method, url, data=None):
+            decisions.clear()
+            with mock.patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=record):
+                response = getattr(client, method)(url, data, format='json')
+            self.assertLess(response.status_code, 400)
+            return REPLICA_ALIAS in decisions
+
+        self.assertTrue(routed('get', reverse('transaction-list')))
+        self.assertTrue(routed('get', reverse('dashboard')))
+        self.assertFalse(routed('post', reverse('category-list'), {'name': 'Food', 'category_type': 'expense'}))
+        # The writer's next reads stay on the primary
+        self.assertFalse(routed('get', reverse('category-list')))
+
+
+@skipIf(not replica_configured(), 'needs DATABASE_REPLICA_URL')
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ReplicaDatabaseTests(TransactionTestCase):
+    """End to end against a real replica alias, e.g. with two SQLite files:
+
+    DATABASE_URL=sqlite:///primary.sqlite3 DATABASE_REPLICA_URL=sqlite:///replica.sqlite3 python manage.py test
+    """
+    databases = '__all__'
+
+    def test_list_reads_from_replica(self):
+        cache.clear()
+        user = make_user()
+        Category.objects.create(user=user, name='Food', category_type='expense')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica, \
+                CaptureQueriesContext(connection) as primary:
+            response = client.get(reverse('category-list'))
+        self.assertEqual(response.json()['count'], 1)
+        self.assertTrue(any('tracker_category' in q['sql'] for q in replica.captured_queries))
+        self.assertFalse(any('tracker_category' in q['sql'] for q in primary.captured_queries))
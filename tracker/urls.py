@@ -1,18 +1,26 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RegisterView, AccountViewSet, CategoryViewSet, TransactionViewSet, BudgetViewSet
-from .views import DashboardView
+from .views import RegisterView, AccountViewSet, CategoryViewSet, TransactionViewSet, BudgetViewSet, GoalViewSet
+from .views import JobViewSet, RecurringTransactionViewSet
+from .views import DashboardView, MetricsView, ProfileView, SyncView, dashboard_async_view
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 router = DefaultRouter()
 router.register(r'accounts', AccountViewSet, basename='account')
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
+router.register(r'recurring', RecurringTransactionViewSet, basename='recurring')
 router.register(r'budgets', BudgetViewSet, basename='budget')
+router.register(r'goals', GoalViewSet, basename='goal')
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
+    path('profile/', ProfileView.as_view(), name='profile'),
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('dashboard/async/', dashboard_async_view, name='dashboard-async'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('login/', TokenObtainPairView.as_view(), name='login'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('', include(router.urls)),
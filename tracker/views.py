@@ -1,194 +1,398 @@
 from django.shortcuts import render
 
 # Create your views here.
-from rest_framework import generics, viewsets, permissions
-from .models import User, Account, Category, Transaction, Budget, Goal
+from rest_framework import generics, mixins, viewsets, permissions, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.reverse import reverse
+from rest_framework import exceptions
+from rest_framework.exceptions import ValidationError
+from contextlib import ExitStack
+from datetime import date
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET
+from django.utils.http import parse_etags, quote_etag
+from django.utils.timezone import now
+from .models import User, Account, Category, Transaction, Budget, Goal, Job, RecurringTransaction
 from .serializers import UserSerializer, AccountSerializer, CategorySerializer, TransactionSerializer
-from .serializers import BudgetSerializer, DashboardSerializer, GoalSerializer
+from .serializers import BalanceHistoryParamsSerializer, BalancePointSerializer
+from .serializers import BudgetReportParamsSerializer, BudgetReportRowSerializer, BudgetReportTotalsSerializer
+from .serializers import BudgetSerializer, BulkSelectionSerializer, BulkUpdateSerializer, DashboardSerializer
+from .serializers import GoalSerializer, JobSerializer, ProfileSerializer, RecurringTransactionSerializer
+from .serializers import SyncParamsSerializer, ValuesRowSerializer
+from .cache import bump_dashboard_version, dashboard_version, get_dashboard, set_dashboard
+from .balances import balance_history
+from .bulk import CurrencyMismatch, SelectionTooLarge, bulk_delete, bulk_update, select_transactions
+from .dashboard import build_dashboard, build_dashboard_async
+from .exports import CONTENT_TYPES, stream_transactions
+from .metrics import render_metrics
+from .importers import TransactionImporter, UndecodableLine, detect_format, iter_csv_rows, iter_ndjson_rows
+from .pagination import TransactionPagination
+from .routers import replica_reads
+from .reports import budget_report
+from .search import search_transactions
+from .sync import sync
 from rest_framework.permissions import AllowAny
-from django.db.models import Sum 
-from django.db.models.functions import TruncMonth
-from django.utils.timezone import now
 from rest_framework.views import APIView
+from rest_framework.request import Request
 from rest_framework.response import Response 
+from rest_framework.settings import api_settings
+
+READ_ACTIONS = ('list', 'retrieve')
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
  
-class AccountViewSet(viewsets.ModelViewSet):
+class ReplicaReadMixin:
+    """Serve the GET/HEAD requests of a view from the read replica, if configured.
+
+    Routing starts once the request is authenticated and lasts until the
+    response is finalized; writing requests only record that the user must
+    read from the primary for a while (see tracker.routers).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.replica_routing = ExitStack()
+        self.replica_routing.enter_context(replica_reads(
+            user_id=request.user.pk, enabled=request.method in ('GET', 'HEAD')))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        routing = getattr(self, 'replica_routing', None)
+        if routing is not None:
+            routing.close()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class ProfileView(generics.RetrieveUpdateAPIView):
+    """The current user's profile, including the base currency of their dashboard."""
+    serializer_class = ProfileSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_object(self):
+        return self.request.user
+
+    def perform_update(self, serializer):
+        base_currency = serializer.instance.base_currency
+        user = serializer.save()
+        if user.base_currency != base_currency:
+            bump_dashboard_version(user.pk)
+
+class FastListMixin:
+    """Serve list actions from `.values()` rows through a ValuesRowSerializer.
+
+    Produces the same JSON as the viewset's serializer without building model
+    instances or running a serializer per row.
+    """
+
+    def list(self, request, *args, **kwargs):
+        row_serializer = ValuesRowSerializer.for_class(self.get_serializer_class())
+        queryset = self.filter_queryset(self.get_queryset()).values(*row_serializer.lookups)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(row_serializer.to_representation(page))
+        return Response(row_serializer.to_representation(queryset))
+
+class AccountViewSet(ReplicaReadMixin, FastListMixin, viewsets.ModelViewSet):
     serializer_class = AccountSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         #Only return accounts that belong to the logged-in user
-        return Account.objects.filter(user=self.request.user)
+        queryset = Account.objects.filter(user=self.request.user)
+        if self.action in READ_ACTIONS:
+            queryset = queryset.only('id', 'name', 'balance', 'created_at', 'updated_at')
+        return queryset
 
     def perform_create(self, serializer):
         #Attach the logged-in user automatically
         serializer.save(user=self.request.user)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], url_path='balance-history')
+    def balance_history(self, request, pk=None):
+        """The account's balance at the end of each ?interval=day|week|month from ?from= to ?to=."""
+        params = BalanceHistoryParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        account = self.get_object()
+        start, end, interval = params.validated_data['from'], params.validated_data['to'], params.validated_data['interval']
+        points = balance_history(account, start, end, interval)
+        return Response({
+            'account': account.pk,
+            'currency': account.currency,
+            'from': start,
+            'to': end,
+            'interval': interval,
+            'points': BalancePointSerializer(points, many=True).data,
+        })
+
+class CategoryViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Category.objects.filter(user=self.request.user)
+        return Category.objects.filter(user=self.request.user).order_by('name', 'id')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ReplicaReadMixin, FastListMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionPagination
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user).order_by('-date')
+        queryset = Transaction.objects.select_related('category', 'account').order_by('-date', '-id')
+        if self.action == 'list' and self.request.query_params.get('q'):
+            # Full-text search, best matches first (?pagination=cursor keeps date order);
+            # search_transactions() limits it to the user itself
+            queryset = search_transactions(queryset, self.request.query_params['q'], user=self.request.user)
+            queryset = queryset.order_by('-search_rank', '-date', '-id')
+        else:
+            queryset = queryset.filter(user=self.request.user)
+        if self.action in READ_ACTIONS:
+            # Just the columns TransactionSerializer renders
+            queryset = queryset.only(
+                'id', 'transaction_type', 'amount', 'currency', 'description', 'date', 'created_at',
+                'category__id', 'category__name', 'account__id', 'account__name', 'goal_id',
+            )
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class BudgetViewSet(viewsets.ModelViewSet):
+    def perform_content_negotiation(self, request, force=False):
+        # export uses ?format= to pick the file type, not a DRF renderer
+        if self.action == 'export':
+            renderer = JSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the user's transactions as ?format=csv|ndjson, optionally bounded by ?from=&to=."""
+        file_format = request.query_params.get('format', 'csv')
+        if file_format not in CONTENT_TYPES:
+            raise ValidationError({'format': ['Must be one of: csv, ndjson.']})
+
+        queryset = Transaction.objects.filter(user=request.user)
+        for param, lookup in (('from', 'date__gte'), ('to', 'date__lte')):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: date.fromisoformat(value)})
+            except ValueError:
+                raise ValidationError({param: ['Enter a valid date in YYYY-MM-DD format.']})
+
+        return stream_transactions(queryset.order_by('date', 'id'), file_format)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_transactions(self, request):
+        """Bulk import a CSV or NDJSON file uploaded as the `file` field."""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = request.data.get('file_format') or detect_format(upload)
+        readers = {'csv': iter_csv_rows, 'ndjson': iter_ndjson_rows}
+        if file_format not in readers:
+            return Response({'file_format': ['Upload a .csv or .ndjson file, or set file_format.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = TransactionImporter(request.user).run(readers[file_format](upload))
+        except UndecodableLine as exc:
+            # Rows before the bad line were rolled back with the rest of the import
+            return Response({'file': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        code = status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=code)
+
+    @action(detail=False, methods=['patch', 'delete'])
+    def bulk(self, request):
+        """Change (PATCH with `changes`) or delete up to MAX_BULK_ROWS transactions picked by `ids` or `filter`."""
+        serializer_class = BulkUpdateSerializer if request.method == 'PATCH' else BulkSelectionSerializer
+        params = serializer_class(data=request.data, context=self.get_serializer_context())
+        params.is_valid(raise_exception=True)
+        selection = select_transactions(request.user, params.validated_data.get('ids'),
+                                        params.validated_data.get('filter'))
+        try:
+            if request.method == 'PATCH':
+                return Response({'updated': bulk_update(selection, params.validated_data['changes'])})
+            return Response({'deleted': bulk_delete(selection)})
+        except (SelectionTooLarge, CurrencyMismatch) as exc:
+            raise ValidationError({'non_field_errors': [str(exc)]})
+
+class RecurringTransactionViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
+    """Recurring transaction schedules; `run_recurring` generates their occurrences."""
+    serializer_class = RecurringTransactionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return (
+            RecurringTransaction.objects.filter(user=self.request.user)
+            .select_related('category', 'account').order_by('next_date', 'id')
+        )
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+class BudgetViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = BudgetSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user)
+        return Budget.objects.filter(user=self.request.user).order_by('-month', 'id')
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class GoalViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """Budget, spending, variance and status per budget from ?from=YYYY-MM to ?to=YYYY-MM."""
+        params = BudgetReportParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        start, end = params.validated_data['from'], params.validated_data['to']
+        rows, totals = budget_report(request.user, start, end)
+        return Response({
+            'from': start.strftime('%Y-%m'),
+            'to': end.strftime('%Y-%m'),
+            'currency': request.user.base_currency,
+            'rows': BudgetReportRowSerializer(rows, many=True).data,
+            'totals': BudgetReportTotalsSerializer(totals).data,
+        })
+
+class GoalViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     serializer_class = GoalSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Goal.objects.filter(user=self.request.user)
+        return Goal.objects.filter(user=self.request.user).with_progress().order_by('-created_at', 'id')
+
+    def perform_create(self, serializer):
+        goal = serializer.save(user=self.request.user)
+        goal.progress_pct = float(goal.progress())  # the one row just written, without re-reading it
+
+    def perform_update(self, serializer):
+        goal = serializer.save()
+        goal.progress_pct = float(goal.progress())
+
+class JobViewSet(ReplicaReadMixin, mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Enqueue background jobs and poll their status; `runworker` does the work."""
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).order_by('-created_at', '-id')
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response['Location'] = reverse('job-detail', args=[response.data['id']], request=request)
+        return response
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class DashboardView(APIView):
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """The job's result file, once it has succeeded."""
+        job = self.get_object()
+        if job.status != Job.SUCCEEDED or not job.result_file:
+            raise Http404('This job has no result file.')
+        file_format = job.result_file.name.rsplit('.', 1)[-1]
+        return FileResponse(job.result_file.open('rb'), as_attachment=True,
+                            filename=f'{job.kind}-{job.pk}.{file_format}',
+                            content_type=CONTENT_TYPES.get(file_format, 'application/octet-stream'))
+
+class SyncView(ReplicaReadMixin, APIView):
+    """The user's rows changed and deleted since ?since=<token> (everything without one), and the next token."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = SyncParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(sync(request.user, params.validated_data.get('since')))
+
+def dashboard_headers(user, version, today):
+    return {
+        'ETag': quote_etag(f'{user.pk}-{version}-{today:%Y%m%d}'),
+        'Cache-Control': 'private, no-cache',
+    }
+
+class DashboardView(ReplicaReadMixin, APIView):
+    """The user's dashboard, cached per user and revalidated with ETags.
+
+    The cache key and ETag carry a per-user version that every write to the
+    user's transactions, budgets, goals or categories bumps, so an unchanged
+    dashboard is answered with 304 (or from the cache) without touching the
+    tracker tables.
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
         user = request.user
         today = now().date()
-        current_month = today.strftime("%Y-%m")
-
-        # -------------------------
-        # AllTimeSummary
-        # -------------------------
-
-        total_income = Transaction.objects.filter(user=user, transaction_type='INCOME').aggregate(
-            total = Sum('amount')
-        )['total'] or 0
-        total_expenses = Transaction.objects.filter(user=user, transaction_type='EXPENSE').aggregate(
-            total = Sum('amount')
-        )['total'] or 0
-        net_savings = total_income - total_expenses
-
-        all_time_summary = {
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'net_savings': net_savings,
-        }
-
-        # -------------------------
-        #Current Month Summary
-        # -------------------------
-
-        month_income = Transaction.objects.filter(
-            user=user, transaction_type='INCOME', date__month=today.month, date__year=today.year).aggregate(
-                total = Sum('amount')
-            )['total'] or 0
-        month_expenses = Transaction.objects.filter(
-            user=user, transaction_type='EXPENSE', date__month=today.month, date__year=today.year).aggregate(
-                total = Sum('amount')
-            )['total'] or 0
-
-        current_month_summary= {
-            'month': current_month,
-            'income': month_income,
-            'expenses': month_expenses,
-            'savings': month_income - month_expenses,
-        }
-
-        # -------------------------
-        #Category Summary (Budget vs Expenditure)
-        # -------------------------
-
-        category_summary = []
-        categories = Category.objects.filter(user=user)
-
-        for category in categories:
-            expenditure = Transaction.objects.filter(
-                user=user, category=category, transaction_type='EXPENSE', date__month=today.month, date__year=today.year).aggregate(
-                total = Sum('amount')    
-                )['total'] or 0
-            
-            budget_obj = Budget.objects.filter(user=user, category=category, month=current_month).first()
-
-            budget_amount = budget_obj.amount if budget_obj else 0
-            balance = budget_amount - expenditure
-            status = 'OK'
-            if budget_obj and expenditure > budget_amount:
-                status = 'Exceeded'
-
-            category_summary.append({
-                'category': category.name,
-                'expenditure': expenditure,
-                'budget': budget_amount,
-                'balance': balance,
-                'status': status,
-            })
-        # -------------------------
-        #Montly History
-        # -------------------------
-
-        transactions_by_month = (
-            Transaction.objects.filter(user=user).annotate(month=TruncMonth('date')).values(
-                'month', 'transaction_type').annotate(total=Sum('amount')).order_by('month')
-            )
-            
-        monthly_data = {}
-        for entry in transactions_by_month:
-            month_str = entry['month'].strftime("%Y-%m")
-            if month_str not in monthly_data:
-                monthly_data[month_str] = {'income':0, 'expenses':0}
-            if entry ['transaction_type'] == 'INCOME':
-                monthly_data[month_str]["income"] = entry["total"]
-            else:
-                monthly_data[month_str]["expenses"] = entry["total"]
-
-        monthly_history = []
-        for month, data in monthly_data.items():
-            monthly_history.append({
-                'month': month,
-                'income' : data['income'],
-                'expenses': data['expenses'],
-                'savings' : data['income'] - data['expenses'],
-            })
-
-        # -------------------------
-        # Goals Progress
-        # -------------------------
-        
-        goals = Goal.objects.filter(user=user)
-        goals_data = GoalSerializer(goals, many=True).data
-
-        # -------------------------
-        #Serialize Everything
-        # -------------------------
-
-        dashboard_data = {
-            'all_time_summary' : all_time_summary,
-            'current_month_summary' : current_month_summary,
-            'category_summary' : category_summary,
-            'monthly_history' : monthly_history,
-            'goals' : goals_data,
-        }
-
-        serializer = DashboardSerializer(dashboard_data)
-        return Response(serializer.data)
\ No newline at end of file
+        version = dashboard_version(user.pk)
+        headers = dashboard_headers(user, version, today)
+
+        if headers['ETag'] in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        dashboard_data = get_dashboard(user.pk, version, today)
+        if dashboard_data is None:
+            serializer = DashboardSerializer(build_dashboard(user, today))
+            dashboard_data = serializer.data
+            set_dashboard(user.pk, version, today, dashboard_data)
+        return Response(dashboard_data, headers=headers)
+
+
+def authenticate(request):
+    """The user authenticated by the API's authentication classes, or the DRF error."""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.APIException as exc:
+        return None, exc
+    if not user or not user.is_authenticated:
+        return None, exceptions.NotAuthenticated()
+    return user, None
+
+
+@require_GET
+async def dashboard_async_view(request):
+    """`DashboardView` as an async view, for serving under ASGI.
+
+    Same payload, cache and ETags; on a cache miss the dashboard sections
+    are queried concurrently by `build_dashboard_async()`.
+    """
+    user, error = await sync_to_async(authenticate)(request)
+    if error is not None:
+        return JsonResponse(
+            {'detail': error.detail}, status=status.HTTP_401_UNAUTHORIZED,
+            headers={'WWW-Authenticate': 'Bearer realm="api"'},
+        )
+
+    today = now().date()
+    version = await sync_to_async(dashboard_version)(user.pk)
+    headers = dashboard_headers(user, version, today)
+    if headers['ETag'] in parse_etags(request.headers.get('If-None-Match', '')):
+        return HttpResponseNotModified(headers=headers)
+
+    dashboard_data = await sync_to_async(get_dashboard)(user.pk, version, today)
+    if dashboard_data is None:
+        with replica_reads(user_id=user.pk):
+            dashboard_data = DashboardSerializer(await build_dashboard_async(user, today)).data
+        await sync_to_async(set_dashboard)(user.pk, version, today, dashboard_data)
+    return HttpResponse(JSONRenderer().render(dashboard_data), content_type='application/json', headers=headers)
+
+
+class MetricsView(APIView):
+    """Request histograms of this process in the Prometheus text format (staff only)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')